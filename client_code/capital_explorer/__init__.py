@@ -8,6 +8,7 @@ import anvil.tables.query as q
 from anvil.tables import app_tables
 from .. import config
 from ..chart_export import download_chart
+from ..chart_loading import load_charts
 from ..InfoPopupCE import InfoPopupCE
 
 
@@ -167,24 +168,28 @@ class capital_explorer(capital_explorerTemplate):
 
   def apply_filters(self):
     """
-    Single server call that reloads all charts and indicators
-    based on the current filter state.
+    Reloads all charts based on the current filter state: the Sankey at the
+    top of the page first, then the remaining charts once it is drawn.
     """
     # Update filter chips display
     self.filter_chips_panel.items = self._build_filter_chips()
 
-    # Fetch all charts and indicators in one server call
-    all_charts = anvil.server.call('get_all_capital_charts', **self._get_filter_kwargs())
-
-    # ── Charts ──
-    self.funding_time_plot.figure = all_charts['time_chart']
-    self.capital_flow_plot.figure = all_charts['sankey']
-    self.stacked_plot.figure      = all_charts['stacked_bar']
-    self.box_plot.figure          = all_charts['box_plot']
-    self.lollipop_chart.figure    = all_charts['bottleneck_chart']
-    self.bubble_plot.figure       = all_charts['treemap']
-    self.scale_pies_plot.figure   = all_charts['scale_pies']
-    self.alt_financing_bar_plot.figure = all_charts['alt_financing_bar']
+    load_charts(
+      self,
+      server_callable='get_all_capital_charts',
+      plots={
+        'sankey':            self.capital_flow_plot,
+        'bottleneck_chart':  self.lollipop_chart,
+        'scale_pies':        self.scale_pies_plot,
+        'treemap':           self.bubble_plot,
+        'stacked_bar':       self.stacked_plot,
+        'time_chart':        self.funding_time_plot,
+        'box_plot':          self.box_plot,
+        'alt_financing_bar': self.alt_financing_bar_plot,
+      },
+      first=['sankey'],
+      **self._get_filter_kwargs()
+    )
 
 
   # ==================== CHART DOWNLOAD ====================
@@ -0,0 +1,112 @@
+"""
+chart_loading.py — Client-side two-phase chart loading
+======================================================
+Reusable across the chart pages. The page callables build only the chart
+keys they are asked for (charts=[...]), so a page first requests the charts
+at the top of the page, draws them, and then fetches the remaining charts
+in a second call — without the loading spinner — while the first ones are
+already on screen.
+
+Each call also sends the filter state the drawn figures were built with
+(previous=...). Charts whose inputs that filter change leaves untouched come
+back as config.CHART_UNCHANGED and keep their current figure, so toggling
+one chip only redraws the charts it affects.
+
+A chart that exceeded its server-side build budget comes back as a
+placeholder (config.CHART_RETRY key): its message is drawn, the other
+charts are not held up, and once the rest are on screen the chart is
+fetched through the retry_chart callable (up to MAX_CHART_RETRIES calls,
+each waiting server-side for the build).
+
+Usage in a form:
+    from ..chart_loading import load_charts
+
+    def apply_filters(self):
+        load_charts(
+            self,
+            server_callable='get_all_my_page_charts',
+            plots={'chart_a': self.chart_a_plot, 'chart_b': self.chart_b_plot},
+            first=['chart_a'],
+            **self._get_filter_kwargs()
+        )
+"""
+
+import anvil.server
+
+from . import config
+
+
+# retry_chart calls per placeholder before its message is left on screen
+MAX_CHART_RETRIES = 3
+
+
+def load_charts(form, server_callable, plots, first, **filter_kwargs):
+  """
+  Fetch the charts in plots ({chart key: Plot component}) from
+  server_callable and draw them: the keys in first, then all the others.
+
+  Each call records a load number on the form; when a newer load starts
+  while a call is in flight (filters changed again), the older load stops
+  without drawing its now-stale figures. Returns False in that case.
+  """
+  form._chart_load = getattr(form, '_chart_load', 0) + 1
+  load = form._chart_load
+
+  # The figures on screen match a filter state only once a load completes
+  previous = getattr(form, '_chart_state', None) or {}
+  form._chart_state = None
+
+  first_keys = [key for key in plots if key in first]
+  rest_keys  = [key for key in plots if key not in first]
+  versions   = set()
+  retries    = {}   # key -> retry entry of a placeholder drawn instead
+
+  for keys, background in ((first_keys, False), (rest_keys, True)):
+    if not keys:
+      continue
+    if background:
+      with anvil.server.no_loading_indicator:
+        charts = anvil.server.call(server_callable, charts=keys, previous=previous,
+                                   **filter_kwargs)
+    else:
+      charts = anvil.server.call(server_callable, charts=keys, previous=previous,
+                                 **filter_kwargs)
+    if load != form._chart_load:
+      return False
+    versions.add(charts['dataset_version'])
+    for key in keys:
+      if _placeholder(charts[key]):
+        retries[key] = charts[key][config.CHART_RETRY]
+        plots[key].figure = {'data': [], 'layout': charts[key]['layout']}
+      elif not _unchanged(charts[key]):
+        plots[key].figure = charts[key]
+
+  # Placeholders are left out of the drawn charts until their figure arrives
+  if len(versions) == 1:   # both calls saw the same dataset version
+    form._chart_state = {
+      'filters': filter_kwargs,
+      'version': versions.pop(),
+      'charts':  [key for key in plots if key not in retries],
+    }
+
+  for key, retry in retries.items():
+    for _ in range(MAX_CHART_RETRIES):
+      with anvil.server.no_loading_indicator:
+        figure = anvil.server.call('retry_chart', retry)
+      if load != form._chart_load:
+        return False
+      if not _placeholder(figure):
+        plots[key].figure = figure
+        if form._chart_state:
+          form._chart_state['charts'].append(key)
+        break
+      retry = figure[config.CHART_RETRY]
+  return True
+
+
+def _unchanged(figure):
+  return isinstance(figure, str) and figure == config.CHART_UNCHANGED
+
+
+def _placeholder(figure):
+  return isinstance(figure, dict) and config.CHART_RETRY in figure
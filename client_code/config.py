@@ -184,6 +184,25 @@ def get_owner_type_colors_categorical(type_category_pairs):
 # category adjacent in pies, treemaps, and legends).
 CATEGORY_ORDER_OWNERS = ['Community-based', 'Indigenous', 'Private sector', 'Public secor', 'Non-profit', 'Other / Unknown']
 
+# ==================== SURVEY ANSWER ORDER ====================
+# Canonical order of the project_scale answers. Used for chart ordering and
+# as the category order of the project_scale Categorical on the server.
+
+SCALE_ORDER = [
+  'Micro (< $100K)', 'Small ($100K-$1M)', 'Medium ($1M-$5M)',
+  'Large ($5M-$25M)', 'Very Large ($25M-$100M)', 'Mega (> $100M)',
+]
+
+# ==================== CHART LOADING ====================
+# Returned by the page callables in place of a figure whose inputs did not
+# change since the client's previous load (see chart_loading.load_charts).
+
+CHART_UNCHANGED = 'unchanged'
+
+# Key of the placeholder figure returned in place of a chart that exceeded
+# its build time budget; its value is passed to the retry_chart callable.
+CHART_RETRY = 'retry'
+
 # ==================== PROJECT TYPE COLOURS ====================
 
 PROJECT_TYPE_COLORS = {
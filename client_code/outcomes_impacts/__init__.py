@@ -8,6 +8,7 @@ import anvil.tables.query as q
 from anvil.tables import app_tables
 from .. import config
 from ..chart_export import download_chart
+from ..chart_loading import load_charts
 # Optional info popup — uncomment once you've created an info form for this page.
 from ..InfoPopupOI import InfoPopupOI
 
@@ -164,22 +165,33 @@ class outcomes_impacts(outcomes_impactsTemplate):
   # ==================== CHART LOADING ====================
 
   def apply_filters(self):
-    """Single server call that reloads all charts based on the current filter state."""
+    """
+    Reloads all charts based on the current filter state: the key objectives
+    chart at the top of the page first, then the remaining charts.
+    """
     # Update filter chips display
     self.filter_chips_panel.items = self._build_filter_chips()
 
-    # Fetch all charts in one server call
-    all_charts = anvil.server.call('get_all_outcomes_charts', **self._get_filter_kwargs())
-
-    # -- Charts --
-    self.indigenous_agreements_plot.figure = all_charts['indigenous_agreements']
-    self.jobs_plot.figure                  = all_charts['jobs_chart']
-    self.ghg_methodology_plot.figure       = all_charts['ghg_methodology']
-    self.ghg_timeline_plot.figure          = all_charts['ghg_timeline']
-    self.key_objectives_plot.figure        = all_charts['key_objectives']
-    self.op_expenses_plot.figure           =all_charts['op_expenses']
-    self.return_expectations_plot.figure   =all_charts['return_expectations']
-    self.end_use_plot.figure               =all_charts['end_use_composition']
+    plots = {
+      'key_objectives':        self.key_objectives_plot,
+      'ghg_timeline':          self.ghg_timeline_plot,
+      'ghg_methodology':       self.ghg_methodology_plot,
+      'jobs_chart':            self.jobs_plot,
+      'indigenous_agreements': self.indigenous_agreements_plot,
+      'op_expenses':           self.op_expenses_plot,
+      'return_expectations':   self.return_expectations_plot,
+    }
+    # End-use composition is hidden on this page — only fetched when shown
+    if self.end_use_plot.visible:
+      plots['end_use_composition'] = self.end_use_plot
+
+    load_charts(
+      self,
+      server_callable='get_all_outcomes_charts',
+      plots=plots,
+      first=['key_objectives'],
+      **self._get_filter_kwargs()
+    )
 
   # ==================== CHART DOWNLOAD ====================
 
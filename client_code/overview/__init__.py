@@ -30,8 +30,8 @@ class overview(overviewTemplate):
   # ==================== DATA LOADING ====================
 
   def load_data(self):
-    """Single server call to populate all summary stats and charts."""
-    data = anvil.server.call('get_all_overview_data')
+    """Summary stats first (cheap), then the province map once they are shown."""
+    data = anvil.server.call('get_all_overview_data', charts=['summary'])
 
     # ── Summary stats ──
     summary = data['summary']
@@ -39,6 +39,8 @@ class overview(overviewTemplate):
     self.total_funding_number.text = f"${summary['total_cost'] / 1e9:.1f}B"
 
     # ── Charts ──
+    with anvil.server.no_loading_indicator:
+      data = anvil.server.call('get_all_overview_data', charts=['province_map'])
     self.province_map.figure       = data['province_map']
     #self.mechanism_compare_plot.figure = data['mechanism_compare']
 
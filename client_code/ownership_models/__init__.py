@@ -8,6 +8,7 @@ import anvil.tables.query as q
 from anvil.tables import app_tables
 from .. import config
 from ..chart_export import download_chart
+from ..chart_loading import load_charts
 from ..InfoPopupOM import InfoPopupOM
 from ..CategoryPopup import CategoryPopup
 
@@ -130,23 +131,66 @@ class ownership_models(ownership_modelsTemplate):
   # ==================== CHART LOADING ====================
 
   def apply_filters(self):
+    """
+    Reloads all charts based on the current filter state: the ownership
+    treemap at the top of the page first, then the remaining charts.
+    """
     self.filter_chips_panel.items = self._build_filter_chips()
     #self.selected_panel.visible   = len(self.filter_chips_panel.items) > 0
 
-    all_charts = anvil.server.call('get_all_ownership_charts', **self._get_filter_kwargs())
-
-    self.ownership_treemap.figure          = all_charts['ownership_treemap']
-    self.scale_pies_plot.figure            = all_charts['scale_pies']
-    #self.indig_ownership_plot.figure       = all_charts['indigenous_pie']
-    #self.lollipop_chart.figure              = all_charts['bottleneck_chart']   # now governance bottlenecks
-    # self.ownership_financing_bubble.figure = all_charts['bubble_chart']    # REMOVED
-    self.all_financing_heatmap_plot.figure  = all_charts['all_financing_heatmap']
-    #self.ownership_boxplot_plot.figure      = all_charts['ownership_boxplot']
-    self.ownership_tiers_histogram.figure   = all_charts['ownership_tiers_histogram']
-    #self.collaboration_heatmap_plot.figure  = all_charts['collaboration_heatmap']    # NEW
-    self.single_owner_breakdown_plot.figure = all_charts['single_owner_breakdown']   # NEW
-    self.semicircles_plot.figure = all_charts['multi_owner_semicircles']
-    self.objectives_heatmap_plot.figure = all_charts['objectives_heatmap']
+    load_charts(
+      self,
+      server_callable='get_all_ownership_charts',
+      plots={
+        'ownership_treemap':         self.ownership_treemap,
+        'single_owner_breakdown':    self.single_owner_breakdown_plot,
+        'multi_owner_semicircles':   self.semicircles_plot,
+        'ownership_tiers_histogram': self.ownership_tiers_histogram,
+        'scale_pies':                self.scale_pies_plot,
+        #'indigenous_pie':            self.indig_ownership_plot,
+        #'bottleneck_chart':          self.lollipop_chart,   # now governance bottlenecks
+        'all_financing_heatmap':     self.all_financing_heatmap_plot,
+        #'ownership_boxplot':         self.ownership_boxplot_plot,
+        #'collaboration_heatmap':     self.collaboration_heatmap_plot,
+        'objectives_heatmap':        self.objectives_heatmap_plot,
+      },
+      first=['ownership_treemap'],
+      **self._get_filter_kwargs()
+    )
+    self._update_semicircles_pager()
+
+  # ==================== SEMICIRCLE PAGING ====================
+  # The server draws one page of multi-owner projects at a time; the page
+  # figure's layout.meta holds page / pages / total.
+
+  def _semicircles_meta(self):
+    try:
+      return dict(self.semicircles_plot.figure.layout.meta or {})
+    except (AttributeError, KeyError, TypeError):
+      return {}
+
+  def _update_semicircles_pager(self):
+    meta  = self._semicircles_meta()
+    page  = meta.get('page', 0)
+    pages = meta.get('pages', 1)
+    self.semicircles_pager.visible    = pages > 1
+    self.semicircles_prev_btn.enabled = page > 0
+    self.semicircles_next_btn.enabled = page < pages - 1
+    self.semicircles_page_text.text   = (
+      f"Page {page + 1} of {pages} ({meta.get('total', 0)} projects)" if pages > 1 else ''
+    )
+
+  def _show_semicircles_page(self, page):
+    self.semicircles_plot.figure = anvil.server.call(
+      'get_multi_owner_semicircles', page=page, **self._get_filter_kwargs())
+    self._update_semicircles_pager()
+
+  def semicircles_prev_btn_click(self, **event_args):
+    self._show_semicircles_page(self._semicircles_meta().get('page', 0) - 1)
+
+  def semicircles_next_btn_click(self, **event_args):
+    self._show_semicircles_page(self._semicircles_meta().get('page', 0) + 1)
+
   # ==================== CHART DOWNLOAD ====================
 
   def _get_plot_component(self, chart_key):
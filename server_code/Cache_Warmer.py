@@ -0,0 +1,162 @@
+"""
+Cache_Warmer.py — Server module
+===============================
+Pre-computes the most common page responses into the result cache
+(Result_Cache) so the first visitors after a deploy or restart do not pay
+the full cost of building every page.
+
+Warm-up set, for each filterable chart page:
+  - the unfiltered view (all pages first)
+  - every single-value filter: each province, project type, stage,
+    indigenous ownership answer and project scale present in the data,
+    most common values first
+
+Entry points:
+  start_cache_warmer()     — warms on a daemon thread; called automatically
+                             whenever a dataset version starts being served
+  stop_cache_warmer()      — stops the running warm-up after its current job
+  warm_result_cache()      — synchronous run in the calling thread
+None of them is a server callable: a warm-up rebuilds every page, so it is
+not something clients can trigger.
+
+The cache is per server process, so warming runs on a thread of the process
+that serves the pages rather than as an Anvil background task (which would
+run, and cache, in a process of its own). It starts from the dataset load
+hook (Global_Server_Functions.on_dataset_load): as soon as the process has
+loaded its dataset, and again for the new version after every reload.
+
+Runs are restartable: responses whose charts are all cached are skipped, so a
+stopped or interrupted run simply resumes. Only one run is active per
+process. The warmer yields to live traffic — before each job it waits while
+live page requests are being computed. Progress and total time are kept in
+get_cache_warmup_status() and printed to the server log.
+"""
+
+import threading
+import time
+
+from .Global_Server_Functions import get_snapshot, on_dataset_load
+from .Filter_Engine import FilterSpec, get_filter_index
+from .Result_Cache import is_cached, live_requests_in_flight, warming
+from .Cap_Explorer import get_all_capital_charts
+from .Ownership_Models import get_all_ownership_charts
+from .Outcomes_impacts import get_all_outcomes_charts
+
+
+# Cached page callables to warm, in priority order (name must match cached_result)
+WARMUP_PAGES = [
+  ('get_all_capital_charts',   get_all_capital_charts),
+  ('get_all_ownership_charts', get_all_ownership_charts),
+  ('get_all_outcomes_charts',  get_all_outcomes_charts),
+]
+
+# Seconds to wait between checks while live requests are in flight
+YIELD_INTERVAL = 0.05
+
+_RUN_LOCK = threading.Lock()
+_STOP     = threading.Event()
+_STATUS   = {
+  'status': 'idle', 'done': 0, 'total': 0, 'computed': 0, 'skipped': 0,
+  'failed': 0, 'elapsed_s': None,
+}
+
+
+def warmup_jobs(snapshot=None):
+  """
+  (callable name, callable, FilterSpec) for every response to warm:
+  all unfiltered views, then single-value filters by descending row count.
+  """
+  snapshot = snapshot if snapshot is not None else get_snapshot()
+  index    = get_filter_index(snapshot)
+  empty    = FilterSpec.from_kwargs()
+
+  singles = []
+  for dimension, bitmaps in index.bitmaps.items():
+    for value, bitmap in bitmaps.items():
+      singles.append((int(bitmap.sum()), dimension, value))
+  singles.sort(key=lambda s: (-s[0], s[1], s[2]))
+
+  jobs = [(name, fn, empty) for name, fn in WARMUP_PAGES]
+  for _, dimension, value in singles:
+    spec = FilterSpec.from_kwargs(**{dimension: [value]})
+    jobs.extend((name, fn, spec) for name, fn in WARMUP_PAGES)
+  return jobs
+
+
+def warm_result_cache(progress=None):
+  """
+  Warm the result cache synchronously. progress(status_dict) is called after
+  each job. Returns the final status, or the current one if another run is
+  already active in this process.
+  """
+  if not _RUN_LOCK.acquire(blocking=False):
+    return get_cache_warmup_status()
+  try:
+    _STOP.clear()
+    start = time.perf_counter()
+    jobs  = warmup_jobs()
+    _STATUS.update(status='running', done=0, total=len(jobs), computed=0,
+                   skipped=0, failed=0, elapsed_s=0.0)
+
+    with warming():
+      for name, fn, spec in jobs:
+        if _wait_for_idle():
+          break
+        if is_cached(name, spec, fn.chart_keys):
+          _STATUS['skipped'] += 1
+        else:
+          try:
+            fn(**spec.as_kwargs())
+            _STATUS['computed'] += 1
+          except Exception as e:
+            _STATUS['failed'] += 1
+            print(f'Cache warm-up failed for {name} {spec.as_kwargs()}: {e!r}')
+        _STATUS['done'] += 1
+        _STATUS['elapsed_s'] = round(time.perf_counter() - start, 3)
+        if progress is not None:
+          progress(get_cache_warmup_status())
+
+    _STATUS['status']    = 'stopped' if _STOP.is_set() else 'complete'
+    _STATUS['elapsed_s'] = round(time.perf_counter() - start, 3)
+    print(f"Cache warm-up {_STATUS['status']}: {_STATUS['done']}/{_STATUS['total']} "
+          f"jobs ({_STATUS['computed']} computed, {_STATUS['skipped']} already cached, "
+          f"{_STATUS['failed']} failed) in {_STATUS['elapsed_s']:.1f}s")
+    return get_cache_warmup_status()
+  finally:
+    _RUN_LOCK.release()
+
+
+def _wait_for_idle():
+  """Block while live requests are in flight. Returns True if asked to stop."""
+  while live_requests_in_flight() > 0 and not _STOP.is_set():
+    time.sleep(YIELD_INTERVAL)
+  return _STOP.is_set()
+
+
+def start_cache_warmer():
+  """
+  Warm the cache on a daemon thread unless a warm-up is already running.
+  Returns the thread started, or None.
+  """
+  if _RUN_LOCK.locked():
+    return None
+  thread = threading.Thread(target=warm_result_cache, name='cache-warmer', daemon=True)
+  thread.start()
+  return thread
+
+
+def stop_cache_warmer():
+  """Ask the running warm-up to stop after its current job."""
+  _STOP.set()
+
+
+@on_dataset_load
+def _warm_after_load(version):
+  """Warm the responses of a newly loaded version (a running warm-up carries on)."""
+  start_cache_warmer()
+
+
+def get_cache_warmup_status():
+  """Progress of the current / last warm-up run."""
+  return dict(_STATUS)
+
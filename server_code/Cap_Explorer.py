@@ -3,12 +3,15 @@ Cap_Explorer.py — Server module for the Capital Explorer page
 =============================================================
 Structure:
   1. Imports
-  2. Utility functions         — text wrapping, contrast colour, category name normalisation
-  3. Data filtering            — apply_filters()
-  4. Data processing           — process_capital_mix_data(), get_category_order()
+  2. Utility functions         — text wrapping (category recoding: Recode_Rules,
+                                 colours: Palettes)
+  3. Data filtering            — shared Filter_Engine (FilterSpec + FilterIndex)
+  4. Data processing           — process_capital_mix_data(), get_category_order(),
+                                 derived tables registered with Derived_Tables
   5. Main callable             — get_all_capital_charts()
   6. Chart creation functions  — one per chart type
-  7. Indicators calculation    — calculate_indicators_internal()
+  7. Indicators calculation    — calculate_indicators_internal() over the
+                                 per-record metric store (get_capital_metrics)
   8. Export callable           — export_capital_chart()
 
 Display template is applied centrally in get_all_capital_charts() via
@@ -27,52 +30,38 @@ import numpy as np
 from plotly.subplots import make_subplots
 import plotly.graph_objects as go
 import plotly.express as px
+import functools
 import textwrap
 import math
+from collections import namedtuple
 
 from .config import (
 COLOUR_MAPPING, gradient_palette, dunsparce_colors,
 FONT_FAMILY, FONT_SIZE, FONT_COLOR,
 )
-from .Global_Server_Functions import get_data
+from .Global_Server_Functions import derived, get_snapshot
+from .Derived_Tables import flatten_items, register_table, get_table, scale_breakdown
+from .Filter_Engine import FilterSpec, get_filter_index
+from .Recode_Rules import (
+standardize_category_name, recode_categories, recode_sources, apply_record_overrides,
+)
+from .Result_Cache import ChartInputs, cached_result, requested_charts
+from .Chart_Builder import build_charts
+from .Palettes import LINK_GREY, LINK_RGBA, brightness_shades, contrast_color, tint_shades
 from .Export_Utils import export_figure_from_bytes, apply_display_template
 
 
 # ==================== UTILITY FUNCTIONS ====================
 
+@functools.lru_cache(maxsize=4096)
 def wrap_text(text, width=15):
-  """Wrap long strings with <br> tags for display inside Plotly visualisations."""
-  return '<br>'.join(textwrap.wrap(text, width=width))
-
-
-def get_contrast_color(hex_color):
   """
-  Return 'white' or 'black' based on which gives better contrast
-  against the given hex background colour (ITU-R BT.601 luminance).
+  Wrap long strings with <br> tags for display inside Plotly visualisations.
+  Memoized: the same source / label strings are wrapped on every request.
   """
-  if not hex_color or not hex_color.startswith('#'):
-    return 'white'
-  hex_color = hex_color.lstrip('#')
-  r, g, b = int(hex_color[0:2], 16), int(hex_color[2:4], 16), int(hex_color[4:6], 16)
-  return 'black' if (0.299 * r + 0.587 * g + 0.114 * b) / 255 > 0.5 else 'white'
+  return '<br>'.join(textwrap.wrap(text, width=width))
 
 
-def standardize_category_name(category):
-  """
-  Normalise raw category strings to the consistent display names used across all charts.
-  Handles casing and phrasing variations from the survey data.
-  """
-  if not category:
-    return category
-  c = str(category).lower()
-  if 'debt'      in c: return 'Debt financing'
-  if 'grant'     in c: return 'Grants & non-repayable contributions'
-  if 'crowdfund' in c or 'crowd fund' in c: return 'Crowdfunding'
-  if 'internal'  in c: return 'Internal capital'
-  if 'equity'    in c: return 'External equity investments'
-  if 'community' in c: return 'Community financing'
-  return category
-
 # Short labels used when collapsing small sources into an "Other" bucket.
 # Keeps "Other" labels readable in dense charts (Sankey nodes, treemap tiles, etc.)
 CATEGORY_SHORT_LABELS = {
@@ -85,6 +74,24 @@ CATEGORY_SHORT_LABELS = {
 }
 
 
+def source_totals(df, category_col='category', source_col='source',
+                  amount_col='amount', record_col='record_id'):
+  """
+  Totals behind every group_small_sources mode, from one groupby pass:
+  per (category, source) pair the amount sum and distinct-record count, and
+  per category the amount sum.
+  Returns (pairs DataFrame with 'amount' / 'records' columns, category Series).
+  """
+  aggs = {}
+  if amount_col in df.columns:
+    aggs['amount'] = (amount_col, 'sum')
+  if record_col in df.columns:
+    aggs['records'] = (record_col, 'nunique')
+  pairs = df.groupby([category_col, source_col]).agg(**aggs)
+  cats  = df.groupby(category_col)[amount_col].sum() if amount_col in df.columns else None
+  return pairs, cats
+
+
 def group_small_sources(df, by='amount', threshold=None, min_count=None,
                         category_col='category', source_col='source',
                         amount_col='amount', record_col='record_id',
@@ -102,32 +109,29 @@ def group_small_sources(df, by='amount', threshold=None, min_count=None,
   df = df.copy()
   omit_categories = omit_categories or []
 
-  # Work out small_pairs only on the non-omitted slice of the data
-  df_for_grouping = df[~df[category_col].isin(omit_categories)]
+  # Work out small_pairs only on the non-omitted categories
+  pairs, cat_totals = source_totals(df, category_col, source_col, amount_col, record_col)
+  pairs = pairs[~pairs.index.get_level_values(0).isin(omit_categories)]
 
-  if df_for_grouping.empty:
+  if pairs.empty:
     # Nothing to group, but force_group might still apply below
     small_pairs = set()
   else:
     if by == 'amount':
       if threshold is None:
         raise ValueError("`threshold` is required when by='amount'")
-      totals = df_for_grouping.groupby([category_col, source_col])[amount_col].sum()
-      small_mask = totals < threshold
+      small_mask = pairs['amount'] < threshold
 
     elif by == 'pct_within_category':
       if threshold is None:
         raise ValueError("`threshold` (as a fraction, e.g. 0.03) is required when by='pct_within_category'")
-      source_totals = df_for_grouping.groupby([category_col, source_col])[amount_col].sum()
-      cat_totals    = df_for_grouping.groupby(category_col)[amount_col].sum()
-      pct = source_totals / source_totals.index.get_level_values(category_col).map(cat_totals)
+      pct = pairs['amount'] / pairs.index.get_level_values(0).map(cat_totals)
       small_mask = pct < threshold
 
     elif by == 'count':
       if min_count is None:
         raise ValueError("`min_count` is required when by='count'")
-      counts = df_for_grouping.groupby([category_col, source_col])[record_col].nunique()
-      small_mask = counts < min_count
+      small_mask = pairs['records'] < min_count
 
     else:
       raise ValueError(f"Unknown grouping mode: {by!r}")
@@ -142,146 +146,178 @@ def group_small_sources(df, by='amount', threshold=None, min_count=None,
       ][[category_col, source_col]]
     small_pairs.update(map(tuple, forced.drop_duplicates().values.tolist()))
 
-  # Rewrite small sources to "Other {short_category}"
-  def relabel(row):
-    key = (row[category_col], row[source_col])
-    if key in small_pairs:
-      short = CATEGORY_SHORT_LABELS.get(row[category_col], row[category_col])
-      return f'Other {short}'
-    return row[source_col]
+  if not small_pairs:
+    return df
 
-  df[source_col] = df.apply(relabel, axis=1)
+  # Rewrite small sources to "Other {short_category}" — decided once per
+  # distinct (category, source) pair, then broadcast to the rows
+  keys    = np.empty(len(df), dtype=object)
+  keys[:] = list(zip(df[category_col].to_numpy(dtype=object),
+                     df[source_col].to_numpy(dtype=object)))
+  codes, uniques = pd.factorize(keys)
+  is_small = np.array([key in small_pairs for key in uniques], dtype=bool)
+  labels   = np.array(
+    [f'Other {CATEGORY_SHORT_LABELS.get(cat, cat)}' for cat, _ in uniques], dtype=object)
+
+  rows = is_small[codes]
+  df[source_col] = np.where(rows, labels[codes], df[source_col].to_numpy(dtype=object))
   return df
 
-# ==================== DATA FILTERING ====================
+# ==================== DATA PROCESSING ====================
 
-def apply_filters(df, provinces=None, proj_types=None, stages=None,
-                  indigenous_ownership=None, project_scale=None):
-  """
-  Apply user-selected filters to a dataframe. Returns a filtered copy.
-  Silently returns the original dataframe if it is already empty.
-  """
-  if df.empty:
-    return df
-  df = df.copy()
-  if provinces:            df = df[df['province'].isin(provinces)]
-  if proj_types:           df = df[df['project_type'].apply(lambda lst: any(t in lst for t in proj_types))]
-  if stages:               df = df[df['stage'].isin(stages)]
-  if indigenous_ownership: df = df[df['indigenous_ownership'].isin(indigenous_ownership)]
-  if project_scale:        df = df[df['project_scale'].isin(project_scale)]
-  return df
+# Record-level columns repeated onto every capital_mix item (long name ← survey column)
+CAPITAL_MIX_RECORD_COLS = {
+  'project_type': 'project_type', 'stage': 'stage', 'province': 'province',
+  'project_scale': 'project_scale',
+}
+CAPITAL_MIX_TRAILING_COLS = {
+  'indigenous_ownership': 'indigenous_ownership',
+  'all_financing_mechanisms': 'all_financing_mechanisms',
+}
 
+# Time-to-funding answer column for each (raw) capital_mix category
+TIME_COL_BY_CATEGORY = {
+  'Grants':            'grants_time',
+  'Debt':              'debt_time',
+  'Equity':            'equity_time',
+  'Community finance': 'community_finance_time',
+  'Crowdfunding':      'crowdfunding_time',
+}
 
-# ==================== DATA PROCESSING ====================
+TIME_MAP = {
+  'Less than 1 year': 0.5,
+  '2-3 years':        2.5,
+  '4-5 years':        4.5,
+  '8-10 years':       9.0,
+  'More than 10 years': 11.0
+}
 
 def process_capital_mix_data(df):
   """
   Transform the raw survey dataframe into a long-format capital mix dataframe.
 
-  Steps:
+  Steps (column-wise; no per-row Python beyond flattening the nested lists):
     1. Explode capital_mix list into one row per financing item
     2. Explode debt list into one row per debt instrument
     3. Merge debt details (interest rate, repayment period) into capital mix rows
-    4. Zero out time columns that do not match the row's category
-    5. Convert time-to-funding strings to numeric years
-    6. Normalise 'Other' / 'Not sure' source labels
+    4. Take time-to-funding from the time column matching the row's category
+       and convert it to numeric years
+    5. Apply the recode rules (Recode_Rules): 'Other' / 'Not sure' source
+       labels and standardised category names (one lookup per distinct
+       value), then the record-specific data fixes
   """
   # Step 1 — Explode capital_mix
-  rows = []
-  for _, row in df.iterrows():
-    for item in (row.get('capital_mix') or []):
-      rows.append({
-        'record_id':                row.get('record_id'),
-        'total_cost':               row.get('total_cost'),
-        'name':                     item.get('name'),
-        'source':                   item.get('source'),
-        'category':                 item.get('category'),
-        'item_type':                item.get('item_type'),
-        'amount':                   item.get('amount'),
-        'project_type':             row.get('project_type'),
-        'stage':                    row.get('stage'),
-        'province':                 row.get('province'),
-        'project_scale':            row.get('project_scale'),
-        'grants_time':              row.get('grants_time'),
-        'debt_time':                row.get('debt_time'),
-        'equity_time':              row.get('equity_time'),
-        'community_time':           row.get('community_finance_time'),
-        'crowdfunding_time':        row.get('crowdfunding_time'),
-        'indigenous_ownership':     row.get('indigenous_ownership'),
-        'all_financing_mechanisms': row.get('all_financing_mechanisms'),
-      })
-
-  df_long = pd.DataFrame(rows)
-  if df_long.empty:
+  items, pos = flatten_items(_record_col(df, 'capital_mix'))
+  if not items:
     return pd.DataFrame(columns=[
       'record_id', 'total_cost', 'name', 'source', 'category', 'item_type',
       'amount', 'project_type', 'stage', 'province', 'project_scale',
       'indigenous_ownership', 'all_financing_mechanisms', 'time_to_funding'
     ])
+  cm = pd.DataFrame.from_records(items)
+  cm = cm.reindex(columns=['name', 'source', 'category', 'item_type', 'amount'])
+  _none_for_missing(cm, ['name', 'source', 'category', 'item_type'])
+
+  df_long = pd.DataFrame({
+    'record_id':  _record_col(df, 'record_id')[pos],
+    'total_cost': _record_col(df, 'total_cost')[pos],
+    **{c: cm[c].to_numpy() for c in cm.columns},
+    **{c: _record_col(df, src)[pos] for c, src in CAPITAL_MIX_RECORD_COLS.items()},
+  })
 
   # Step 2 — Explode debt list
-  debt_rows = []
-  for _, row in df.iterrows():
-    for item in (row.get('debt') or []):
-      debt_rows.append({
-        'record_id':        row.get('record_id'),
-        'total_cost':       row.get('total_cost'),
-        'name':             item.get('debt_name'),
-        'source':           item.get('debt_source'),
-        'debt_interest':    item.get('debt_interest'),
-        'repayment_period': item.get('debt_repayment'),
-      })
+  debt_items, debt_pos = flatten_items(_record_col(df, 'debt'))
+  debt = pd.DataFrame.from_records(debt_items).reindex(
+    columns=['debt_name', 'debt_source', 'debt_interest', 'debt_repayment'])
+  _none_for_missing(debt, ['debt_name', 'debt_source', 'debt_repayment'])
+  df_debt = pd.DataFrame({
+    'record_id':        _record_col(df, 'record_id')[debt_pos],
+    'total_cost':       _record_col(df, 'total_cost')[debt_pos],
+    'name':             debt['debt_name'].to_numpy(),
+    'source':           debt['debt_source'].to_numpy(),
+    'debt_interest':    debt['debt_interest'].to_numpy(),
+    'repayment_period': debt['debt_repayment'].to_numpy(),
+  })
 
   # Step 3 — Merge debt details
+  for c, src in CAPITAL_MIX_TRAILING_COLS.items():
+    df_long[c] = _record_col(df, src)[pos]
+  df_long['_pos'] = pos
   df_long = pd.merge(
-    df_long, pd.DataFrame(debt_rows),
+    df_long, df_debt,
     on=['record_id', 'total_cost', 'name', 'source'], how='left'
   )
 
-  # Step 4 — Zero out mismatched time columns
-  time_cols = ['grants_time', 'debt_time', 'equity_time', 'community_time', 'crowdfunding_time']
-  time_cats = ['Grants',      'Debt',      'Equity',      'Community finance', 'Crowdfunding']
-  for col, cat in zip(time_cols, time_cats):
-    df_long.loc[(df_long['category'] != cat) & df_long[col].notnull(), col] = pd.NaT
-
-  # Step 5 — Convert time strings to numeric years
-  TIME_MAP = {
-    'Less than 1 year': 0.5,
-    '2-3 years':        2.5,
-    '4-5 years':        4.5,
-    '8-10 years':       9.0,
-    'More than 10 years': 11.0
-  }
-  def time_to_numeric(s):
-    return np.nan if (pd.isna(s) or s == 'Missing value') else TIME_MAP.get(s, np.nan)
+  # Step 4 — Time-to-funding from the category's own time column, in years
+  rec_pos = df_long.pop('_pos').to_numpy()
+  times   = np.full(len(df_long), None, dtype=object)
+  for cat, col in TIME_COL_BY_CATEGORY.items():
+    match = (df_long['category'] == cat).to_numpy()
+    if match.any():
+      times[match] = _record_col(df, col)[rec_pos[match]]
+  df_long['time_to_funding'] = pd.Series(times, index=df_long.index).map(TIME_MAP).astype(float)
+
+  # Step 5 — Recode rules (Recode_Rules): source aliases, category names,
+  # then the data fixes, which match on the standardised category
+  df_long['source']   = recode_sources(df_long['source'], df_long['category'])
+  df_long['category'] = recode_categories(df_long['category'])
+  apply_record_overrides(df_long)
+  return df_long
 
-  df_long['time_to_funding'] = df_long.apply(
-    lambda row: next((time_to_numeric(row[c]) for c in time_cols if pd.notna(row[c])), np.nan),
-    axis=1
-  )
-  df_long = df_long.drop(columns=time_cols)
-
-  # Step 6 — Normalise ambiguous source labels
-  df_long['source'] = df_long['source'].replace({
-    'Other':                 'Other/Unknown',
-    'Other (please specify)':'Other/Unknown',
-    'Not sure':              'Other/Unknown',
-    'Aggregate total':       'Other/Unknown',
-    'Aggregate Total':       'Other/Unknown',
-    "Don't know":            'Other/Unknown',
-  })
-  mask = df_long['source'] == 'Other/Unknown'
-  df_long.loc[mask, 'source'] = df_long.loc[mask, 'source'] + '-' + df_long.loc[mask, 'category']
 
-  # ── TEMPORARY FIX: Reclassify CIB debt for projects 77 & 106 ──
-  # TODO: Remove once survey data is recoded
-  df_long.loc[
-    df_long['record_id'].isin([77, 106]) & (df_long['category'] == 'Debt financing'),
-    'source'
-    ] = 'Public infrastructure bank/government-sponsored lender'
+def _none_for_missing(frame, cols):
+  """Text columns of an item frame with absent keys as None, as dict.get gives (in place)."""
+  for c in cols:
+    frame[c] = frame[c].astype(object).where(frame[c].notna(), None)
+  return frame
 
-  df_long['category'] = df_long['category'].apply(standardize_category_name)
-  return df_long
+
+def _record_col(df, col):
+  """Record-level column as an object/numeric ndarray (all-None if absent)."""
+  if col not in df.columns:
+    return np.full(len(df), None, dtype=object)
+  series = df[col]
+  if isinstance(series.dtype, pd.CategoricalDtype):
+    series = series.astype(object)
+  return series.to_numpy()
+
+
+# Built once per dataset snapshot and filtered by record_id per request.
+register_table('capital_mix_processed')(process_capital_mix_data)
+
+
+@register_table('treemap_count_long')
+def _treemap_count_long(snapshot):
+  """
+  financing_mech items that are direct sources of capital (treemap count
+  view), with the data fixes applied.
+  """
+  fm = get_table(snapshot, 'financing_mech_long')
+  if fm.empty or 'parent' not in fm.columns:
+    return pd.DataFrame(columns=['record_id', 'source', 'category'])
+  fm = fm[fm['parent'] == 'Direct sources of capital']
+  return apply_record_overrides(pd.DataFrame({
+    'record_id': fm['record_id'],
+    'source':    fm.get('source'),
+    'category':  recode_categories(fm['category']),
+  }).reset_index(drop=True))
+
+
+@register_table('treemap_amount_long')
+def _treemap_amount_long(snapshot):
+  """
+  capital_mix items with numeric amounts (treemap dollar view and the
+  indicators), with the data fixes applied.
+  """
+  cm = get_table(snapshot, 'capital_mix_long')
+  if cm.empty:
+    return pd.DataFrame(columns=['record_id', 'source', 'category', 'amount'])
+  return apply_record_overrides(pd.DataFrame({
+    'record_id': cm['record_id'],
+    'source':    cm.get('source'),
+    'category':  recode_categories(cm['category']),
+    'amount':    pd.to_numeric(cm.get('amount'), errors='coerce'),
+  }))
 
 
 def get_category_order(df):
@@ -305,57 +341,102 @@ def get_category_order(df):
 
 # ==================== MAIN CALLABLE ====================
 
+# What each chart returned by get_all_capital_charts() is built from, in
+# response order. Every chart also reads capital_mix_processed through the
+# empty-data guard. The Sankey selects its rows without the project type
+# filter and uses the selected project types only to pick destination nodes.
+CAPITAL_CHART_INPUTS = {
+  'time_chart':        ChartInputs(['capital_mix_processed']),
+  'sankey':            ChartInputs(['capital_mix_processed'],
+                                   dimensions=['provinces', 'stages', 'indigenous_ownership', 'project_scale'],
+                                   parameters=['proj_types']),
+  'stacked_bar':       ChartInputs(['capital_mix_processed']),
+  'box_plot':          ChartInputs(['snapshot', 'capital_mix_processed']),
+  'bottleneck_chart':  ChartInputs(['snapshot', 'capital_mix_processed']),
+  'treemap':           ChartInputs(['treemap_count_long', 'treemap_amount_long', 'capital_mix_processed']),
+  'scale_pies':        ChartInputs(['capital_mix_processed']),
+  'alt_financing_bar': ChartInputs(['snapshot', 'capital_mix_processed']),
+  'indicators':        ChartInputs(['snapshot', 'treemap_amount_long', 'capital_mix_processed']),
+}
+CAPITAL_CHART_KEYS = list(CAPITAL_CHART_INPUTS)
+
+
 @anvil.server.callable
+@cached_result('get_all_capital_charts', CAPITAL_CHART_INPUTS)
 def get_all_capital_charts(provinces=None, proj_types=None, stages=None,
-                           indigenous_ownership=None, project_scale=None):
+                           indigenous_ownership=None, project_scale=None,
+                           charts=None):
   """
-  Single server call returning all chart figures and indicator values.
-  Data is loaded and processed once, shared across all chart builders.
+  Single server call returning the requested chart figures (all of
+  CAPITAL_CHART_KEYS when charts is None). Only the requested charts are
+  built; the filtered data they share is selected once per call.
+  cached_result() adds the previous=... argument (CHART_UNCHANGED markers).
   apply_display_template() is called here on every figure — chart functions
   only need to set chart-specific properties.
 
-  Returns a dict with keys:
+  Returns a dict with the requested keys out of:
     time_chart, sankey, stacked_bar, box_plot, bottleneck_chart,
-    treemap, scale_pies, indicators
+    treemap, scale_pies, alt_financing_bar,
+    indicators (dict of headline numbers, see calculate_indicators_internal)
   """
-  # ── Load and process data once ──
-  df_raw         = get_data()
-  df_capital_mix = process_capital_mix_data(df_raw)
+  keys = requested_charts(charts, CAPITAL_CHART_KEYS)
+
+  # ── Shared snapshot + filter index (both built once per dataset) ──
+  df_raw = get_snapshot()
+  index  = get_filter_index(df_raw)
+
+  # ── Record masks — applied to the raw frame and the derived long tables ──
+  spec = FilterSpec.from_kwargs(provinces, proj_types, stages, indigenous_ownership, project_scale)
+  mask = index.mask(spec)
 
-  # ── Three filter variants ──
-  df_raw_filtered           = apply_filters(df_raw,         provinces, proj_types, stages, indigenous_ownership, project_scale)
-  df_capital_filtered       = apply_filters(df_capital_mix, provinces, proj_types, stages, indigenous_ownership, project_scale)
-  df_capital_no_proj_filter = apply_filters(df_capital_mix, provinces, None,       stages, indigenous_ownership, project_scale)
-  # ^ Sankey excludes proj_type filter so all project types appear as destination nodes
+  df_raw_filtered     = index.rows(mask)
+  df_capital_filtered = index.table('capital_mix_processed', mask)
+
+  # ── Indicators — reduced from the metric store, no long-table scan ──
+  results = {}
+  if 'indicators' in keys:
+    results['indicators'] = calculate_indicators_internal(get_capital_metrics(df_raw), mask)
+  chart_keys = [k for k in keys if k != 'indicators']
 
   # ── Guard: return empty figures if nothing matches ──
   if df_capital_filtered.empty:
     empty_fig = go.Figure()
     empty_fig.update_layout(title=dict(text='No data available for selected filters'))
-    return {k: empty_fig for k in [
-      'box_plot', 'sankey', 'time_chart', 'stacked_bar',
-      'bottleneck_chart', 'treemap', 'scale_pies', 'alt_financing_bar',
-    ]}
+    return {k: results.get(k, empty_fig) for k in keys}
 
   # ── Category order — computed once, reused across charts ──
   cat_order     = get_category_order(df_capital_filtered)
   cat_order_rev = list(reversed(cat_order))
 
-    # ── Build all charts and apply the display template to each ──
-  sankey_fig = apply_display_template(create_sankey_internal(df_capital_no_proj_filter, proj_types))
-  sankey_fig.update_layout(margin=dict(t=80)) 
-
-  return {
-    'time_chart':         apply_display_template(create_time_chart_internal(df_capital_filtered,       cat_order)),
-    'sankey':             sankey_fig,
-    'stacked_bar':        apply_display_template(create_stacked_bar_internal(df_capital_filtered,      cat_order_rev)),
-    'box_plot':           apply_display_template(create_box_plot_internal(df_raw_filtered,             cat_order_rev)),
-    'bottleneck_chart':   apply_display_template(create_bottleneck_lollipop_internal(df_raw_filtered)),
-    'treemap':            apply_display_template(create_treemap_internal(df_raw_filtered)),
-    'scale_pies':         apply_display_template(create_scale_pies_internal(df_capital_filtered)),
-    'alt_financing_bar': apply_display_template(create_alt_financing_bar_internal(df_raw_filtered)),
+  def _sankey():
+    # Sankey excludes proj_type filter so all project types appear as destination nodes
+    mask_no_proj = index.mask(spec.without('proj_types'))
+    return create_sankey_internal(index.table('capital_mix_processed', mask_no_proj),
+                                  spec.proj_types)
+
+  builders = {
+    'time_chart':        lambda: create_time_chart_internal(df_capital_filtered, cat_order),
+    'sankey':            _sankey,
+    'stacked_bar':       lambda: create_stacked_bar_internal(df_capital_filtered, cat_order_rev),
+    'box_plot':          lambda: create_box_plot_internal(df_raw_filtered, cat_order_rev),
+    'bottleneck_chart':  lambda: create_bottleneck_lollipop_internal(df_raw_filtered),
+    'treemap':           lambda: create_treemap_internal(index.table('treemap_count_long',  mask),
+                                                         index.table('treemap_amount_long', mask)),
+    'scale_pies':        lambda: create_scale_pies_internal(df_capital_filtered),
+    'alt_financing_bar': lambda: create_alt_financing_bar_internal(df_raw_filtered),
   }
 
+  # ── Build the requested charts and apply the display template to each ──
+  # (in finish, so a Sankey built after its budget ran out gets it too)
+  def _finish(key, fig):
+    fig = apply_display_template(fig)
+    if key == 'sankey':
+      fig.update_layout(margin=dict(t=80))
+    return fig
+
+  results.update(build_charts('Capital', builders, chart_keys, finish=_finish))
+  return {k: results[k] for k in keys}
+
 
 # ==================== CHART CREATION ====================
 # Each function sets only chart-specific properties.
@@ -363,22 +444,25 @@ def get_all_capital_charts(provinces=None, proj_types=None, stages=None,
 # by apply_display_template() in get_all_capital_charts() above.
 # Title text is still set here since it is chart-specific content.
 
+# Percentage column → standardised category name, resolved once at import
+BOX_PLOT_CATEGORIES = {
+  col: standardize_category_name(col.replace('total_percent_', '').replace('_', ' '))
+  for col in [
+    'total_percent_grants', 'total_percent_equity', 'total_percent_debts',
+    'total_percent_internal', 'total_percent_community_finance', 'total_percent_crowdfund'
+  ]
+}
+
 def create_box_plot_internal(df, category_order):
   """
   Box plot: each financing category's percentage share of total project costs.
   Individual data points overlaid on boxes.
   Chart-specific: x-axis tick angle, y-axis % suffix, axis lines, no legend.
   """
-  relevant_columns = [
-    'total_percent_grants', 'total_percent_equity', 'total_percent_debts',
-    'total_percent_internal', 'total_percent_community_finance', 'total_percent_crowdfund'
-  ]
+  relevant_columns = list(BOX_PLOT_CATEGORIES)
   df_long = df[relevant_columns].melt(var_name='category', value_name='percent')
   df_long = df_long[df_long['percent'] > 0]
-  df_long['category'] = (df_long['category']
-    .str.replace('total_percent_', '', regex=False)
-    .str.replace('_', ' ', regex=False)
-    .apply(standardize_category_name))
+  df_long['category'] = df_long['category'].map(BOX_PLOT_CATEGORIES)
 
   filtered_order = [c for c in category_order if c in df_long['category'].values]
   color_map = {c: COLOUR_MAPPING.get(c, '#808080') for c in df_long['category'].unique()}
@@ -408,7 +492,7 @@ def create_time_chart_internal(df, category_order):
   df          = df[df['category'] != 'Internal capital']
   averages    = df.groupby('category')['time_to_funding'].mean().reindex(category_order)
   bar_colors  = [COLOUR_MAPPING.get(c, '#808080') for c in averages.index]
-  text_colors = [get_contrast_color(c) for c in bar_colors]
+  text_colors = [contrast_color(c) for c in bar_colors]
 
   fig = go.Figure(data=[go.Bar(
     y=averages.index, x=averages.values, orientation='h',
@@ -427,6 +511,11 @@ def create_time_chart_internal(df, category_order):
   return fig
 
 
+def _link_rgba(categories):
+  """Link colours for a column of categories (grey when unmapped)."""
+  return categories.map(LINK_RGBA).fillna(LINK_GREY).to_numpy(dtype=object)
+
+
 def create_sankey_internal(df, proj_types=None):
   """
   Sankey: capital flow from Funding Source → Category → Project Type.
@@ -435,10 +524,8 @@ def create_sankey_internal(df, proj_types=None):
   Chart-specific: node/link colours, bold node labels.
   Note: proj_type filter excluded from input df — all project types appear.
   """
-  df = df.copy()
-  for col in ['project_type', 'amount', 'category', 'source']:
-    if col not in df.columns:
-      df[col] = None
+  # Only the four columns the Sankey uses are copied / exploded
+  df = df.reindex(columns=['project_type', 'amount', 'category', 'source'])
 
   df['project_type'] = df['project_type'].apply(
     lambda x: x if isinstance(x, list) else ([] if pd.isna(x) else [x])
@@ -449,9 +536,7 @@ def create_sankey_internal(df, proj_types=None):
   df = group_small_sources(df, by='pct_within_category', threshold=0.03)
   
   # Split amount evenly across project types
-  df['pt_count'] = df['project_type'].apply(len).replace(0, 1)
-  # Split amount evenly across project types
-  df['pt_count'] = df['project_type'].apply(len).replace(0, 1)
+  df['pt_count'] = df['project_type'].map(len).replace(0, 1)
   df['amount']   = df['amount'] / df['pt_count']
   df = df.explode('project_type').reset_index(drop=True)
 
@@ -459,68 +544,60 @@ def create_sankey_internal(df, proj_types=None):
     df = df[df['project_type'].isin(proj_types)]
   df = df.drop(columns=['pt_count'], errors='ignore')
 
-  df_internal = df[df['category'] == 'Internal capital'].copy()
-  df_other    = df[df['category'] != 'Internal capital'].copy()
+  is_internal = (df['category'] == 'Internal capital').to_numpy()
+  df_internal = df[is_internal]
+  df_other    = df[~is_internal]
 
-  sources_list    = list(df_other['source'].dropna().unique())
-  categories_list = list(df_other['category'].dropna().unique())
-  proj_list       = list(df['project_type'].dropna().unique())
-
-  all_nodes = []
-  for lst in (sources_list, categories_list, ['Internal capital'], proj_list):
-    for item in lst:
-      if item not in all_nodes:
-        all_nodes.append(item)
-  node_index = {label: i for i, label in enumerate(all_nodes)}
+  # ── Nodes: sources, categories, Internal capital, project types (first occurrence wins) ──
+  sources_list    = pd.unique(df_other['source'].dropna())
+  categories_list = pd.unique(df_other['category'].dropna())
+  proj_list       = pd.unique(df['project_type'].dropna())
+  all_nodes  = list(dict.fromkeys([*sources_list, *categories_list, 'Internal capital', *proj_list]))
+  node_index = pd.Index(all_nodes, dtype=object)
 
+  # ── Links as code arrays: source → category, category → project, internal → project ──
   agg_s2c = df_other.groupby(['source',   'category'],     dropna=False)['amount'].sum().reset_index()
   agg_c2p = df_other.groupby(['category', 'project_type'], dropna=False)['amount'].sum().reset_index()
   agg_i2p = df_internal.groupby(['project_type'],          dropna=False)['amount'].sum().reset_index()
 
-  sources = ([node_index.get(r['source'])   for _, r in agg_s2c.iterrows()] +
-             [node_index.get(r['category']) for _, r in agg_c2p.iterrows()] +
-             [node_index.get('Internal capital')] * len(agg_i2p))
-  targets = ([node_index.get(r['category'])    for _, r in agg_s2c.iterrows()] +
-             [node_index.get(r['project_type'])for _, r in agg_c2p.iterrows()] +
-             [node_index.get(r['project_type'])for _, r in agg_i2p.iterrows()])
-  values  = list(agg_s2c['amount']) + list(agg_c2p['amount']) + list(agg_i2p['amount'])
-
-  def make_transparent(color):
-    try:
-      if isinstance(color, str) and color.startswith('#') and len(color) == 7:
-        r, g, b = int(color[1:3],16), int(color[3:5],16), int(color[5:7],16)
-        return f'rgba({r},{g},{b},0.3)'
-    except Exception:
-      pass
-    return 'rgba(128,128,128,0.3)'
-
-  link_colors = (
-    [make_transparent(COLOUR_MAPPING.get(r['category'], '#808080')) for _, r in agg_s2c.iterrows()] +
-    [make_transparent(COLOUR_MAPPING.get(r['category'], '#808080')) for _, r in agg_c2p.iterrows()] +
-    [make_transparent(COLOUR_MAPPING.get('Internal capital', '#808080'))] * len(agg_i2p)
-  )
+  internal_idx = node_index.get_loc('Internal capital')
+  sources = np.concatenate([
+    node_index.get_indexer(agg_s2c['source']),
+    node_index.get_indexer(agg_c2p['category']),
+    np.full(len(agg_i2p), internal_idx),
+  ])
+  targets = np.concatenate([
+    node_index.get_indexer(agg_s2c['category']),
+    node_index.get_indexer(agg_c2p['project_type']),
+    node_index.get_indexer(agg_i2p['project_type']),
+  ])
+  values = np.concatenate([agg_s2c['amount'], agg_c2p['amount'], agg_i2p['amount']]).astype(float)
+  link_colors = np.concatenate([
+    _link_rgba(agg_s2c['category']),
+    _link_rgba(agg_c2p['category']),
+    np.full(len(agg_i2p), LINK_RGBA.get('Internal capital', LINK_GREY), dtype=object),
+  ])
 
   # Tiny invisible link keeps Internal capital in the middle column
-  internal_idx = node_index.get('Internal capital')
-  if sources_list and internal_idx is not None:
-    sources     = list(sources)     + [node_index.get(sources_list[0])]
-    targets     = list(targets)     + [internal_idx]
-    values      = list(values)      + [0.001]
-    link_colors = list(link_colors) + ['rgba(0,0,0,0)']
-
-  valid = [(s, t, v, c) for s, t, v, c in zip(sources, targets, values, link_colors)
-           if s is not None and t is not None and v and v > 0]
-  if not valid:
+  if len(sources_list):
+    sources     = np.append(sources, node_index.get_loc(sources_list[0]))
+    targets     = np.append(targets, internal_idx)
+    values      = np.append(values, 0.001)
+    link_colors = np.append(link_colors, 'rgba(0,0,0,0)')
+
+  valid = (sources >= 0) & (targets >= 0) & (values > 0)
+  if not valid.any():
     fig = go.Figure()
     fig.update_layout(title=dict(text='No data for selected filters'))
     return fig
 
-  sv, tv, vv, cv = zip(*valid)
-  source_to_cat  = (df_other.groupby('source')['category'].first().to_dict()
-                    if not df_other.empty else {})
+  # ── Node colours: sources take their category's colour ──
+  source_to_cat = (df_other.groupby('source')['category'].first().to_dict()
+                   if not df_other.empty else {})
+  source_set, category_set = set(sources_list), set(categories_list) | {'Internal capital'}
   node_colors = [
-    COLOUR_MAPPING.get(source_to_cat.get(n), '#808080') if n in sources_list else
-    COLOUR_MAPPING.get(n, '#808080')                    if n in categories_list or n == 'Internal capital' else
+    COLOUR_MAPPING.get(source_to_cat.get(n), '#808080') if n in source_set else
+    COLOUR_MAPPING.get(n, '#808080')                    if n in category_set else
     '#696969'
     for n in all_nodes
   ]
@@ -533,7 +610,8 @@ def create_sankey_internal(df, proj_types=None):
       hovertemplate='%{label}<br>$%{value:,.0f}<extra></extra>'
     ),
     link=dict(
-      source=list(sv), target=list(tv), value=list(vv), color=list(cv),
+      source=sources[valid].tolist(), target=targets[valid].tolist(),
+      value=values[valid].tolist(), color=link_colors[valid].tolist(),
       hovertemplate='%{source.label} → %{target.label}<br>$%{value:,.0f}<extra></extra>'
     ),
     # Bold node labels — intentional override of base font weight
@@ -597,18 +675,10 @@ def create_stacked_bar_internal(df, category_order):
 
   group_order = [c for c in category_order if c in df_grouped['category'].values]
 
-  def generate_shades(hex_color, n):
-    if not hex_color or not hex_color.startswith('#'):
-      hex_color = '#808080'
-    r, g, b = int(hex_color[1:3],16), int(hex_color[3:5],16), int(hex_color[5:7],16)
-    return [f'#{min(255,int(r*(0.75+0.6*i/max(n-1,1)))):02x}'
-            f'{min(255,int(g*(0.75+0.6*i/max(n-1,1)))):02x}'
-            f'{min(255,int(b*(0.75+0.6*i/max(n-1,1)))):02x}' for i in range(n)]
-
   color_map, order_map = {}, {}
   for grp in group_order:
     srcs   = df_grouped[df_grouped['category'] == grp].sort_values('amount', ascending=False)['source'].tolist()
-    shades = generate_shades(COLOUR_MAPPING.get(grp, '#808080'), len(srcs))
+    shades = brightness_shades(COLOUR_MAPPING.get(grp, '#808080'), len(srcs))
     for i, src in enumerate(srcs):
       color_map[(grp, src)] = shades[i]
       order_map[(grp, src)] = i
@@ -631,7 +701,7 @@ def create_stacked_bar_internal(df, category_order):
         name=src,
         y=[row['category']], x=[row['percentage']], orientation='h',
         text=[label], textposition='inside',
-        textfont=dict(size=FONT_SIZE, color=get_contrast_color(color), family=FONT_FAMILY),
+        textfont=dict(size=FONT_SIZE, color=contrast_color(color), family=FONT_FAMILY),
         marker=dict(color=color),
         hovertemplate='%{fullData.name}<br>%{x:.1f}%<extra></extra>',
         showlegend=False
@@ -715,46 +785,16 @@ def create_bottleneck_lollipop_internal(df):
   return fig
 
 
-def create_treemap_internal(df):
+def create_treemap_internal(df_count_long, df_amount_long):
   """
   Treemap with toggle between project count (from financing_mech, filtered to
   direct sources of capital) and dollar amount (from capital_mix).
   Tile size = count or $ depending on selected mode.
+  Inputs are the treemap_count_long / treemap_amount_long derived tables,
+  already filtered to the selected records.
   Chart-specific: per-tile text colours auto-contrasted; toggle buttons added
   to switch between the two metrics.
   """
-  if df.empty or 'financing_mech' not in df.columns or 'capital_mix' not in df.columns:
-    fig = go.Figure()
-    fig.update_layout(title=dict(text='No data available for selected filters'))
-    return fig
-
-  # ── Count data: from financing_mech, filtered to direct sources only ──
-  count_rows = []
-  for _, row in df.iterrows():
-    for item in (row.get('financing_mech') or []):
-      if item.get('parent') != 'Direct sources of capital':
-        continue
-      count_rows.append({
-        'record_id': row.get('record_id'),
-        'source':    item.get('source'),
-        'category':  standardize_category_name(item.get('category')),
-      })
-
-  # ── Amount data: from capital_mix ──
-  amount_rows = []
-  for _, row in df.iterrows():
-    for item in (row.get('capital_mix') or []):
-      amount_rows.append({
-        'record_id': row.get('record_id'),
-        'source':    item.get('source'),
-        'category':  standardize_category_name(item.get('category')),
-        'amount':    pd.to_numeric(item.get('amount'), errors='coerce') or 0,
-      })
-
-  df_count_long  = pd.DataFrame(count_rows)
-  df_amount_long = pd.DataFrame(amount_rows)
-
-
   if df_count_long.empty and df_amount_long.empty:
     fig = go.Figure()
     fig.update_layout(title=dict(text='No financing data available'))
@@ -779,48 +819,48 @@ def create_treemap_internal(df):
     omit_categories=['Crowdfunding'],
   )
 
-  # ── Aggregate to (source, category, value) shape ──
-  df_count  = df_count_long.groupby(['source', 'category']).size().reset_index(name='value')
-  df_amount = df_amount_long.groupby(['source', 'category'])['amount'].sum().reset_index(name='value')
-
-  # ── Helper to build one treemap trace ──
-  def build_trace(grouped_df, visible, hover_prefix=''):
-    if grouped_df.empty:
+  # ── Aggregate both views to (view, source, category) → value in one pass ──
+  both = pd.concat([
+    df_count_long.reindex(columns=['source', 'category']).assign(view='count', value=1),
+    df_amount_long.reindex(columns=['source', 'category', 'amount'])
+      .rename(columns={'amount': 'value'}).assign(view='amount'),
+  ], ignore_index=True)
+  tiles = both.groupby(['view', 'source', 'category'])['value'].sum()
+
+  # ── Helper to build one treemap trace from its (source, category) tiles ──
+  def build_trace(view, visible, hover_prefix=''):
+    if view not in tiles.index.get_level_values('view'):
       return go.Treemap(labels=[], parents=[], values=[], visible=visible)
 
-    cat_totals = grouped_df.groupby('category')['value'].sum().to_dict()
-    labels, parents, values, colors, text_colors = [], [], [], [], []
-
-    for cat in grouped_df['category'].unique():
-      labels.append(cat)
-      parents.append('')
-      values.append(cat_totals[cat])
-      col = COLOUR_MAPPING.get(cat, '#808080')
-      colors.append(col)
-      text_colors.append(get_contrast_color(col))
-
-    for _, r in grouped_df.iterrows():
-      labels.append(wrap_text(r['source'], width=20) if r['source'] else r['source'])
-      parents.append(r['category'])
-      values.append(r['value'])
-      col = COLOUR_MAPPING.get(r['category'], '#808080')
-      colors.append(col)
-      text_colors.append(get_contrast_color(col))
+    view_tiles = tiles.xs(view, level='view')
+    if view == 'count':
+      view_tiles = view_tiles.astype('int64')   # row counts
+    sources    = view_tiles.index.get_level_values('source')
+    categories = view_tiles.index.get_level_values('category')
+    cat_order  = pd.unique(categories)
+    cat_totals = view_tiles.groupby(level='category', sort=False).sum().reindex(cat_order)
+
+    # Category tiles first, then one tile per source under its category
+    tile_colors = {c: COLOUR_MAPPING.get(c, '#808080') for c in cat_order}
+    colors      = [tile_colors[c] for c in cat_order] + [tile_colors[c] for c in categories]
+    contrast    = {col: contrast_color(col) for col in set(colors)}
 
     return go.Treemap(
-      labels=labels, parents=parents, values=values,
+      labels=list(cat_order) + [wrap_text(src, width=20) if src else src for src in sources],
+      parents=[''] * len(cat_order) + list(categories),
+      values=cat_totals.tolist() + view_tiles.tolist(),
       branchvalues='total',
       visible=visible,
       marker=dict(colors=colors, line=dict(color='white', width=2)),
-      textfont=dict(family=FONT_FAMILY, size=FONT_SIZE, color=text_colors),
+      textfont=dict(family=FONT_FAMILY, size=FONT_SIZE, color=[contrast[col] for col in colors]),
       textposition='middle center',
       hovertemplate='<b>%{label}</b><br>' + hover_prefix + '%{value:,.0f}<extra></extra>',
     )
 
   # ── Build figure with both traces, count visible by default ──
   fig = go.Figure()
-  fig.add_trace(build_trace(df_count,  visible=True,  hover_prefix=''))
-  fig.add_trace(build_trace(df_amount, visible=False, hover_prefix='$'))
+  fig.add_trace(build_trace('count',  visible=True,  hover_prefix=''))
+  fig.add_trace(build_trace('amount', visible=False, hover_prefix='$'))
 
   fig.update_layout(
     margin=dict(l=0, r=0, b=0),
@@ -854,11 +894,11 @@ def create_treemap_internal(df):
 
 
 def create_scale_pies_internal(df):
-  SCALE_ORDER = [
-    'Micro (< $100K)', 'Small ($100K-$1M)', 'Medium ($1M-$5M)',
-    'Large ($5M-$25M)', 'Very Large ($25M-$100M)', 'Mega (> $100M)'
-  ]
-  scales = [s for s in SCALE_ORDER if s in df['project_scale'].values]
+  # ── Both views for every scale in one grouped pass (Derived_Tables.scale_breakdown) ──
+  # View A: Total Funding (dollar-weighted — sum of amount)
+  # View B: Typical Project (project-weighted — mean of project-level %s)
+  breakdown = scale_breakdown(df, ['category'], 'amount', shares=True)
+  scales    = breakdown.scales
   if not scales:
     fig = go.Figure()
     fig.update_layout(title=dict(text='No data available'))
@@ -870,28 +910,9 @@ def create_scale_pies_internal(df):
   n_pies = len(scales)
 
   for i, scale in enumerate(scales):
-    sub = df[df['project_scale'] == scale]
-    n   = sub['record_id'].nunique()
-
-    # ── View A: Total Funding (dollar-weighted — sum of amount) ──
-    total_by_cat = sub.groupby('category', as_index=False)['amount'].sum()
-    total_by_cat = total_by_cat.sort_values('category').reset_index(drop=True)
-
-    # ── View B: Typical Project (project-weighted — mean of project-level %s) ──
-    proj_cat   = sub.groupby(['record_id', 'category'])['amount'].sum().reset_index()
-    proj_total = sub.groupby('record_id')['amount'].sum()
-    proj_cat['pct'] = proj_cat.apply(
-      lambda r: (r['amount'] / proj_total[r['record_id']] * 100)
-      if proj_total[r['record_id']] > 0 else 0,
-      axis=1,
-    )
-    avg_pct = (
-      proj_cat.pivot_table(index='record_id', columns='category', values='pct', fill_value=0)
-        .mean()
-        .reset_index()
-    )
-    avg_pct.columns = ['category', 'avg_pct']
-    avg_pct = avg_pct.sort_values('category').reset_index(drop=True)
+    n            = breakdown.records.get(scale, 0)
+    total_by_cat = breakdown.totals[scale]
+    avg_pct      = breakdown.shares[scale]
 
     pad     = 0.01
     x_start = i / n_pies + pad
@@ -906,10 +927,10 @@ def create_scale_pies_internal(df):
 
     # Trace A — Total Funding (visible)
     fig.add_trace(go.Pie(
-      labels=total_by_cat['category'],
-      values=total_by_cat['amount'],
+      labels=total_by_cat.index.to_numpy(),
+      values=total_by_cat.to_numpy(),
       domain=domain, title=title_style,
-      marker=dict(colors=[COLOUR_MAPPING.get(c, '#808080') for c in total_by_cat['category']]),
+      marker=dict(colors=[COLOUR_MAPPING.get(c, '#808080') for c in total_by_cat.index]),
       texttemplate='%{percent:.1%}', textposition='inside',
       textfont=dict(family=FONT_FAMILY, size=FONT_SIZE, color='white'),
       sort=False,
@@ -919,10 +940,10 @@ def create_scale_pies_internal(df):
 
     # Trace B — Typical Project (hidden)
     fig.add_trace(go.Pie(
-      labels=avg_pct['category'],
-      values=avg_pct['avg_pct'],
+      labels=avg_pct.index.to_numpy(),
+      values=avg_pct.to_numpy(),
       domain=domain, title=title_style,
-      marker=dict(colors=[COLOUR_MAPPING.get(c, '#808080') for c in avg_pct['category']]),
+      marker=dict(colors=[COLOUR_MAPPING.get(c, '#808080') for c in avg_pct.index]),
       texttemplate='%{percent:.1%}', textposition='inside',
       textfont=dict(family=FONT_FAMILY, size=FONT_SIZE, color='white'),
       sort=False,
@@ -1030,21 +1051,6 @@ def create_alt_financing_bar_internal(df):
 
   df_grouped = sub.groupby(['group', 'category', 'source'], as_index=False)['count'].sum()
 
-  def generate_shades(base_color, n):
-    if not base_color or not base_color.startswith('#'):
-      base_color = '#808080'
-    if n == 1:
-      return [base_color]
-    r, g, b = int(base_color[1:3],16), int(base_color[3:5],16), int(base_color[5:7],16)
-    shades = []
-    for i in range(n):
-      amount = 0.55 * i / (n - 1)
-      nr = int(r + (255 - r) * amount)
-      ng = int(g + (255 - g) * amount)
-      nb = int(b + (255 - b) * amount)
-      shades.append(f'#{nr:02x}{ng:02x}{nb:02x}')
-    return shades
-
   def text_color_for(bg):
     if not bg or not bg.startswith('#') or len(bg) < 7:
       return '#000000'
@@ -1063,7 +1069,7 @@ def create_alt_financing_bar_internal(df):
 
     colour_key = GROUP_TO_COLOUR_KEY.get(grp, grp)
     base       = COLOUR_MAPPING.get(colour_key, '#808080')
-    shades     = generate_shades(base, len(grp_data))
+    shades     = tint_shades(base, len(grp_data), 0.55)
 
     for i, (_, row) in enumerate(grp_data.iterrows()):
       color = shades[i]
@@ -1100,6 +1106,98 @@ def create_alt_financing_bar_internal(df):
     title=dict(text='Alternative Structures and Support Mechanisms Reported by Respondents'),
   )
   return fig
+# ==================== INDICATORS ====================
+# Headline numbers for the Capital Explorer, served from a metric store of
+# per-record pre-aggregates built once per dataset snapshot. An indicator
+# request only reduces the store's arrays over the request's record mask;
+# it never re-scans the long tables.
+
+GRANT_CATEGORY = 'Grants & non-repayable contributions'
+
+CapitalMetrics = namedtuple('CapitalMetrics', [
+  'cost',        # total_cost per record (NaN if missing)
+  'capital',     # sum of capital_mix amounts per record
+  'grants',      # ... of which grants
+  'categories',  # financing categories with time-to-funding answers
+  'time_sum',    # (records × categories) sum of time_to_funding, in years
+  'time_n',      # (records × categories) number of time_to_funding answers
+])
+
+
+def get_capital_metrics(snapshot):
+  """Return the CapitalMetrics store for snapshot, building it on first use."""
+  return derived(snapshot, 'capital_metrics', lambda: _build_capital_metrics(snapshot))
+
+
+def _build_capital_metrics(snapshot):
+  """
+  Per-record pre-aggregates, row-aligned with the snapshot (and so with the
+  FilterIndex record masks). Amounts come from treemap_amount_long (one row
+  per capital_mix item); time-to-funding from capital_mix_processed, the
+  rows the time chart averages. Both carry the Recode_Rules record overrides.
+  """
+  index  = get_filter_index(snapshot)
+  n_rows = index.n_rows
+
+  amounts = get_table(snapshot, 'treemap_amount_long')
+  pos     = index.record_positions('treemap_amount_long')
+  amount  = amounts['amount'].fillna(0).to_numpy(dtype=float)
+  keep    = pos >= 0
+  grant   = keep & (amounts['category'] == GRANT_CATEGORY).to_numpy()
+  capital = np.bincount(pos[keep],  weights=amount[keep],  minlength=n_rows)
+  grants  = np.bincount(pos[grant], weights=amount[grant], minlength=n_rows)
+
+  cm    = get_table(snapshot, 'capital_mix_processed')
+  times = pd.to_numeric(cm['time_to_funding'], errors='coerce').to_numpy(dtype=float)
+  codes, categories = pd.factorize(cm['category'])
+  cm_pos = index.record_positions('capital_mix_processed')
+  valid  = (cm_pos >= 0) & (codes >= 0) & ~np.isnan(times)
+  time_sum = np.zeros((n_rows, len(categories)))
+  time_n   = np.zeros((n_rows, len(categories)))
+  np.add.at(time_sum, (cm_pos[valid], codes[valid]), times[valid])
+  np.add.at(time_n,   (cm_pos[valid], codes[valid]), 1)
+  answered = time_n.any(axis=0)
+
+  return CapitalMetrics(
+    cost=pd.to_numeric(_record_col(snapshot, 'total_cost'), errors='coerce').astype(float),
+    capital=capital,
+    grants=grants,
+    categories=list(categories[answered]),
+    time_sum=time_sum[:, answered],
+    time_n=time_n[:, answered],
+  )
+
+
+def calculate_indicators_internal(metrics, mask):
+  """
+  Headline indicators over the records selected by mask (None = all):
+    projects             — number of records
+    total_capital        — capital mobilized (sum of capital_mix amounts)
+    median_project_cost  — median total_cost of records reporting one
+    grant_share          — grants as a fraction of total_capital
+    avg_time_to_funding  — {category: average years}, fastest first
+  Values are plain floats; None where there is nothing to average.
+  """
+  rows    = slice(None) if mask is None else mask
+  capital = float(metrics.capital[rows].sum())
+  costs   = metrics.cost[rows]
+  costs   = costs[np.isfinite(costs) & (costs > 0)]
+
+  time_n   = metrics.time_n[rows].sum(axis=0)
+  time_sum = metrics.time_sum[rows].sum(axis=0)
+  averages = sorted(
+    (time_sum[i] / time_n[i], category)
+    for i, category in enumerate(metrics.categories) if time_n[i]
+  )
+  return {
+    'projects':            int(len(metrics.cost) if mask is None else mask.sum()),
+    'total_capital':       capital,
+    'median_project_cost': float(np.median(costs)) if len(costs) else None,
+    'grant_share':         float(metrics.grants[rows].sum()) / capital if capital else None,
+    'avg_time_to_funding': {category: float(years) for years, category in averages},
+  }
+
+
 # ==================== EXPORT CALLABLE ====================
 
 @anvil.server.callable
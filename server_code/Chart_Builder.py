@@ -0,0 +1,527 @@
+"""
+Chart_Builder.py — Server module
+================================
+Runs the chart builders of a page callable once its filtered frames exist.
+
+The builders of one response are independent, so they run on one bounded,
+process-wide thread pool: concurrently with more than one worker configured
+(pandas and NumPy release the GIL for much of their work), one at a time in
+request order with one worker. They run off the calling thread even then, so
+their time budgets can be enforced; only when the pool has just been shut
+down by configure_chart_builds() do they run serially in the calling thread.
+
+Worker count: CHART_BUILD_WORKERS environment variable, else one worker per
+CPU up to MAX_CHART_BUILD_WORKERS; change it at runtime with
+configure_chart_builds().
+
+Time budgets: each chart has a budget in seconds, counted from the start
+of its page's build (CHART_BUILD_BUDGET_S environment variable, else
+DEFAULT_CHART_BUDGET_S; per page or per chart with configure_chart_budget()
+and clear_chart_budget(), None = unlimited). The response never waits past
+the last budget. A chart still building at its deadline is abandoned: it is
+returned as a placeholder figure whose config.CHART_RETRY key holds
+{'chart', 'build'}, and it keeps running in the background (a Python thread
+cannot be stopped) with its worker slot handed to the next chart; a chart
+that has not started by then is cancelled. wait_for_build() collects the
+figure of an abandoned build (see Result_Cache.retry_chart).
+
+Abandoned builds run beside the regular workers, at most
+MAX_ABANDONED_BUILDS at a time, so they never hold the workers' threads:
+  - builds are identified by (page, chart, identity), the identity coming
+    from a build_identities() context in the calling thread (the result
+    cache key of the chart); a chart whose identical build is still running
+    in the background is not built again — its placeholder points at that
+    build
+  - while MAX_ABANDONED_BUILDS abandoned builds are running, no new build
+    with a budget is started: those charts come back as placeholders with
+    no build, which retry_chart requests again
+
+A builder that raises can be replaced by a fallback figure (build_charts'
+fallback); the keys of such charts are reported to a fallback_charts()
+context in the calling thread, and an abandoned build that fell back is not
+passed to when_built() callbacks, so fallbacks are never cached as results.
+
+Every build is timed per (page, chart); get_chart_build_stats() returns the
+counts, durations and abandoned builds. benchmark_chart_builds() compares
+wall time of whole page builds across worker counts.
+
+Builders must not modify the frames they share. The unfiltered snapshot is
+read-only (Global_Server_Functions._SnapshotFrame), so builders that work
+on it already take copies before changing anything.
+
+Usage in a page callable:
+    figures = build_charts('Capital', builders, keys,
+                           finish=lambda key, fig: apply_display_template(fig))
+"""
+
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, CancelledError, ThreadPoolExecutor, TimeoutError, wait
+
+from .config import CHART_RETRY
+
+
+# Upper bound for the default worker count (one per CPU)
+MAX_CHART_BUILD_WORKERS = 4
+
+# Budget (seconds) of a chart with none configured; None = unlimited
+DEFAULT_CHART_BUDGET_S = 10.0
+
+# Abandoned builds allowed to keep running at once; the pool has this many
+# threads beyond the workers for them
+MAX_ABANDONED_BUILDS = 4
+
+_POOL      = None
+_POOL_LOCK = threading.Lock()
+_WORKERS   = int(os.getenv('CHART_BUILD_WORKERS') or
+                 min(os.cpu_count() or 1, MAX_CHART_BUILD_WORKERS))
+
+_UNSET   = object()
+_BUDGETS = {}   # (page, chart) or (page, None) -> seconds or None
+_DEFAULT_BUDGET = (float(os.environ['CHART_BUILD_BUDGET_S'])
+                   if os.getenv('CHART_BUILD_BUDGET_S') else DEFAULT_CHART_BUDGET_S)
+
+# Abandoned builds that were still running, kept for wait_for_build() (at
+# most MAX_KEPT_ABANDONED, oldest finished ones dropped first)
+MAX_KEPT_ABANDONED = 32
+_ABANDONED      = OrderedDict()   # build id -> Future of the finished figure
+_IN_BACKGROUND  = {}              # build id -> (page, chart, identity) or None, while running
+_ABANDONED_LOCK = threading.Lock()
+
+_TIMINGS      = {}   # (page, chart) -> [builds, total_s, max_s, last_s, abandoned]
+_TIMINGS_LOCK = threading.Lock()
+
+# Per calling thread: .fallbacks — key set of the active fallback_charts();
+# .identities — {chart key: identity} of the active build_identities()
+_LOCAL = threading.local()
+
+
+class _Slots:
+  """n build slots, granted in the order they are requested."""
+
+  def __init__(self, n):
+    self.free    = n
+    self.waiting = deque()
+    self.lock    = threading.Lock()
+
+  def acquire(self):
+    with self.lock:
+      if self.free and not self.waiting:
+        self.free -= 1
+        return
+      turn = threading.Event()
+      self.waiting.append(turn)
+    turn.wait()
+
+  def release(self):
+    with self.lock:
+      if self.waiting:
+        self.waiting.popleft().set()   # hand the slot straight to the next build
+      else:
+        self.free += 1
+
+
+_SLOTS = _Slots(_WORKERS)   # builds counted against _WORKERS
+
+
+def configure_chart_builds(workers):
+  """Set the number of chart build workers (1 = one build at a time)."""
+  global _WORKERS, _POOL, _SLOTS
+  with _POOL_LOCK:
+    _WORKERS = max(1, int(workers))
+    _SLOTS   = _Slots(_WORKERS)
+    if _POOL is not None:
+      _POOL.shutdown(wait=False)
+      _POOL = None
+
+
+def chart_build_workers():
+  return _WORKERS
+
+
+def configure_chart_budget(seconds, page=None, chart=None):
+  """
+  Set the build budget in seconds (None = unlimited) of one chart of a page,
+  of every chart of a page (chart=None), or the default (page=None).
+  """
+  global _DEFAULT_BUDGET
+  seconds = None if seconds is None else float(seconds)
+  if page is None:
+    _DEFAULT_BUDGET = seconds
+  else:
+    _BUDGETS[(page, chart)] = seconds
+
+
+def clear_chart_budget(page, chart=None):
+  """Drop a budget set with configure_chart_budget(seconds, page, chart)."""
+  _BUDGETS.pop((page, chart), None)
+
+
+def chart_budget(page, key):
+  """Budget in seconds of chart key on page, or None when unlimited."""
+  budget = _BUDGETS.get((page, key), _UNSET)
+  if budget is _UNSET:
+    budget = _BUDGETS.get((page, None), _DEFAULT_BUDGET)
+  return budget
+
+
+def _get_pool():
+  global _POOL
+  with _POOL_LOCK:
+    if _POOL is None:
+      _POOL = ThreadPoolExecutor(max_workers=_WORKERS + MAX_ABANDONED_BUILDS,
+                                 thread_name_prefix='chart-build')
+    return _POOL, _SLOTS
+
+
+class _Build:
+  """
+  One chart build on the pool, holding one of the _WORKERS slots while it
+  runs: queued → running → done, or abandoned (which frees the slot early).
+  """
+
+  def __init__(self, slots):
+    self.slots  = slots
+    self.state  = 'queued'
+    self.lock   = threading.Lock()
+    self.future = None
+
+  def run(self, fn):
+    if self.state == 'abandoned':
+      raise CancelledError()
+    self.slots.acquire()
+    with self.lock:
+      if self.state == 'abandoned':   # past its deadline before it started
+        self.slots.release()
+        raise CancelledError()
+      self.state = 'running'
+    try:
+      return fn()
+    finally:
+      with self.lock:
+        if self.state == 'running':
+          self.slots.release()
+        self.state = 'done'
+
+  def abandon(self):
+    """Stop waiting for the build; returns the state it was in."""
+    with self.lock:
+      state = self.state
+      if state == 'running':
+        self.slots.release()
+      if state != 'done':
+        self.state = 'abandoned'
+    return state
+
+
+def build_charts(page, builders, keys, finish=None, fallback=None):
+  """
+  {key: figure} for keys, each built by builders[key]() and passed through
+  finish(key, figure) when given.
+
+  A builder that raises is isolated from the others: with fallback, its
+  traceback is printed and fallback(key, exc) is used as its figure (and
+  key is added to the calling thread's fallback_charts() set); without one
+  the exception propagates once all builds have finished or been abandoned.
+
+  A chart not built within its budget (chart_budget) is returned as
+  chart_placeholder() instead, as is a chart that is not started because
+  its identical build is still running in the background or too many
+  abandoned builds are running (see the module docstring).
+  """
+  def run(key):
+    """(figure, built) — built is False when figure is the fallback."""
+    start = time.perf_counter()
+    try:
+      built = True
+      try:
+        figure = builders[key]()
+      except Exception as e:
+        if fallback is None:
+          raise
+        print(f'[{page}] ERROR in {key}:\n{traceback.format_exc()}')
+        figure, built = fallback(key, e), False
+      return (figure if finish is None else finish(key, figure)), built
+    finally:
+      _record_timing(page, key, time.perf_counter() - start)
+
+  budgets = {key: chart_budget(page, key) for key in keys}
+  start = time.perf_counter()
+  identities = getattr(_LOCAL, 'identities', None) or {}
+  ids     = {key: (page, key, identities[key]) for key in keys if key in identities}
+  figures = _not_started(page, keys, ids, budgets)
+  pending = [key for key in keys if key not in figures]
+
+  pool, slots = _get_pool()
+  builds = {key: _Build(slots) for key in pending}
+  try:
+    for key, build in builds.items():
+      build.future = pool.submit(build.run, lambda key=key: run(key))
+  except RuntimeError:   # pool shut down by configure_chart_builds()
+    results = {key: run(key) for key in pending}
+    _report_fallbacks(key for key, (_, built) in results.items() if not built)
+    figures.update((key, figure) for key, (figure, _) in results.items())
+    return {key: figures[key] for key in keys}
+
+  deadlines = {key: start + budgets[key] for key in pending if budgets[key] is not None}
+  errors, fell_back = [], []
+  pending = set(pending)
+  while pending:
+    now     = time.perf_counter()
+    overdue = [key for key in pending if deadlines.get(key, now + 1) <= now]
+    for key in overdue:
+      state = builds[key].abandon()
+      if state != 'done':
+        figures[key] = _abandoned(page, key, builds[key], budgets[key],
+                                  state == 'running', ids.get(key))
+        pending.discard(key)
+    if not pending:
+      break
+    next_deadline = min((deadlines[key] for key in pending if key in deadlines), default=None)
+    timeout = None if next_deadline is None else max(0.0, next_deadline - now)
+    done, _ = wait([builds[key].future for key in pending], timeout, FIRST_COMPLETED)
+    for key in [key for key in pending if builds[key].future in done]:
+      pending.discard(key)
+      try:
+        figures[key], built = builds[key].future.result()
+      except Exception as e:
+        errors.append(e)
+        continue
+      if not built:
+        fell_back.append(key)
+  _report_fallbacks(fell_back)
+  if errors:
+    raise errors[0]
+  return {key: figures[key] for key in keys}
+
+
+def _not_started(page, keys, ids, budgets):
+  """
+  {key: placeholder} for the charts build_charts() must not start: those
+  whose identical build (ids[key]) is still running in the background, and
+  while MAX_ABANDONED_BUILDS abandoned builds are running, every other chart
+  that has a budget (and so could be abandoned too).
+  """
+  placeholders = {}
+  with _ABANDONED_LOCK:
+    full = len(_IN_BACKGROUND) >= MAX_ABANDONED_BUILDS
+    running = {identity: b for b, identity in _IN_BACKGROUND.items() if identity is not None}
+    for key in keys:
+      build_id = running.get(ids.get(key))
+      if build_id is not None:
+        placeholders[key] = chart_placeholder(key, build_id)
+      elif full and budgets[key] is not None:
+        placeholders[key] = chart_placeholder(key, None)
+  refused = [key for key, figure in placeholders.items() if figure[CHART_RETRY]['build'] is None]
+  if refused:
+    print(f'[{page}] {", ".join(refused)} not started: '
+          f'{MAX_ABANDONED_BUILDS} abandoned builds still running')
+  return placeholders
+
+
+class build_identities:
+  """
+  Context manager identifying the builds of build_charts() calls in this
+  thread: the build of chart key is identified by (page, key,
+  identities[key]), and a chart whose identically identified build is
+  still running in the background reuses that build instead of starting
+  another. identities must only be equal for builds with the same inputs:
+      with build_identities({key: cache_key, ...}):
+        figures = page_callable(...)
+  """
+
+  def __init__(self, identities):
+    self.identities = identities
+
+  def __enter__(self):
+    self.outer = getattr(_LOCAL, 'identities', None)
+    _LOCAL.identities = self.identities
+    return self
+
+  def __exit__(self, *exc):
+    _LOCAL.identities = self.outer
+
+
+class fallback_charts:
+  """
+  Context manager collecting, as a set, the keys of the charts that
+  build_charts() calls in this thread returned as fallback figures:
+      with fallback_charts() as failed:
+        figures = page_callable(...)
+  """
+
+  def __enter__(self):
+    self.outer = getattr(_LOCAL, 'fallbacks', None)
+    _LOCAL.fallbacks = set()
+    return _LOCAL.fallbacks
+
+  def __exit__(self, *exc):
+    _LOCAL.fallbacks = self.outer
+
+
+def _report_fallbacks(keys):
+  collected = getattr(_LOCAL, 'fallbacks', None)
+  if collected is not None:
+    collected.update(keys)
+
+
+def _abandoned(page, key, build, budget, running, identity=None):
+  """
+  Placeholder for a build past its deadline; a running build is kept pending,
+  and counted against MAX_ABANDONED_BUILDS until it finishes.
+  """
+  build_id = None
+  if running:
+    build_id = uuid.uuid4().hex
+    with _ABANDONED_LOCK:
+      _ABANDONED[build_id] = build.future
+      _IN_BACKGROUND[build_id] = identity
+      finished = [b for b, f in _ABANDONED.items() if f.done()]
+      for old in finished[:max(0, len(_ABANDONED) - MAX_KEPT_ABANDONED)]:
+        del _ABANDONED[old]
+    build.future.add_done_callback(lambda f: _left_background(build_id))
+  else:
+    build.future.cancel()
+  with _TIMINGS_LOCK:
+    _TIMINGS.setdefault((page, key), [0, 0.0, 0.0, 0.0, 0])[4] += 1
+  print(f'[{page}] {key} exceeded its {budget:g}s budget; '
+        + ('still building in the background' if build_id else 'cancelled'))
+  return chart_placeholder(key, build_id)
+
+
+def _left_background(build_id):
+  with _ABANDONED_LOCK:
+    _IN_BACKGROUND.pop(build_id, None)
+
+
+def abandoned_builds_running():
+  """Number of abandoned builds still running in the background."""
+  with _ABANDONED_LOCK:
+    return len(_IN_BACKGROUND)
+
+
+def chart_placeholder(key, build_id):
+  """
+  Lightweight figure returned in place of chart key when it exceeded its
+  budget; its CHART_RETRY entry identifies the abandoned build (None when
+  the build was cancelled before it started).
+  """
+  return {
+    CHART_RETRY: {'chart': key, 'build': build_id},
+    'data':   [],
+    'layout': {'title': {'text': 'This chart is taking longer than usual — loading…'}},
+  }
+
+
+def is_placeholder(figure):
+  return isinstance(figure, dict) and CHART_RETRY in figure
+
+
+def when_built(build_id, callback):
+  """
+  Call callback(figure) once the abandoned build build_id has built its
+  figure; not called when the build failed or fell back.
+  """
+  with _ABANDONED_LOCK:
+    future = _ABANDONED.get(build_id)
+
+  def done(f):
+    if not (f.cancelled() or f.exception()):
+      figure, built = f.result()
+      if built:
+        callback(figure)
+
+  if future is not None:
+    future.add_done_callback(done)
+
+
+def wait_for_build(build_id, timeout):
+  """
+  (finished, figure) for the abandoned build build_id after waiting up to
+  timeout seconds: (False, None) while it is still running, (True, figure)
+  once built, and (True, None) when it is unknown to this process (or no
+  longer kept, see MAX_KEPT_ABANDONED) or failed — the chart has to be
+  requested again. Several placeholders can point at the same build, so a
+  collected build stays available to the others.
+  """
+  with _ABANDONED_LOCK:
+    future = _ABANDONED.get(build_id) if build_id else None
+  if future is None:
+    return True, None
+  try:
+    figure, _ = future.result(timeout)
+  except TimeoutError:
+    return False, None
+  except Exception:
+    figure = None
+  return True, figure
+
+
+def _record_timing(page, key, seconds):
+  with _TIMINGS_LOCK:
+    entry = _TIMINGS.setdefault((page, key), [0, 0.0, 0.0, 0.0, 0])
+    entry[0] += 1
+    entry[1] += seconds
+    entry[2]  = max(entry[2], seconds)
+    entry[3]  = seconds
+
+
+def get_chart_build_stats():
+  """
+  {page: {chart: builds / total_s / mean_s / max_s / last_s / abandoned /
+  budget_s}} since process start. Abandoned builds count once finished.
+  """
+  stats = {}
+  with _TIMINGS_LOCK:
+    for (page, key), (builds, total, longest, last, abandoned) in _TIMINGS.items():
+      stats.setdefault(page, {})[key] = {
+        'builds':    builds,
+        'total_s':   round(total, 4),
+        'mean_s':    round(total / builds, 4) if builds else 0.0,
+        'max_s':     round(longest, 4),
+        'last_s':    round(last, 4),
+        'abandoned': abandoned,
+        'budget_s':  chart_budget(page, key),
+      }
+  return stats
+
+
+def reset_chart_build_stats():
+  with _TIMINGS_LOCK:
+    _TIMINGS.clear()
+
+
+def benchmark_chart_builds(workers=(1, 2, 4), repeats=3, filters=None):
+  """
+  Wall time of building every chart of each cached page callable (bypassing
+  the result cache), per worker count: {page: {workers: best seconds}}.
+  filters are the page filter kwargs to build with (default: none).
+  Restores the configured worker count afterwards. The CPU count is printed
+  with the timings: worker counts above it cannot show a speed-up.
+  """
+  from .Cache_Warmer import WARMUP_PAGES
+
+  previous = _WORKERS
+  results  = {}
+  try:
+    for name, fn in WARMUP_PAGES:
+      build = getattr(fn, '__wrapped__', fn)
+      build(**(filters or {}))   # warm derived tables and indexes first
+      for n in workers:
+        configure_chart_builds(n)
+        timings = []
+        for _ in range(repeats):
+          start = time.perf_counter()
+          build(**(filters or {}))
+          timings.append(time.perf_counter() - start)
+        results.setdefault(name, {})[n] = round(min(timings), 4)
+  finally:
+    configure_chart_builds(previous)
+  print(f'{os.cpu_count() or 1} CPU(s), best of {repeats}')
+  for name, by_workers in results.items():
+    print(f'{name}: ' + ', '.join(f'{n} worker(s) {s:.3f}s' for n, s in by_workers.items()))
+  return results
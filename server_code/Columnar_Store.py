@@ -0,0 +1,140 @@
+"""
+Columnar_Store.py — Server module
+=================================
+Columnar, memory-mappable on-disk format for the survey dataset.
+
+The pickle in Data Files has to be fully unpickled by every server process on
+cold start. This module writes the same frame as an uncompressed Arrow IPC
+(Feather v2) file instead, which the loader memory-maps: primitive columns are
+read straight from the mapped pages (shared between worker processes by the
+OS page cache) and nothing is decoded until it is asked for.
+
+Nested survey columns (capital_mix, owners, debt, financing_mech, jobs,
+sub_projects, ...) are stored as native list<struct> arrays and handed back as
+plain lists of dicts, because every chart builder consumes them that way.
+Columns whose mixed Python types Arrow cannot represent fall back to
+JSON-encoded strings and are decoded transparently on load. Only JSON types
+(str, int, float, bool, None, lists and dicts of them) survive that round
+trip, so writing such a column with any other value (Timestamp, Decimal,
+numpy integer, ...) raises TypeError rather than storing it as a string.
+
+Ingestion (run once per data release, e.g. from an Uplink script):
+    from .Columnar_Store import convert_pickle_to_columnar
+    convert_pickle_to_columnar('/tmp/synthetic_data.arrow')
+then upload the file to Data Files as COLUMNAR_FILE. Until it is present the
+loader in Global_Server_Functions keeps using the pickle.
+"""
+
+import json
+
+import pandas as pd
+
+try:
+  import pyarrow as pa
+  import pyarrow.ipc
+except ImportError:   # pyarrow is optional — callers fall back to the pickle
+  pa = None
+
+
+COLUMNAR_FILE = 'synthetic_data.arrow'
+PICKLE_FILE   = 'synthetic_data.pkl'
+
+# Schema metadata keys recording how object columns were encoded
+_NESTED_KEY = b'cefn.nested_columns'
+_JSON_KEY   = b'cefn.json_columns'
+
+
+def columnar_available():
+  """True when pyarrow is importable in this server environment."""
+  return pa is not None
+
+
+def write_columnar_dataset(df, path):
+  """
+  Write df to path as an uncompressed Arrow IPC file (memory-mappable).
+  The index is not stored; the loader returns a RangeIndex.
+  """
+  if pa is None:
+    raise ImportError('pyarrow is required to write the columnar dataset')
+
+  arrays, nested_cols, json_cols = [], [], []
+  for col in df.columns:
+    series = df[col]
+    if series.dtype != object:
+      arrays.append(pa.Array.from_pandas(series))
+      continue
+    try:
+      arr = pa.array(series.tolist(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+      # Mixed Python types in one column — keep them losslessly as JSON
+      arr = pa.array(
+        [None if _is_missing(v) else _json_cell(col, v) for v in series],
+        type=pa.string(),
+      )
+      json_cols.append(col)
+    else:
+      if pa.types.is_list(arr.type) or pa.types.is_struct(arr.type):
+        nested_cols.append(col)
+    arrays.append(arr)
+
+  table = pa.Table.from_arrays(arrays, names=[str(c) for c in df.columns])
+  table = table.replace_schema_metadata({
+    _NESTED_KEY: json.dumps(nested_cols),
+    _JSON_KEY:   json.dumps(json_cols),
+  })
+  with pa.OSFile(path, 'wb') as sink:
+    with pa.ipc.new_file(sink, table.schema) as writer:
+      writer.write_table(table)
+  return path
+
+
+def read_columnar_dataset(path):
+  """
+  Memory-map a file written by write_columnar_dataset and return a DataFrame.
+  Primitive columns are converted without consolidating blocks, so where
+  Arrow allows it they remain zero-copy views of the mapped file.
+  """
+  if pa is None:
+    raise ImportError('pyarrow is required to read the columnar dataset')
+
+  source = pa.memory_map(path, 'r')
+  table  = pa.ipc.open_file(source).read_all()
+  meta   = table.schema.metadata or {}
+  nested_cols = json.loads(meta.get(_NESTED_KEY, b'[]'))
+  json_cols   = json.loads(meta.get(_JSON_KEY, b'[]'))
+  object_cols = set(nested_cols) | set(json_cols)
+
+  df = table.drop([c for c in table.column_names if c in object_cols]).to_pandas(
+    split_blocks=True, date_as_object=True,
+  )
+  for pos, col in enumerate(table.column_names):
+    if col not in object_cols:
+      continue
+    values = table.column(col).to_pylist()
+    if col in json_cols:
+      values = [None if v is None else json.loads(v) for v in values]
+    df.insert(pos, col, pd.Series(values, index=df.index, dtype=object))
+  return df
+
+
+def convert_pickle_to_columnar(dest_path, src_path=None):
+  """
+  Ingestion step: read the published pickle and write it in columnar form.
+  src_path defaults to the PICKLE_FILE Data File.
+  """
+  if src_path is None:
+    from anvil.files import data_files
+    src_path = data_files[PICKLE_FILE]
+  return write_columnar_dataset(pd.read_pickle(src_path), dest_path)
+
+
+def _json_cell(col, value):
+  """value as JSON text; raises TypeError for values JSON cannot round-trip."""
+  def refuse(v):
+    raise TypeError(f'Column {col!r} holds a {type(v).__name__} ({v!r}), which '
+                    f'cannot be stored losslessly; convert it before writing')
+  return json.dumps(value, default=refuse)
+
+
+def _is_missing(value):
+  return value is None or (isinstance(value, float) and value != value)
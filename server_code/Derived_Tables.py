@@ -0,0 +1,167 @@
+"""
+Derived_Tables.py — Server module
+=================================
+Registry of long-format tables derived from the nested survey columns.
+
+Every table is built once per dataset snapshot (cached on the snapshot via
+Global_Server_Functions.derived) and is keyed by record_id, so a page
+callable only has to select the records that survived its filters
+(FilterIndex.table in Filter_Engine) instead of re-flattening the nested
+columns on every request.
+
+Core tables (one row per nested item, plus record_id):
+  capital_mix_long, debt_long, owners_long, financing_mech_long,
+  jobs_long, sub_projects_long
+
+Page modules register their own processed tables with @register_table and
+read them back with get_table(snapshot, name).
+
+scale_breakdown() aggregates a (filtered) long table by project scale for
+the per-scale pie charts of Capital Explorer and Ownership Models.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .config import SCALE_ORDER
+from .Global_Server_Functions import derived
+
+
+_BUILDERS = {}
+
+
+def register_table(name):
+  """Decorator: register fn(snapshot) -> DataFrame as derived table `name`."""
+  def decorator(fn):
+    _BUILDERS[name] = fn
+    return fn
+  return decorator
+
+
+def get_table(snapshot, name):
+  """Return derived table `name` for snapshot, building it on first use."""
+  if name not in _BUILDERS:
+    raise KeyError(f'No derived table registered as {name!r}')
+  return derived(snapshot, ('table', name), lambda: _BUILDERS[name](snapshot))
+
+
+def flatten_items(cells):
+  """
+  Flatten an iterable of list-of-dict cells.
+  Returns (dict items, row position of each item's cell). Non-list cells
+  and non-dict items are skipped.
+  """
+  items   = [[i for i in c if isinstance(i, dict)] if isinstance(c, (list, tuple)) else []
+             for c in cells]
+  lengths = [len(c) for c in items]
+  return [i for c in items for i in c], np.repeat(np.arange(len(items)), lengths)
+
+
+def flatten_values(cells):
+  """
+  Flatten an iterable of list cells holding plain values (e.g. strings).
+  Returns (items, row position of each item's cell). Non-list cells are
+  skipped.
+  """
+  lists   = [c if isinstance(c, (list, tuple)) else [] for c in cells]
+  lengths = [len(c) for c in lists]
+  return [i for c in lists for i in c], np.repeat(np.arange(len(lists)), lengths)
+
+
+def explode_records(df, col):
+  """
+  Flatten a column of list-of-dict cells into one row per dict, with the
+  owning record_id first. Non-list cells and non-dict items are skipped.
+  """
+  if col not in df.columns:
+    return pd.DataFrame({'record_id': pd.Series(dtype=df['record_id'].dtype)})
+
+  items, positions = flatten_items(df[col])
+  long = pd.DataFrame.from_records(items)
+  long.insert(0, 'record_id', df['record_id'].to_numpy()[positions])
+  return long
+
+
+# ==================== CORE TABLES ====================
+
+@register_table('capital_mix_long')
+def _capital_mix_long(snapshot):
+  return explode_records(snapshot, 'capital_mix')
+
+
+@register_table('debt_long')
+def _debt_long(snapshot):
+  return explode_records(snapshot, 'debt')
+
+
+@register_table('owners_long')
+def _owners_long(snapshot):
+  return explode_records(snapshot, 'owners')
+
+
+@register_table('financing_mech_long')
+def _financing_mech_long(snapshot):
+  return explode_records(snapshot, 'financing_mech')
+
+
+@register_table('jobs_long')
+def _jobs_long(snapshot):
+  return explode_records(snapshot, 'jobs')
+
+
+@register_table('sub_projects_long')
+def _sub_projects_long(snapshot):
+  return explode_records(snapshot, 'sub_projects')
+
+
+# ==================== SCALE BREAKDOWN ====================
+
+ScaleBreakdown = namedtuple('ScaleBreakdown', ['scales', 'records', 'totals', 'shares'])
+
+
+def scale_breakdown(df, by, value, shares=False, scale_col='project_scale',
+                    record_col='record_id', scale_order=SCALE_ORDER):
+  """
+  Per-scale aggregation of df[value] by the columns in `by`, for all scales
+  at once. Returns a ScaleBreakdown:
+    scales  — scales present in df, in scale_order
+    records — {scale: number of distinct records}
+    totals  — {scale: Series of value sums indexed by `by`} (dollar-weighted)
+    shares  — with shares=True, {scale: Series indexed by `by`} of the mean
+              over the scale's records of each record's percentage share
+              per group (typical-project view); a record's share is 0 for
+              groups it lacks, and records whose total is not positive
+              count as 0 throughout. Otherwise None.
+  Rows with a missing scale or group value are left out of the groups.
+  """
+  scales  = [s for s in scale_order if s in df[scale_col].values]
+  records = df.groupby(scale_col, observed=True)[record_col].nunique().to_dict()
+  totals  = df.groupby([scale_col, *by], observed=True)[value].sum()
+
+  result = ScaleBreakdown(scales, records, _split_by_scale(totals, scales), None)
+  if not shares:
+    return result
+
+  # One grouped pass over (scale, record, group): each record's share per group
+  per_record    = df.groupby([scale_col, record_col, *by], observed=True)[value].sum()
+  record_totals = df.groupby([scale_col, record_col], observed=True)[value].sum()
+  record_index  = per_record.index.droplevel(list(range(2, 2 + len(by))))
+  denominators  = record_totals.reindex(record_index).to_numpy()
+  with np.errstate(divide='ignore', invalid='ignore'):
+    pct = np.where(denominators > 0, per_record.to_numpy() / denominators * 100, 0)
+
+  # Mean over the records of each scale that have any group rows
+  n_records = record_index.unique().get_level_values(0).value_counts()
+  group_levels = [0, *range(2, 2 + len(by))]
+  pct = pd.Series(pct, index=per_record.index).groupby(level=group_levels, observed=True).sum()
+  pct = pct / n_records.reindex(pct.index.get_level_values(0)).to_numpy()
+  return result._replace(shares=_split_by_scale(pct, scales))
+
+
+def _split_by_scale(series, scales):
+  """{scale: series rows of that scale, without the scale level} for each scale."""
+  parts = {key: part.droplevel(0) for key, part in series.groupby(level=0, observed=True)}
+  empty = series.iloc[:0].droplevel(0)
+  return {scale: parts.get(scale, empty) for scale in scales}
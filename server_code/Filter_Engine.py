@@ -0,0 +1,246 @@
+"""
+Filter_Engine.py — Server module
+================================
+The single filter engine shared by every page callable.
+
+FilterSpec
+  Canonical, hashable form of the filter kwargs each page sends
+  (provinces, proj_types, stages, indigenous_ownership, project_scale).
+  Values are stripped strings, deduplicated and sorted; empty filters are
+  None. Equivalent selections therefore produce equal keys, which is what
+  result caching is keyed on, and every page matches values the same way
+  (e.g. Mega project_scale rows, whatever the column dtype).
+
+FilterIndex
+  Precomputed bitmasks for the five dimensions. For every value of
+  province, stage, project_scale and indigenous_ownership, and for every
+  project type appearing in the project_type lists, the index holds one
+  boolean bitmask over the snapshot's rows. A FilterSpec is resolved by
+  OR-ing the bitmasks within a dimension and AND-ing across dimensions.
+  The same record mask selects rows of the raw snapshot (rows()) and of
+  any derived long table from Derived_Tables (table()), via a cached
+  mapping from each long-table row to the position of its record.
+
+query_rows
+  Filtered rows without touching derived tables. Uses the FilterIndex when
+  the dataset is loaded; a process reading from SQL (SQL_Source) that has
+  not loaded it yet pushes the filters down into the SQL query instead
+  (query_sql_rows).
+
+Usage in a page callable:
+    spec  = FilterSpec.from_kwargs(provinces=provinces, ...)
+    index = get_filter_index(snapshot)
+    mask  = index.mask(spec)
+    df_filtered     = index.rows(mask)
+    owners_filtered = index.table('owners_flat', mask)
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .Global_Server_Functions import dataset_loaded, derived, get_snapshot
+from .Derived_Tables import get_table
+from .SQL_Source import get_sql_source
+
+
+# kwarg name → (snapshot column, column holds lists)
+FILTER_DIMENSIONS = {
+  'provinces':            ('province',             False),
+  'proj_types':           ('project_type',         True),
+  'stages':               ('stage',                False),
+  'indigenous_ownership': ('indigenous_ownership', False),
+  'project_scale':        ('project_scale',        False),
+}
+
+
+class FilterSpec(namedtuple('FilterSpec', list(FILTER_DIMENSIONS))):
+  """
+  Canonical, hashable filter selection. Each field is a sorted tuple of
+  distinct stripped strings, or None when that filter is not active.
+  """
+  __slots__ = ()
+
+  @classmethod
+  def from_kwargs(cls, provinces=None, proj_types=None, stages=None,
+                  indigenous_ownership=None, project_scale=None):
+    """Normalise the filter kwargs sent by the client forms."""
+    return cls(
+      provinces=_canonical(provinces),
+      proj_types=_canonical(proj_types),
+      stages=_canonical(stages),
+      indigenous_ownership=_canonical(indigenous_ownership),
+      project_scale=_canonical(project_scale),
+    )
+
+  @property
+  def is_empty(self):
+    return all(values is None for values in self)
+
+  def without(self, *dimensions):
+    """Copy of this spec with the given dimensions cleared."""
+    return self._replace(**{d: None for d in dimensions})
+
+  def only(self, *dimensions):
+    """Copy of this spec with every dimension except the given ones cleared."""
+    return self.without(*(d for d in self._fields if d not in dimensions))
+
+  def as_kwargs(self):
+    """Active filters as page-callable kwargs (lists), e.g. for re-calls."""
+    return {k: list(v) for k, v in self._asdict().items() if v is not None}
+
+
+def _canonical(values):
+  if not values:
+    return None
+  if isinstance(values, str):
+    values = [values]
+  clean = {_key(v) for v in values}
+  clean.discard(None)
+  return tuple(sorted(clean)) or None
+
+
+def _key(value):
+  """Normalised lookup key for one filter value (None for missing)."""
+  if value is None or (isinstance(value, float) and value != value):
+    return None
+  return str(value).strip() or None
+
+
+class FilterIndex:
+  """Bitmask index over one snapshot. Build via get_filter_index()."""
+
+  def __init__(self, snapshot):
+    self.snapshot = snapshot
+    self.n_rows   = len(snapshot)
+    self.bitmaps  = {
+      kw: (_list_bitmaps if is_list else _value_bitmaps)(snapshot, col)
+      for kw, (col, is_list) in FILTER_DIMENSIONS.items()
+    }
+
+  def mask(self, spec):
+    """
+    Boolean record mask for a FilterSpec, or None when no filter is active
+    (callers then use the unfiltered snapshot / table as-is).
+    Values not present in the data match nothing.
+    """
+    mask = None
+    for kw, values in spec._asdict().items():
+      if values is None:
+        continue
+      bitmaps   = self.bitmaps[kw]
+      dimension = np.zeros(self.n_rows, dtype=bool)
+      for value in values:
+        bitmap = bitmaps.get(value)
+        if bitmap is not None:
+          dimension |= bitmap
+      mask = dimension if mask is None else (mask & dimension)
+    return mask
+
+  def rows(self, mask):
+    """Rows of the snapshot selected by mask."""
+    return self.snapshot if mask is None else self.snapshot[mask]
+
+  def table(self, name, mask):
+    """Rows of derived table `name` whose record is selected by mask."""
+    table = get_table(self.snapshot, name)
+    if mask is None or table.empty:
+      return table
+    positions = self.record_positions(name)
+    return table[(positions >= 0) & mask[positions]]
+
+  def record_positions(self, name):
+    """
+    Snapshot row position of each row of derived table `name` (-1 when its
+    record is absent), i.e. where that row's record sits in a record mask.
+    """
+    return derived(self.snapshot, ('record_positions', name),
+                   lambda: self._record_positions(get_table(self.snapshot, name)))
+
+  def _record_positions(self, table):
+    """Snapshot row position of each long-table row's record (-1 if absent)."""
+    records = pd.Index(self.snapshot['record_id'])
+    if records.is_unique:
+      return records.get_indexer(table['record_id'])
+    # Duplicate record_ids: fall back to the first row of each record
+    first = pd.Series(np.arange(self.n_rows), index=records)
+    first = first[~first.index.duplicated()]
+    return first.reindex(table['record_id']).fillna(-1).astype(int).to_numpy()
+
+
+def get_filter_index(snapshot):
+  """Return the FilterIndex for snapshot, building it on first use."""
+  return derived(snapshot, 'filter_index', lambda: FilterIndex(snapshot))
+
+
+def _value_bitmaps(snapshot, col):
+  """
+  One bitmask per distinct (normalised) value of a scalar column.
+  Categorical columns (see CATEGORICAL_COLUMNS) compare their integer codes.
+  """
+  if col not in snapshot.columns:
+    return {}
+  series = snapshot[col]
+  if isinstance(series.dtype, pd.CategoricalDtype):
+    codes, uniques = series.cat.codes.to_numpy(), series.cat.categories
+  else:
+    codes, uniques = pd.factorize(series)
+  bitmaps = {}
+  for k, value in enumerate(uniques):
+    key = _key(value)
+    if key is None:
+      continue
+    bitmap = codes == k
+    bitmaps[key] = bitmaps[key] | bitmap if key in bitmaps else bitmap
+  return bitmaps
+
+
+def _list_bitmaps(snapshot, col):
+  """One bitmask per distinct (normalised) item in a column of lists."""
+  if col not in snapshot.columns:
+    return {}
+  positions = {}
+  for pos, items in enumerate(snapshot[col]):
+    if not isinstance(items, (list, tuple)):
+      continue
+    for key in {_key(item) for item in items}:
+      if key is not None:
+        positions.setdefault(key, []).append(pos)
+  n_rows  = len(snapshot)
+  bitmaps = {}
+  for key, rows in positions.items():
+    bitmap = np.zeros(n_rows, dtype=bool)
+    bitmap[rows] = True
+    bitmaps[key] = bitmap
+  return bitmaps
+
+
+def query_rows(spec, columns=None, project_privacy=False):
+  """
+  Rows of the dataset matching FilterSpec spec (only `columns`, if given).
+  Served from the in-memory FilterIndex once the dataset is loaded. A
+  process reading from SQL that has not loaded the dataset yet pushes the
+  filters into the SQL WHERE clause instead; the fetched rows are then
+  re-checked here, since list filters are only pre-filtered in SQL.
+  """
+  sql = get_sql_source()
+  if sql is None or dataset_loaded():
+    index = get_filter_index(get_snapshot(project_privacy))
+    rows  = index.rows(index.mask(spec))
+    return rows if columns is None else rows.loc[:, columns]
+  return query_sql_rows(sql, spec, columns, project_privacy)
+
+
+def query_sql_rows(sql, spec, columns=None, project_privacy=False):
+  """query_rows() through SqlSource sql: filters pushed down, then re-checked."""
+  filters = {
+    FILTER_DIMENSIONS[kw][0]: (values, FILTER_DIMENSIONS[kw][1])
+    for kw, values in spec._asdict().items() if values is not None
+  }
+  fetch = None if columns is None else list(dict.fromkeys([*columns, *filters]))
+  rows  = sql.read(filters, fetch,
+                   exclude={'anonymous_status': 'anon'} if project_privacy else None)
+  index = FilterIndex(rows)
+  rows  = index.rows(index.mask(spec)).reset_index(drop=True)
+  return rows if columns is None else rows.loc[:, columns]
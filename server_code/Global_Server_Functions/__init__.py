@@ -5,25 +5,355 @@ import anvil.tables.query as q
 from anvil.tables import app_tables
 import anvil.server
 from collections.abc import Iterable
+import hashlib
+import os
+import threading
+import time
 import pandas as pd
+import numpy as np
 
+from ..Columnar_Store import (
+  COLUMNAR_FILE, PICKLE_FILE, columnar_available, read_columnar_dataset,
+)
+from ..SQL_Source import get_sql_source
+from ..config import SCALE_ORDER
 
-_DATA_CACHE = None
 
-def get_data(project_privacy=False):
-  global _DATA_CACHE
-  # Load data once
-  if _DATA_CACHE is None:
-    _DATA_CACHE = pd.read_pickle(data_files['synthetic_data.pkl'])
+_DATASET = None                      # current _Dataset; replaced atomically on reload
+_RELOAD_LOCK = threading.Lock()      # held across each version check and its reload
+_CHECK_LOCK  = threading.Lock()      # claims the next background check
+_DERIVED_LOCK = threading.RLock()
+_SWAP_HOOKS = []
+_LOAD_HOOKS = []
+
+# Seconds between checks of the published dataset version; each check (and
+# reload) runs on a background thread while requests keep the current snapshot
+DATASET_CHECK_INTERVAL = 60
+
+# Print memory_report() to the server log on every dataset build (debugging);
+# otherwise it is kept for dataset_memory_report()
+LOG_DATASET_MEMORY = bool(os.getenv('LOG_DATASET_MEMORY'))
+
+# Low-cardinality answer columns stored as pandas Categoricals at load.
+# Category order: the listed values first, then any other observed values
+# in sorted order (None = sorted observed values only). Consumers see the
+# same string values as before; filters compare integer codes (Filter_Engine)
+# and groupbys on these columns should pass observed=True.
+CATEGORICAL_COLUMNS = {
+  'province':             None,
+  'province_abbr':        None,
+  'stage':                None,
+  'project_scale':        SCALE_ORDER,
+  'indigenous_ownership': None,
+  'data_source':          None,
+  'anonymous_status':     None,
+  'op_expenses':          None,
+  'return_expectation':   None,
+}
+
+
+class ReadOnlySnapshotError(RuntimeError):
+  """Raised when code tries to modify the shared dataset snapshot in place."""
+
+
+class _SnapshotFrame(pd.DataFrame):
+  """
+  DataFrame that refuses in-place modification.
+
+  Anything derived from it (filters, column selections, groupbys, .copy())
+  comes back as an ordinary DataFrame, so a caller that needs to mutate
+  just works on its own derived frame or copy. The underlying column
+  arrays are also marked read-only so .loc / .iloc writes fail loudly.
+  Nested list/dict cells (capital_mix, owners, ...) are not protected —
+  treat them as read-only too.
+  """
 
-  df = _DATA_CACHE  # start from cached data
+  _derived = None   # per-snapshot cache of derived structures, see derived()
+  _version = None   # dataset version the snapshot was loaded as
 
-  # Apply privacy filter if requested
-  if project_privacy:
-    col = 'anonymous_status'
-    df = df[df[col] != 'anon']
+  @property
+  def _constructor(self):
+    return pd.DataFrame
+
+  def _refuse(self, *args, **kwargs):
+    raise ReadOnlySnapshotError(
+      'The shared dataset snapshot is read-only. Filter it or call .copy() '
+      '(or use get_data()) before modifying.'
+    )
+
+  __setitem__ = __delitem__ = _refuse
+  insert = pop = update = _update_inplace = _refuse
+
+
+def _freeze(df, version=None):
+  """Wrap df as a read-only _SnapshotFrame without copying its data."""
+  frozen = _SnapshotFrame(df)
+  for arr in frozen._mgr.arrays:
+    arr = getattr(arr, '_ndarray', arr)   # datetime / extension arrays
+    arr = getattr(arr, '_codes', arr)     # Categorical answer columns
+    if isinstance(arr, np.ndarray):
+      arr.flags.writeable = False
+  frozen._derived = {}
+  frozen._version = version
+  return frozen
+
+
+def derived(snapshot, key, build):
+  """
+  Return build(), computed once per snapshot and cached on the snapshot.
+
+  Derived tables and indexes hang off the snapshot they were built from, so
+  they live and die with it. DataFrame results are frozen like the snapshot.
+  """
+  cache = snapshot._derived
+  if cache is None:
+    return build()
+  if key not in cache:
+    with _DERIVED_LOCK:
+      if key not in cache:
+        value = build()
+        cache[key] = _freeze(value) if isinstance(value, pd.DataFrame) else value
+  return cache[key]
+
+
+def _load_dataset():
+  """
+  Read the survey frame from Data Files. Prefers the memory-mapped columnar
+  file (see Columnar_Store); falls back to the pickle when pyarrow or the
+  columnar file is unavailable. Returns (frame, path of the file read).
+  """
+  df = None
+  if columnar_available():
+    try:
+      path = data_files[COLUMNAR_FILE]
+      df   = read_columnar_dataset(path)
+    except Exception as e:
+      print(f'Columnar dataset unavailable ({e!r}); loading {PICKLE_FILE}')
+  if df is None:
+    path = data_files[PICKLE_FILE]
+    df   = pd.read_pickle(path)
+  return df, path
+
+
+def encode_categoricals(df, columns=CATEGORICAL_COLUMNS):
+  """Convert the listed columns of df (in place) to Categoricals; returns df."""
+  for col, order in columns.items():
+    if col not in df.columns:
+      continue
+    series   = df[col]
+    observed = (series.cat.categories if isinstance(series.dtype, pd.CategoricalDtype)
+                else series.dropna().unique())
+    listed   = list(order or [])
+    extra    = sorted((v for v in observed if v not in listed), key=str)
+    df[col]  = pd.Categorical(series, categories=listed + extra)
+  return df
+
+
+def memory_report(before, after):
+  """One-line summary of the memory saved by encode_categoricals()."""
+  cols  = [c for c in CATEGORICAL_COLUMNS if c in after.index]
+  mb    = lambda n: n / 1024 ** 2
+  saved = before[cols].sum() - after[cols].sum()
+  return (f'Dataset memory: {mb(before.sum()):.2f} MB -> {mb(after.sum()):.2f} MB '
+          f'({len(cols)} categorical columns: {mb(before[cols].sum()):.2f} MB -> '
+          f'{mb(after[cols].sum()):.2f} MB, saved {mb(saved):.2f} MB)')
+
+
+# ==================== DATASET VERSIONS ====================
+
+class _Dataset:
+  """
+  One loaded dataset version: the base snapshot and its privacy variant.
+  Derived tables and indexes hang off these snapshots, so swapping the
+  _Dataset swaps every derived structure with it.
+  """
+
+  def __init__(self, frame, version, source, memory=None):
+    self.version    = version
+    self.source     = source               # cheap signature, see _source_signature()
+    self.memory     = memory               # memory_report() of the load
+    self.checked_at = time.monotonic()
+    self.snapshots  = {False: _freeze(frame, version=version)}
+
+  def snapshot(self, project_privacy):
+    key = bool(project_privacy)
+    if key not in self.snapshots:
+      with _DERIVED_LOCK:
+        if key not in self.snapshots:
+          df = self.snapshots[False]
+          # Apply privacy filter if requested
+          self.snapshots[key] = _freeze(df[df['anonymous_status'] != 'anon'],
+                                        version=self.version)
+    return self.snapshots[key]
+
+
+def _source_signature():
+  """
+  Cheap identifier of the published dataset: the SQL table signature when
+  SQL_CONNECTION is configured (see SQL_Source), else the dataset files'
+  file_version in the Data Files table, or their size and mtime.
+  """
+  sql = get_sql_source()
+  if sql is not None:
+    return sql.signature()
+  try:
+    rows = [(name, app_tables.files.get(path=name)) for name in (COLUMNAR_FILE, PICKLE_FILE)]
+    versions = [f"{name}@{row['file_version']}" for name, row in rows if row is not None]
+    if versions:
+      return '|'.join(versions)
+  except Exception:
+    pass
+  stats = []
+  for name in (COLUMNAR_FILE, PICKLE_FILE):
+    try:
+      st = os.stat(data_files[name])
+    except Exception:
+      continue
+    stats.append(f'{name}:{st.st_size}:{st.st_mtime_ns}')
+  return '|'.join(stats) or None
 
-  return df.copy()  
+
+def _content_hash(path):
+  digest = hashlib.sha256()
+  with open(path, 'rb') as f:
+    for chunk in iter(lambda: f.read(1 << 20), b''):
+      digest.update(chunk)
+  return digest.hexdigest()[:16]
+
+
+def _build_dataset(source, previous=None):
+  """
+  Load the dataset for source signature `source` and categorical-encode it.
+  From SQL, rows added or updated since `previous` (the frame currently
+  served) are merged into it instead of re-reading the whole table.
+  """
+  sql = get_sql_source()
+  if sql is not None:
+    frame, version = sql.load(previous), source
+  else:
+    frame, path = _load_dataset()
+    # file_version when Data Files provides one, else a hash of the file read
+    version = source if source and '@' in source else _content_hash(path)
+
+  before = frame.memory_usage(deep=True)
+  frame  = encode_categoricals(frame)
+  memory = memory_report(before, frame.memory_usage(deep=True))
+  if LOG_DATASET_MEMORY:
+    print(memory)
+  return _Dataset(frame, version, source, memory)
+
+
+def on_dataset_swap(fn):
+  """Decorator: call fn(old_version, new_version) after each reload swap."""
+  _SWAP_HOOKS.append(fn)
+  return fn
+
+
+def on_dataset_load(fn):
+  """
+  Decorator: call fn(version) whenever a dataset version starts being served
+  — after the process's first load and after each reload swap (following
+  the on_dataset_swap hooks).
+  """
+  _LOAD_HOOKS.append(fn)
+  return fn
+
+
+def _run_hooks(hooks, *args):
+  for hook in hooks:
+    try:
+      hook(*args)
+    except Exception as e:
+      print(f'Dataset hook {hook.__name__} failed: {e!r}')
+
+
+def reload_dataset(force=False):
+  """
+  Reload the dataset if its published version changed (or force=True) and
+  swap it in atomically. Requests already holding the old snapshot finish
+  against it; new requests get the new one. Returns the current version.
+  """
+  global _DATASET
+  with _RELOAD_LOCK:
+    current = _DATASET
+    source  = _source_signature()
+    if current is not None:
+      current.checked_at = time.monotonic()
+      if not force and source == current.source:
+        return current.version
+    dataset = _build_dataset(source, current.snapshots[False] if current is not None else None)
+    if current is not None and dataset.version == current.version:
+      current.source = source
+      return current.version
+    _DATASET = dataset
+
+  if current is not None:
+    print(f'Dataset reloaded: {current.version} -> {dataset.version}')
+    _run_hooks(_SWAP_HOOKS, current.version, dataset.version)
+  _run_hooks(_LOAD_HOOKS, dataset.version)
+  return dataset.version
+
+
+def _current_dataset():
+  """
+  The current _Dataset, loading it on first use. After that the published
+  version is re-checked at most every DATASET_CHECK_INTERVAL seconds, on a
+  background thread: requests never wait for a reload and keep getting the
+  current dataset until reload_dataset() swaps the new one in.
+  """
+  dataset = _DATASET
+  if dataset is None:
+    reload_dataset()
+    return _DATASET
+  if time.monotonic() - dataset.checked_at > DATASET_CHECK_INTERVAL:
+    with _CHECK_LOCK:
+      # The first request past the interval claims the check; the rest see it as fresh
+      if time.monotonic() - dataset.checked_at <= DATASET_CHECK_INTERVAL:
+        return dataset
+      dataset.checked_at = time.monotonic()
+    threading.Thread(target=_reload_in_background, name='dataset-reload', daemon=True).start()
+  return dataset
+
+
+def _reload_in_background():
+  try:
+    reload_dataset()
+  except Exception as e:   # keep serving the current version; retried next interval
+    print(f'Dataset reload failed: {e!r}')
+
+
+def dataset_loaded():
+  """True once this process holds a loaded dataset."""
+  return _DATASET is not None
+
+
+def dataset_memory_report():
+  """memory_report() of the dataset currently served (None before the first load)."""
+  dataset = _DATASET
+  return dataset.memory if dataset is not None else None
+
+
+def get_snapshot(project_privacy=False):
+  """
+  Return the shared, read-only dataset snapshot — no per-request copy.
+
+  Every chart callable should start from this, once per request, and use
+  that snapshot throughout: a reload swaps in a new snapshot for later
+  requests without touching the one already handed out. Filtering returns
+  new frames as usual; trying to modify the snapshot itself raises
+  ReadOnlySnapshotError. Callers that need to mutate use get_data().
+  """
+  return _current_dataset().snapshot(project_privacy)
+
+
+def dataset_version(snapshot=None):
+  """Version label of snapshot (default: the current dataset)."""
+  return (snapshot if snapshot is not None else get_snapshot())._version
+
+
+def get_data(project_privacy=False):
+  """Return a private, mutable copy of the dataset (copy-on-write path)."""
+  return get_snapshot(project_privacy).copy()
 
 
 ##### TO REMOVE LIST FORMAT FOR PROJECT CARDS AND PRINTING OUT DATA
@@ -0,0 +1,127 @@
+"""
+Incidence_Engine.py — Server module
+===================================
+Record × label incidence matrices and the co-occurrence counts the
+heatmaps are built from.
+
+An Incidence describes one labelled attribute of the records (owner
+category, financing category, key objective, ...) as a records × labels
+matrix over the snapshot's row positions, so a FilterIndex record mask
+selects its rows directly:
+  counts   1 where the record has the label, however many items carry it
+  weights  per-item weights (e.g. dollars) summed per record and label
+
+Co-occurrence of two attributes over the records selected by a mask is one
+masked matrix product, Aᵀ·diag(mask)·B; co-occurrence within one attribute
+is the Gram matrix Aᵀ·diag(mask)·A. The cost follows the number of
+incidences, not the number of label pairs each record would expand to.
+
+Matrices are scipy.sparse CSR when SciPy is installed and dense NumPy
+arrays otherwise (label sets here are small, so both stay cheap).
+
+Usage:
+    owners = incidence(len(snapshot), positions, categories, weights=dollars)
+    matrix = co_occurrence(owners, finance, mask)           # labels × labels
+    pairs  = co_occurrence_long(owners, finance, mask,
+                                names=('owner_category', 'finance_category'))
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+try:
+  import scipy.sparse as sp
+except ImportError:   # SciPy is optional — matrices fall back to dense NumPy
+  sp = None
+
+
+class Incidence(namedtuple('Incidence', ['labels', 'counts', 'weights'])):
+  """
+  labels   sorted distinct labels (matrix columns)
+  counts   records × labels 0/1 matrix (int64)
+  weights  records × labels summed item weights (float), or None
+  """
+  __slots__ = ()
+
+  @property
+  def n_records(self):
+    return self.counts.shape[0]
+
+
+def incidence(n_records, positions, labels, weights=None):
+  """
+  Incidence of items with the given labels, each belonging to the record at
+  positions[i]. Items without a label (None / NaN) are left out; missing
+  weights count as 0.
+  """
+  labels = pd.Series(labels, dtype=object)
+  keep   = labels.notna().to_numpy()
+  codes, uniques = pd.factorize(labels[keep], sort=True)
+  rows  = np.asarray(positions, dtype=np.int64)[keep]
+  shape = (n_records, len(uniques))
+
+  counts = _matrix(rows, codes, np.ones(len(codes), dtype=np.int64), shape)
+  counts = (counts > 0).astype(np.int64)
+  if weights is not None:
+    weights = np.nan_to_num(np.asarray(weights, dtype=float)[keep])
+    weights = _matrix(rows, codes, weights, shape)
+  return Incidence(list(uniques), counts, weights)
+
+
+def _matrix(rows, cols, data, shape):
+  """records × labels matrix with data summed per (row, col)."""
+  if sp is not None:
+    return sp.csr_matrix((data, (rows, cols)), shape=shape)
+  matrix = np.zeros(shape, dtype=data.dtype)
+  np.add.at(matrix, (rows, cols), data)
+  return matrix
+
+
+def _rows(matrix, mask):
+  return matrix if mask is None else matrix[mask]
+
+
+def _dense(matrix):
+  return matrix.toarray() if sp is not None and sp.issparse(matrix) else np.asarray(matrix)
+
+
+def co_occurrence(a, b, mask=None, weighted=False):
+  """
+  DataFrame (a.labels × b.labels) of Aᵀ·diag(mask)·B: the number of selected
+  records having both labels, or with weighted, the sum of a's weights
+  over those records.
+  """
+  left   = _rows(a.weights if weighted else a.counts, mask)
+  matrix = _dense(left.T @ _rows(b.counts, mask))
+  return pd.DataFrame(matrix, index=a.labels, columns=b.labels)
+
+
+def gram(a, mask=None):
+  """Co-occurrence of a's labels with each other (diagonal: records per label)."""
+  return co_occurrence(a, a, mask)
+
+
+def label_counts(a, mask=None):
+  """Number of distinct labels each selected record has."""
+  return _dense(_rows(a.counts, mask).sum(axis=1)).ravel()
+
+
+def label_totals(a, mask=None):
+  """Number of selected records having each label."""
+  return _dense(_rows(a.counts, mask).sum(axis=0)).ravel()
+
+
+def co_occurrence_long(a, b, mask=None, names=('a', 'b'), value='count', weighted=False):
+  """
+  Non-zero co_occurrence entries as a long frame (names[0], names[1], value),
+  ordered by label pair — the layout a groupby over the label pairs gives.
+  """
+  matrix = co_occurrence(a, b, mask, weighted).to_numpy()
+  i, j   = np.nonzero(matrix)
+  return pd.DataFrame({
+    names[0]: np.array(a.labels, dtype=object)[i],
+    names[1]: np.array(b.labels, dtype=object)[j],
+    value:    matrix[i, j],
+  })
@@ -3,7 +3,7 @@ Outcomes_Explorer.py — Server module for the Outcomes & Impacts page
 ====================================================================
 Structure:
   1. Imports
-  2. Data filtering            — apply_filters()
+  2. Data filtering            — shared Filter_Engine (FilterSpec + FilterIndex)
   3. Main callable             — get_all_outcomes_charts()
   4. Chart creation functions  — one per chart type
   5. Export callable           — export_outcomes_chart()
@@ -32,70 +32,75 @@ from .config import (
 gradient_palette, dunsparce_colors,
 FONT_FAMILY, FONT_SIZE, FONT_COLOR,
 )
-from .Global_Server_Functions import get_data
+from .Global_Server_Functions import get_snapshot
+from .Filter_Engine import FilterSpec, get_filter_index
+from .Result_Cache import ChartInputs, cached_result, requested_charts
+from .Chart_Builder import build_charts
 from .Export_Utils import export_figure_from_bytes, apply_display_template
 
 
-# ==================== DATA FILTERING ====================
-
-def apply_filters(df, provinces=None, proj_types=None, stages=None,
-                  indigenous_ownership=None, project_scale=None):
-  """
-  Apply user-selected filters to a dataframe. Returns a filtered copy.
-  Silently returns the original dataframe if it is already empty.
-  """
-  if df.empty:
-    return df
-  df = df.copy()
-  if provinces:            df = df[df['province'].isin(provinces)]
-  if proj_types:           df = df[df['project_type'].apply(lambda x: any(t in x for t in proj_types) if isinstance(x, list) else False)]
-  if stages:               df = df[df['stage'].isin(stages)]
-  if indigenous_ownership: df = df[df['indigenous_ownership'].isin(indigenous_ownership)]
-  if project_scale:        df = df[df['project_scale'].isin(project_scale)]
-  return df
+# ==================== MAIN CALLABLE ====================
 
+# What each chart returned by get_all_outcomes_charts() is built from, in
+# response order (all charts use every filter dimension; the empty-data
+# guard reads the snapshot rows)
+OUTCOMES_CHART_INPUTS = {
+  'indigenous_agreements': ChartInputs(['snapshot']),
+  'jobs_chart':            ChartInputs(['snapshot', 'jobs_long']),
+  'ghg_methodology':       ChartInputs(['snapshot']),
+  'ghg_timeline':          ChartInputs(['snapshot']),
+  'key_objectives':        ChartInputs(['snapshot']),
+  'op_expenses':           ChartInputs(['snapshot']),
+  'return_expectations':   ChartInputs(['snapshot']),
+  'end_use_composition':   ChartInputs(['snapshot']),
+}
+OUTCOMES_CHART_KEYS = list(OUTCOMES_CHART_INPUTS)
 
-# ==================== MAIN CALLABLE ====================
 
 @anvil.server.callable
+@cached_result('get_all_outcomes_charts', OUTCOMES_CHART_INPUTS)
 def get_all_outcomes_charts(provinces=None, proj_types=None, stages=None,
-                            indigenous_ownership=None, project_scale=None):
+                            indigenous_ownership=None, project_scale=None,
+                            charts=None):
   """
-  Single server call returning all outcomes/impacts chart figures.
+  Single server call returning the requested outcomes/impacts chart figures
+  (all of OUTCOMES_CHART_KEYS when charts is None); only those are built.
   apply_display_template() is called here on every figure — chart functions
   only need to set chart-specific properties.
 
-  Returns a dict with keys:
+  Returns a dict with the requested keys out of:
     indigenous_agreements, jobs_chart, ghg_methodology,
     ghg_timeline, key_objectives, op_expenses,
     return_expectations, end_use_composition
   """
-  df          = get_data()
-  df_filtered = apply_filters(df, provinces, proj_types, stages,
-                              indigenous_ownership, project_scale)
+  keys        = requested_charts(charts, OUTCOMES_CHART_KEYS)
+  df          = get_snapshot()
+  index       = get_filter_index(df)
+  mask        = index.mask(FilterSpec.from_kwargs(provinces, proj_types, stages,
+                                                   indigenous_ownership, project_scale))
+  df_filtered = index.rows(mask)
 
   # ── Guard: return empty figures if nothing matches ──
   if df_filtered.empty:
     empty_fig = go.Figure()
     empty_fig.update_layout(title=dict(text='No data available for selected filters'))
-    return {k: empty_fig for k in [
-      'indigenous_agreements', 'jobs_chart', 'ghg_methodology',
-      'ghg_timeline', 'key_objectives', 'op_expenses',
-      'return_expectations', 'end_use_composition',
-    ]}
-
-  # ── Build all charts and apply the display template to each ──
-  return {
-    'indigenous_agreements': apply_display_template(create_indigenous_agreements_chart(df_filtered)),
-    'jobs_chart':            apply_display_template(create_jobs_chart(df_filtered)),
-    'ghg_methodology':       apply_display_template(create_ghg_methodology_chart(df_filtered)),
-    'ghg_timeline':          apply_display_template(create_ghg_charts(df_filtered)),
-    'key_objectives':        apply_display_template(create_key_objectives_bar_chart(df_filtered)),
-    'op_expenses':           apply_display_template(create_op_expenses_chart(df_filtered)),
-    'return_expectations':   apply_display_template(create_return_expectations_chart(df_filtered)),
-    'end_use_composition':   apply_display_template(create_end_use_composition_chart(df_filtered)),
+    return {k: empty_fig for k in keys}
+
+  builders = {
+    'indigenous_agreements': lambda: create_indigenous_agreements_chart(df_filtered),
+    'jobs_chart':            lambda: create_jobs_chart(index.table('jobs_long', mask)),
+    'ghg_methodology':       lambda: create_ghg_methodology_chart(df_filtered),
+    'ghg_timeline':          lambda: create_ghg_charts(df_filtered),
+    'key_objectives':        lambda: create_key_objectives_bar_chart(df_filtered),
+    'op_expenses':           lambda: create_op_expenses_chart(df_filtered),
+    'return_expectations':   lambda: create_return_expectations_chart(df_filtered),
+    'end_use_composition':   lambda: create_end_use_composition_chart(df_filtered),
   }
 
+  # ── Build the requested charts and apply the display template to each ──
+  return build_charts('Outcomes', builders, keys,
+                      finish=lambda key, fig: apply_display_template(fig))
+
 
 # ==================== CHART CREATION ====================
 # Each function sets only chart-specific properties.
@@ -165,25 +170,21 @@ def create_indigenous_agreements_chart(df):
   return fig
 
 
-def create_jobs_chart(df):
-  """Grouped bar chart: full-time vs part-time jobs by project phase."""
-  jobs_list = []
-  for job_entries in df['jobs']:
-    if isinstance(job_entries, list):
-      jobs_list.extend(job_entries)
-
-  if not jobs_list:
+def create_jobs_chart(jobs_df):
+  """
+  Grouped bar chart: full-time vs part-time jobs by project phase.
+  jobs_df is the jobs_long derived table filtered to the selected records.
+  """
+  if jobs_df.empty:
     fig = go.Figure()
     fig.update_layout(title=dict(text='No jobs data'))
     return fig
 
-  jobs_df = pd.DataFrame(jobs_list)
   grouped = jobs_df.groupby('phase')[['full_time', 'part_time']].sum().fillna(0)
   reporting_counts = jobs_df.groupby('phase').agg({
     'full_time': lambda x: x.notna().sum(),
     'part_time': lambda x: x.notna().sum()
   })
-  total_projects = len(df)
 
   fig = go.Figure(data=[
     go.Bar(name='Full-time', x=grouped.index, y=grouped['full_time'], marker_color=dunsparce_colors[12]),
@@ -466,6 +467,7 @@ def create_op_expenses_chart(df):
   # ───────────────────────────────────────────────────────────────
 
   counts = df['op_expenses'].value_counts()  # blanks (NaN) excluded by default
+  counts = counts[counts > 0]             # categorical: drop unobserved answers
   total = counts.sum()
   if total == 0:
     fig = go.Figure()
@@ -549,6 +551,7 @@ def create_return_expectations_chart(df):
   # ───────────────────────────────────────────────────────────────
 
   counts = df['return_expectation'].value_counts()  # blanks (NaN) excluded by default
+  counts = counts[counts > 0]             # categorical: drop unobserved answers
   total = counts.sum()
   if total == 0:
     fig = go.Figure()
@@ -27,7 +27,8 @@ import json
 import textwrap
 import urllib.request
 
-from .Global_Server_Functions import get_data
+from .Global_Server_Functions import get_snapshot
+from .Result_Cache import requested_charts
 from .Export_Utils import apply_display_template, export_figure_from_bytes
 from .Export_Utils import apply_display_template, export_figure_from_bytes
 from .config import (
@@ -70,24 +71,31 @@ with urllib.request.urlopen(_GEOJSON_URL) as response:
 
 # ==================== MAIN CALLABLE ====================
 
+# Keys returned by get_all_overview_data(), in response order
+OVERVIEW_KEYS = ['summary', 'province_map']
+
+
 @anvil.server.callable
-def get_all_overview_data():
+def get_all_overview_data(charts=None):
   """
-  Single server call returning summary stats and all overview charts.
+  Single server call returning the requested summary stats and overview
+  charts (all of OVERVIEW_KEYS when charts is None); only those are built.
   Data is loaded once and shared across all chart builders.
   """
-  df = get_data()
+  keys = requested_charts(charts, OVERVIEW_KEYS)
+  df   = get_snapshot()
 
-  return {
-    'summary': {
+  builders = {
+    'summary': lambda: {
       'total_cost':  df['total_cost'].sum(),
       'project_num': df['num_projects_response'].sum(),
     },
     # Province map applies its own template internally because it requires
     # post-template overrides for title positioning and margins.
-    'province_map':      create_province_map_internal(df),
-    #'mechanism_compare': apply_display_template(create_mechanism_compare_internal(df)),
+    'province_map':      lambda: create_province_map_internal(df),
+    #'mechanism_compare': lambda: apply_display_template(create_mechanism_compare_internal(df)),
   }
+  return {k: builders[k]() for k in keys}
 
 
 # ==================== CHART CREATION ====================
@@ -102,11 +110,10 @@ def create_province_map_internal(df):
   positioning and margins. This is needed because the template's title
   settings interfere with the geo layout.
   """
-  df = df.copy()
-  df["province_geo"] = df["province"].replace(PROVINCE_FIX)
+  province_geo = df["province"].map(lambda p: PROVINCE_FIX.get(p, p))
 
   province_counts = (
-    df.groupby("province_geo")["num_projects_response"].sum()
+    df.groupby(province_geo, observed=True)["num_projects_response"].sum()
       .reindex(ALL_PROVINCES, fill_value=0)
       .reset_index(name="projects")
   )
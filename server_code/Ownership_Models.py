@@ -12,13 +12,14 @@ lollipop_chart (key)     : Governance bottlenecks, split by single vs multiple o
 all_financing_heatmap    : Count of responses where owner category + financing co-occur.
 collaboration_heatmap    : How often owner categories co-occur on multi-owner projects.
 single_owner_breakdown   : Single-owner projects by category, stacked by owner type.
-multi_owner_semicircles  : Per-project semicircle of owners, shaded by owner type.
+multi_owner_semicircles  : Per-project semicircle of owners, shaded by owner type; paged
+                           (get_multi_owner_semicircles serves further pages).
 
 Key fixes vs previous version
 ------------------------------
-1. apply_filters          — project_scale normalised with .astype(str).str.strip() before
-                            any comparison, fixing Mega rows being silently dropped from
-                            df_owners_filtered due to Categorical dtype mismatch.
+1. Filtering              — handled by the shared Filter_Engine, which compares
+                            project_scale as stripped strings, fixing Mega rows being
+                            silently dropped due to Categorical dtype mismatch.
 2. process_owners_data    — project_scale explicitly cast to stripped string when building
                             the flat owners frame, so dtype is consistent with the filter.
 3. create_ownership_treemap_internal
@@ -30,6 +31,9 @@ Key fixes vs previous version
                             95–105 range that was silently dropping valid projects.
                           — Simple (o.get('owner_percent') or 0) check reinstated instead of
                             pd.to_numeric which was filtering out valid numeric values.
+5. Owner-type colours     — taken from the snapshot palette (Palettes.get_palette) instead
+                            of being re-assigned per chart from the filtered owners, so an
+                            owner type keeps its colour across charts and filters.
 """
 
 import anvil.files
@@ -42,19 +46,27 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
+import functools
 import textwrap
 import math
-from itertools import combinations
+from collections import namedtuple
 from plotly.subplots import make_subplots
 
 from .config import (
 COLOUR_MAPPING, gradient_palette, dunsparce_colors,
 FONT_FAMILY, FONT_SIZE, FONT_COLOR,
 TITLE_FONT_FAMILY, TITLE_SIZE, TITLE_PAD_B,   # ← add these
-get_owner_type_colors_categorical, CATEGORY_COLOUR_SCHEME, CATEGORY_ORDER_OWNERS,
+CATEGORY_COLOUR_SCHEME, CATEGORY_ORDER_OWNERS,
+SCALE_ORDER,
 )
-from .Global_Server_Functions import get_data
+from .Global_Server_Functions import derived, get_snapshot
+from .Derived_Tables import flatten_items, flatten_values, register_table, scale_breakdown
+from .Incidence_Engine import co_occurrence_long, gram, incidence, label_counts, label_totals
+from .Filter_Engine import FilterSpec, get_filter_index
+from .Result_Cache import ChartInputs, cached_result, requested_charts
+from .Chart_Builder import build_charts
 from .Export_Utils import apply_display_template, export_figure_from_bytes
+from .Palettes import get_palette, lighten, tint_shades
 
 
 # ==================== UTILITY FUNCTIONS ====================
@@ -63,21 +75,6 @@ def wrap_text(text, width=15):
   return '<br>'.join(textwrap.wrap(str(text), width=width))
 
 
-def get_contrast_color(hex_color):
-  if not hex_color or not hex_color.startswith('#'):
-    return 'white'
-  hex_color = hex_color.lstrip('#')
-  r, g, b = int(hex_color[0:2], 16), int(hex_color[2:4], 16), int(hex_color[4:6], 16)
-  return 'black' if (0.299 * r + 0.587 * g + 0.114 * b) / 255 > 0.5 else 'white'
-
-
-def _owner_type_category_pairs(df_owners):
-  return list(
-    df_owners[['owner_type', 'owner_category']]
-      .drop_duplicates()
-      .itertuples(index=False, name=None)
-  )
-
 # Safe colour fallback used throughout — avoids KeyError when owner_category
 # values arrive that aren't defined in CATEGORY_COLOUR_SCHEME (e.g. 'Other').
 _FALLBACK_SCHEME = {'base': '#808080', 'shades': ['#808080']}
@@ -89,147 +86,252 @@ def _cat_colour(cat):
   return scheme.get('base', '#808080')
 
 
-# ==================== DATA FILTERING ====================
-
-def apply_filters(df, provinces=None, proj_types=None, stages=None,
-                  indigenous_ownership=None, project_scale=None):
-  """
-  Apply user-selected filters to a dataframe. Returns a filtered copy.
-
-  project_scale is normalised to plain stripped strings before comparison.
-  This handles the case where df_raw has a pandas Categorical dtype for
-  project_scale while df_owners (built row-by-row) has object dtype — without
-  normalisation, .isin() silently fails to match Mega rows in df_owners_filtered.
-  """
-  if df.empty:
-    return df
-  df = df.copy()
-
-  if 'project_scale' in df.columns:
-    df['project_scale'] = df['project_scale'].astype(str).str.strip()
-
-  if provinces:
-    df = df[df['province'].isin(provinces)]
-  if proj_types:
-    df = df[df['project_type'].apply(
-      lambda x: any(t in x for t in proj_types) if isinstance(x, list) else False
-    )]
-  if stages:
-    df = df[df['stage'].isin(stages)]
-  if indigenous_ownership:
-    df = df[df['indigenous_ownership'].isin(indigenous_ownership)]
-  if project_scale:
-    clean = [str(s).strip() for s in project_scale]
-    df = df[df['project_scale'].isin(clean)]
-  return df
-
-
 # ==================== DATA PROCESSING ====================
 
 def process_owners_data(df):
   """
-  Explode the owners list into one row per owner entry.
-  project_scale is cast to a plain stripped string so dtype is consistent
-  regardless of whether the source column is Categorical or object.
+  Explode the owners list into one row per owner entry — the typed owners
+  table every ownership chart reads:
+    owner_type, owner_category  categorical (missing category → 'Other')
+    owner_percent               float64
+    total_cost                  float64 (unparseable → NaN)
+    ownership_value             owner % × project cost, precomputed
+    project_scale               plain stripped string, so its dtype is
+                                consistent whether the source column is
+                                Categorical or object
+  Built column-wise from the flattened owner dicts (no per-row Python
+  beyond flattening the nested lists).
   """
-  rows = []
-  for _, row in df.iterrows():
-    owners = row.get('owners') or []
-    for owner in owners:
-      ps = row.get('project_scale')
-      rows.append({
-        'record_id':            row.get('record_id'),
-        'owner_name':           owner.get('owner_name'),
-        'owner_type':           owner.get('owner_type'),
-        'owner_category':       owner.get('owner_category') or 'Other',
-        'owner_percent':        owner.get('owner_percent'),
-        'project_type':         row.get('project_type'),
-        'project_name':         row.get('project_name'),
-        'province':             row.get('province'),
-        'project_scale':        str(ps).strip() if pd.notna(ps) else None,
-        'stage':                row.get('stage'),
-        'indigenous_ownership': row.get('indigenous_ownership'),
-        'total_cost':           row.get('total_cost'),
-      })
-  return pd.DataFrame(rows)
+  items, pos = flatten_items(_record_values(df, 'owners'))
+  owners = pd.DataFrame.from_records(items).reindex(
+    columns=['owner_name', 'owner_type', 'owner_category', 'owner_percent'])
+
+  category = owners['owner_category']
+  category = category.where(category.notna() & (category != ''), 'Other')
+  percent  = pd.to_numeric(owners['owner_percent'], errors='coerce').to_numpy(dtype=float)
+  cost     = pd.to_numeric(pd.Series(_record_values(df, 'total_cost')[pos], dtype=object),
+                           errors='coerce').to_numpy(dtype=float)
+  scale    = pd.Series(_record_values(df, 'project_scale')[pos], dtype=object)
+  scale    = np.where(scale.notna(), scale.astype(str).str.strip(), None)
+
+  return pd.DataFrame({
+    'record_id':            _record_values(df, 'record_id')[pos],
+    'owner_name':           owners['owner_name'].to_numpy(dtype=object),
+    'owner_type':           pd.Categorical(owners['owner_type']),
+    'owner_category':       pd.Categorical(category),
+    'owner_percent':        percent,
+    'project_type':         _record_values(df, 'project_type')[pos],
+    'project_name':         _record_values(df, 'project_name')[pos],
+    'province':             _record_values(df, 'province')[pos],
+    'project_scale':        scale,
+    'stage':                _record_values(df, 'stage')[pos],
+    'indigenous_ownership': _record_values(df, 'indigenous_ownership')[pos],
+    'total_cost':           cost,
+    'ownership_value':      (percent / 100) * cost,
+  })
+
+
+def _record_values(df, col):
+  """Record-level column as an object/numeric ndarray (all-None if absent)."""
+  if col not in df.columns:
+    return np.full(len(df), None, dtype=object)
+  series = df[col]
+  if isinstance(series.dtype, pd.CategoricalDtype):
+    series = series.astype(object)
+  return series.to_numpy()
+
+
+# Built once per dataset snapshot and filtered by record_id per request.
+register_table('owners_flat')(process_owners_data)
+
+
+@register_table('multi_owner_projects')
+def _multi_owner_projects(snapshot):
+  """
+  One row per project shown in the multi-owner semicircles, ordered by
+  record_id: projects with at least two owners holding a positive stake
+  and stakes summing to more than 90%. types / categories / values list
+  those owners in survey order ('Unknown' / 'Other' for missing labels).
+  """
+  owners, pos = flatten_items(_record_values(snapshot, 'owners'))
+  df = pd.DataFrame({
+    'pos':     pos,
+    'type':    [o.get('owner_type') or 'Unknown' for o in owners],
+    'category': [o.get('owner_category') or 'Other' for o in owners],
+    'value':   pd.to_numeric(pd.Series([o.get('owner_percent') for o in owners], dtype=object),
+                             errors='coerce').to_numpy(dtype=float),
+  })
+  df = df[df['value'] > 0]
+  stakes = df.groupby('pos')['value'].agg(['size', 'sum'])
+  shown  = stakes.index[(stakes['size'] >= 2) & (stakes['sum'] > 90)]
+  df = df[df['pos'].isin(shown)]
+
+  by_project = df.groupby('pos', sort=True)
+  projects = pd.DataFrame({
+    'record_id':  _record_values(snapshot, 'record_id')[shown],
+    'types':      by_project['type'].agg(list).to_numpy(),
+    'categories': by_project['category'].agg(list).to_numpy(),
+    'values':     by_project['value'].agg(list).to_numpy(),
+  })
+  return projects.sort_values('record_id', kind='stable').reset_index(drop=True)
+
+
+# ==================== INCIDENCE MATRICES ====================
+# Record × label incidences behind the co-occurrence heatmaps, built in one
+# pass over the nested owners / financing_mech / key_objectives columns once
+# per dataset snapshot (see Incidence_Engine).
+
+OwnershipIncidence = namedtuple('OwnershipIncidence', [
+  'owners',         # owner_category (missing → 'Other'), weighted by owner dollars
+  'owners_unknown', # the same with missing categories labelled 'Unknown'
+  'finance',        # financing_mech category (all parents)
+  'objectives',     # key_objectives
+  'owner_entries',  # number of owner entries per record
+])
+
+
+def get_ownership_incidence(snapshot):
+  """Return the OwnershipIncidence for snapshot, building it on first use."""
+  return derived(snapshot, 'ownership_incidence', lambda: _build_ownership_incidence(snapshot))
+
+
+def _build_ownership_incidence(df):
+  n_records = len(df)
+
+  owners, pos = flatten_items(_record_values(df, 'owners'))
+  category = pd.Series([o.get('owner_category') for o in owners], dtype=object)
+  missing  = (category.isna() | (category == '')).to_numpy()
+  percent  = pd.to_numeric(pd.Series([o.get('owner_percent') for o in owners], dtype=object),
+                           errors='coerce').fillna(0).to_numpy()
+  cost     = pd.to_numeric(pd.Series(_record_values(df, 'total_cost'), dtype=object),
+                           errors='coerce').fillna(0).to_numpy()
+  dollars  = (percent / 100) * cost[pos]
+
+  finance, fin_pos = flatten_items(_record_values(df, 'financing_mech'))
+  objectives, obj_pos = flatten_values(_record_values(df, 'key_objectives'))
+
+  return OwnershipIncidence(
+    owners=incidence(n_records, pos, category.where(~missing, 'Other'), weights=dollars),
+    owners_unknown=incidence(n_records, pos, category.where(~missing, 'Unknown')),
+    finance=incidence(n_records, fin_pos, [f.get('category') or None for f in finance]),
+    objectives=incidence(n_records, obj_pos, objectives),
+    owner_entries=np.bincount(pos, minlength=n_records),
+  )
 
 
 # ==================== MAIN CALLABLE ====================
 
+# What each chart returned by get_all_ownership_charts() is built from, in
+# response order (all charts use every filter dimension)
+OWNERSHIP_CHART_INPUTS = {
+  'ownership_treemap':         ChartInputs(['owners_flat']),
+  'scale_pies':                ChartInputs(['owners_flat']),
+  'ownership_boxplot':         ChartInputs(['owners_flat']),
+  'ownership_tiers_histogram': ChartInputs(['owners_flat']),
+  'all_financing_heatmap':     ChartInputs(['snapshot', 'ownership_incidence']),
+  'single_owner_breakdown':    ChartInputs(['snapshot']),
+  'multi_owner_semicircles':   ChartInputs(['multi_owner_projects']),
+  'objectives_heatmap':        ChartInputs(['snapshot', 'ownership_incidence']),
+}
+OWNERSHIP_CHART_KEYS = list(OWNERSHIP_CHART_INPUTS)
+
+
 @anvil.server.callable
+@cached_result('get_all_ownership_charts', OWNERSHIP_CHART_INPUTS)
 def get_all_ownership_charts(provinces=None, proj_types=None, stages=None,
-                             indigenous_ownership=None, project_scale=None):
+                             indigenous_ownership=None, project_scale=None,
+                             charts=None):
   """
-  Single server call returning all chart figures.
-  Data is loaded and processed once, shared across all chart builders.
+  Single server call returning the requested chart figures (all of
+  OWNERSHIP_CHART_KEYS when charts is None); only those are built.
+  The filtered data they share is selected once per call.
   Each builder is wrapped individually so one failure doesn't silence the rest.
   """
-  df_raw    = get_data()
-  df_owners = process_owners_data(df_raw)
-
-  df_raw_filtered    = apply_filters(df_raw,    provinces, proj_types, stages, indigenous_ownership, project_scale)
-  df_owners_filtered = apply_filters(df_owners, provinces, proj_types, stages, indigenous_ownership, project_scale)
+  keys   = requested_charts(charts, OWNERSHIP_CHART_KEYS)
+  df_raw = get_snapshot()
+  index  = get_filter_index(df_raw)
+  mask   = index.mask(FilterSpec.from_kwargs(provinces, proj_types, stages,
+                                             indigenous_ownership, project_scale))
+
+  # One record mask selects the raw rows and the matching derived-table rows
+  df_raw_filtered    = index.rows(mask)
+  df_owners_filtered = index.table('owners_flat', mask)
+  incidence          = get_ownership_incidence(df_raw)   # co-occurrence heatmaps
+  owner_type_colors  = get_palette(df_raw).owner_type_colors
 
   def _empty(msg='No data available for selected filters'):
     f = go.Figure()
     f.update_layout(title=dict(text=msg))
     return f
 
-  # Build each chart individually so one exception doesn't kill all charts
-  def _build(key, fn, fallback_df):
-    if fallback_df.empty:
-      return _empty()
-    try:
-      return fn()
-    except Exception as e:
-      import traceback
-      print(f'[Ownership] ERROR in {key}:\n{traceback.format_exc()}')
-      return _empty(f'Error building {key}')
-
-  charts = {
+  # key → (builder, frame whose emptiness means "no data")
+  builders = {
     # ── Charts that use the flat owners frame ──
-    'ownership_treemap':         _build('ownership_treemap',         lambda: create_ownership_treemap_internal(df_owners_filtered),         df_owners_filtered),
-    'scale_pies':                _build('scale_pies',                lambda: create_ownership_scale_pies_internal(df_owners_filtered),      df_owners_filtered),
-    #'indigenous_pie':            _build('indigenous_pie',            lambda: create_indigenous_ownership_stacked_internal(df_owners_filtered), df_owners_filtered),
-    'ownership_boxplot':         _build('ownership_boxplot',         lambda: create_ownership_boxplot_internal(df_owners_filtered),          df_owners_filtered),
-    'ownership_tiers_histogram': _build('ownership_tiers_histogram', lambda: create_ownership_tiers_histogram_internal(df_owners_filtered),  df_owners_filtered),
+    'ownership_treemap':         (lambda: create_ownership_treemap_internal(df_owners_filtered, owner_type_colors), df_owners_filtered),
+    'scale_pies':                (lambda: create_ownership_scale_pies_internal(df_owners_filtered, owner_type_colors), df_owners_filtered),
+    #'indigenous_pie':            (lambda: create_indigenous_ownership_stacked_internal(df_owners_filtered), df_owners_filtered),
+    'ownership_boxplot':         (lambda: create_ownership_boxplot_internal(df_owners_filtered),          df_owners_filtered),
+    'ownership_tiers_histogram': (lambda: create_ownership_tiers_histogram_internal(df_owners_filtered),  df_owners_filtered),
     # ── Charts that use the raw per-response frame ──
-    #'bottleneck_chart':            _build('bottleneck_chart',            lambda: create_governance_bottlenecks_internal(df_raw_filtered),        df_raw_filtered),
-    'all_financing_heatmap':     _build('all_financing_heatmap',     lambda: create_ownership_all_financing_heatmap_internal(df_raw_filtered), df_raw_filtered),
-    #'collaboration_heatmap':     _build('collaboration_heatmap',     lambda: create_collaboration_heatmap_internal(df_raw_filtered),         df_raw_filtered),
-    'single_owner_breakdown':    _build('single_owner_breakdown',    lambda: create_single_owner_breakdown_internal(df_raw_filtered),        df_raw_filtered),
-    'multi_owner_semicircles':   _build('multi_owner_semicircles',   lambda: create_multi_owner_semicircles_internal(df_raw_filtered),       df_raw_filtered),
-    'objectives_heatmap': _build('objectives_heatmap', lambda: create_ownership_objectives_heatmap_internal(df_raw_filtered), df_raw_filtered),
+    #'bottleneck_chart':            (lambda: create_governance_bottlenecks_internal(df_raw_filtered),        df_raw_filtered),
+    'all_financing_heatmap':     (lambda: create_ownership_all_financing_heatmap_internal(incidence, mask), df_raw_filtered),
+    #'collaboration_heatmap':     (lambda: create_collaboration_heatmap_internal(incidence, mask),         df_raw_filtered),
+    'single_owner_breakdown':    (lambda: create_single_owner_breakdown_internal(df_raw_filtered, owner_type_colors), df_raw_filtered),
+    'multi_owner_semicircles':   (lambda: create_multi_owner_semicircles_internal(
+                                    index.table('multi_owner_projects', mask), owner_type_colors),      df_raw_filtered),
+    'objectives_heatmap':        (lambda: create_ownership_objectives_heatmap_internal(incidence, mask),  df_raw_filtered),
   }
 
+  def _build(key):
+    fn, fallback_df = builders[key]
+    return _empty() if fallback_df.empty else fn()
+
   # Apply display template to all charts except semicircles, which uses a
   # mixed pie+scatter layout that apply_display_template breaks.
-  result = {}
-  for k, v in charts.items():
-    if k == 'multi_owner_semicircles':
-      result[k] = v   # no template — figure manages its own styling
-    else:
-      result[k] = apply_display_template(v)
-  return result
+  def _finish(key, fig):
+    if key == 'multi_owner_semicircles':
+      return fig   # no template — figure manages its own styling
+    return apply_display_template(fig)
+
+  # Each chart is built individually so one exception doesn't kill all charts
+  return build_charts('Ownership', {k: (lambda k=k: _build(k)) for k in keys}, keys,
+                      finish=_finish,
+                      fallback=lambda key, e: _empty(f'Error building {key}'))
+
+
+@anvil.server.callable
+def get_multi_owner_semicircles(page=0, provinces=None, proj_types=None, stages=None,
+                                indigenous_ownership=None, project_scale=None):
+  """
+  One page of the multi-owner semicircles for the given filters (page 0 is
+  also part of get_all_ownership_charts). Only that page's grid is built;
+  layout.meta carries page / pages / total for the pager.
+  """
+  df_raw = get_snapshot()
+  index  = get_filter_index(df_raw)
+  mask   = index.mask(FilterSpec.from_kwargs(provinces, proj_types, stages,
+                                             indigenous_ownership, project_scale))
+  if index.rows(mask).empty:
+    fig = go.Figure()
+    fig.update_layout(title=dict(text='No data available for selected filters'))
+    return fig
+  return create_multi_owner_semicircles_internal(
+    index.table('multi_owner_projects', mask), get_palette(df_raw).owner_type_colors, page=page)
 
 
 # ==================== CHART CREATION ====================
 
-def create_ownership_treemap_internal(df_owners):
-  df_val = df_owners.copy()
-  df_val['owner_percent'] = pd.to_numeric(df_val['owner_percent'], errors='coerce')
-  df_val['total_cost']    = pd.to_numeric(df_val['total_cost'],    errors='coerce')
-  df_val['ownership_value'] = (df_val['owner_percent'] / 100) * df_val['total_cost']
-  df_val = df_val.dropna(subset=['ownership_value'])
+def create_ownership_treemap_internal(df_owners, owner_type_colors):
+  df_val = df_owners.dropna(subset=['ownership_value'])
 
   if df_val.empty:
     fig = go.Figure()
     fig.update_layout(title=dict(text='No ownership value data available'))
     return fig
 
-  value_data   = df_val.groupby(['owner_type', 'owner_category'], as_index=False)['ownership_value'].sum()
-  owner_colors = get_owner_type_colors_categorical(_owner_type_category_pairs(df_owners))
-  cat_totals   = value_data.groupby('owner_category')['ownership_value'].sum()
+  value_data   = df_val.groupby(['owner_type', 'owner_category'], as_index=False,
+                                observed=True)['ownership_value'].sum()
+  cat_totals   = value_data.groupby('owner_category', observed=True)['ownership_value'].sum()
 
   ids_list, labels, parents, values, colors_list = [], [], [], [], []
 
@@ -247,7 +349,7 @@ def create_ownership_treemap_internal(df_owners):
     labels.append(wrap_text(row['owner_type'], width=20))
     parents.append(f'cat::{row["owner_category"]}')
     values.append(row['ownership_value'])
-    colors_list.append(owner_colors.get(row['owner_type'], '#808080'))
+    colors_list.append(owner_type_colors.get(row['owner_type'], '#808080'))
 
   fig = go.Figure(go.Treemap(
     ids=ids_list,
@@ -264,30 +366,23 @@ def create_ownership_treemap_internal(df_owners):
   return fig
 
 
-def create_ownership_scale_pies_internal(df_owners):
-  SCALE_ORDER = [
-    'Micro (< $100K)', 'Small ($100K-$1M)', 'Medium ($1M-$5M)',
-    'Large ($5M-$25M)', 'Very Large ($25M-$100M)', 'Mega (> $100M)'
-  ]
+def create_ownership_scale_pies_internal(df_owners, owner_type_colors):
   scales = [s for s in SCALE_ORDER if s in df_owners['project_scale'].values]
   if not scales:
     fig = go.Figure()
     fig.update_layout(title=dict(text='No data available'))
     return fig
 
-  owner_type_colors = get_owner_type_colors_categorical(_owner_type_category_pairs(df_owners))
   cats_present      = [c for c in CATEGORY_ORDER_OWNERS if c in df_owners['owner_category'].unique()]
   fig    = go.Figure()
   n_pies = len(scales)
 
-  for i, scale in enumerate(scales):
-    sub     = df_owners[df_owners['project_scale'] == scale].copy()
-    n       = sub['record_id'].nunique()
-    sub['owner_percent'] = pd.to_numeric(sub['owner_percent'], errors='coerce')
-    sub['total_cost']    = pd.to_numeric(sub['total_cost'],    errors='coerce')
-    sub['ownership_value'] = (sub['owner_percent'] / 100) * sub['total_cost']
+  # Ownership value for all scales at once, grouped in one pass
+  breakdown = scale_breakdown(df_owners, ['owner_type', 'owner_category'], 'ownership_value')
 
-    value_grouped = sub.groupby(['owner_type', 'owner_category'], as_index=False)['ownership_value'].sum()
+  for i, scale in enumerate(scales):
+    n             = breakdown.records.get(scale, 0)
+    value_grouped = breakdown.totals[scale].reset_index()
     value_grouped['cat_order'] = value_grouped['owner_category'].apply(
       lambda c: CATEGORY_ORDER_OWNERS.index(c) if c in CATEGORY_ORDER_OWNERS else 999
     )
@@ -388,20 +483,6 @@ def create_ownership_tiers_histogram_internal(df_owners):
     if pct <= 99: return '75–99%'
     return '100%'
 
-  def shades_of(base_hex, n):
-    """Light → dark shades of base_hex; the last shade equals the base."""
-    if not base_hex or not base_hex.startswith('#'):
-      base_hex = '#808080'
-    r, g, b = int(base_hex[1:3], 16), int(base_hex[3:5], 16), int(base_hex[5:7], 16)
-    out = []
-    for i in range(n):
-      amount = 0.70 * (n - 1 - i) / max(n - 1, 1)   # i=0 lightest → i=n-1 base
-      nr = int(r + (255 - r) * amount)
-      ng = int(g + (255 - g) * amount)
-      nb = int(b + (255 - b) * amount)
-      out.append(f'#{nr:02x}{ng:02x}{nb:02x}')
-    return out
-
   df_plot = df_owners[df_owners['owner_percent'] > 0].copy()
   if df_plot.empty:
     fig = go.Figure()
@@ -410,7 +491,7 @@ def create_ownership_tiers_histogram_internal(df_owners):
   df_plot['tier'] = df_plot['owner_percent'].apply(assign_tier)
 
   cat_order = (
-    df_plot.groupby('owner_category')['owner_percent']
+    df_plot.groupby('owner_category', observed=True)['owner_percent']
       .median().sort_values(ascending=False).index.tolist()
   )
 
@@ -423,7 +504,7 @@ def create_ownership_tiers_histogram_internal(df_owners):
   for col_i, cat in enumerate(cat_order, start=1):
     sub         = df_plot[df_plot['owner_category'] == cat]
     tier_counts = sub['tier'].value_counts().reindex(TIERS, fill_value=0)
-    cat_shades  = shades_of(_cat_colour(cat), len(TIERS))   # 5 shades of this category
+    cat_shades  = tint_shades(_cat_colour(cat), len(TIERS), 0.70)[::-1]   # light → base
 
     for t_i, tier in enumerate(TIERS):
       count = tier_counts[tier]
@@ -460,55 +541,19 @@ def create_ownership_tiers_histogram_internal(df_owners):
 
 
 
-def _build_ownership_financing_pairs(df, direct_only=True):
-  pairs = []
-  for _, row in df.iterrows():
-    owners    = row.get('owners') or []
-    financing = row.get('financing_mech') or []
-    if not owners or not financing:
-      continue
-    total_cost = pd.to_numeric(row.get('total_cost'), errors='coerce') or 0
-    rid        = row.get('record_id')
-
-    cat_percents = {}
-    for o in owners:
-      cat = o.get('owner_category') or 'Unknown'
-      pct = pd.to_numeric(o.get('owner_percent'), errors='coerce') or 0
-      cat_percents[cat] = cat_percents.get(cat, 0) + pct
-
-    if direct_only:
-      fin_items = [f for f in financing
-                   if f.get('parent') == 'Direct sources of capital' and f.get('category')]
-    else:
-      fin_items = [f for f in financing if f.get('category')]
-
-    finance_cats = list({f.get('category') for f in fin_items})
-    if not finance_cats:
-      continue
-    for oc, pct_sum in cat_percents.items():
-      for fc in finance_cats:
-        pairs.append({
-          'record_id':    rid,
-          'owner_category': oc,
-          'finance_category': fc,
-          'owner_dollar': (pct_sum / 100) * total_cost,
-        })
-  return pd.DataFrame(pairs) if pairs else pd.DataFrame()
-
-
-def create_ownership_all_financing_heatmap_internal(df):
-  """Heatmap: owner category × financing mechanism co-occurrence. Blue palette."""
-  pairs_df = _build_ownership_financing_pairs(df, direct_only=False)
-  if pairs_df.empty:
+def create_ownership_all_financing_heatmap_internal(incidence, mask):
+  """
+  Heatmap: owner category × financing mechanism co-occurrence. Blue palette.
+  Counts are the selected records (mask) having both, from the snapshot's
+  OwnershipIncidence.
+  """
+  count_data = co_occurrence_long(incidence.owners_unknown, incidence.finance, mask,
+                                  names=('owner_category', 'finance_category'))
+  if count_data.empty:
     fig = go.Figure()
     fig.update_layout(title=dict(text='No ownership-financing data available'))
     return fig
 
-  count_data = (
-    pairs_df.groupby(['owner_category', 'finance_category'])['record_id']
-      .nunique().reset_index(name='count')
-  )
-
   owner_order   = (count_data.groupby('owner_category')['count'].sum()
     .sort_values(ascending=False).index.tolist())
   finance_order = (count_data.groupby('finance_category')['count'].sum()
@@ -556,7 +601,7 @@ def create_ownership_all_financing_heatmap_internal(df):
   return fig
 
 
-def create_single_owner_breakdown_internal(df):
+def create_single_owner_breakdown_internal(df, owner_type_colors):
   """
     Stacked bar: single-owner projects by owner category, coloured by owner type.
     Wrapped owner-type label shown inside each segment when it fits.
@@ -583,13 +628,12 @@ def create_single_owner_breakdown_internal(df):
     counts.groupby('owner_category')['count'].sum()
       .sort_values(ascending=False).index.tolist()
   )
-  owner_type_colors = get_owner_type_colors_categorical(_owner_type_category_pairs(df_single))
 
   fig = px.bar(
     counts, x='owner_category', y='count', color='owner_type', barmode='stack',
     labels={'owner_category': '', 'count': 'Projects', 'owner_type': 'Owner type'},
     category_orders={'owner_category': cat_order},
-    color_discrete_map=owner_type_colors,
+    color_discrete_map={t: owner_type_colors.get(t, '#808080') for t in counts['owner_type'].unique()},
   )
 
   # Add wrapped owner-type label inside each segment; constraintext hides it
@@ -611,89 +655,95 @@ def create_single_owner_breakdown_internal(df):
   )
   return fig
 
-def create_multi_owner_semicircles_internal(df):
+# Semicircle grid: projects per page and pies per grid row
+SEMICIRCLE_PAGE_SIZE = 12
+SEMICIRCLE_COLS      = 4
+
+
+@functools.lru_cache(maxsize=32)
+def _semicircle_grid(rows_n, cols=SEMICIRCLE_COLS):
+  """
+  Pie domains and subplot-title annotations of a rows_n × cols grid of
+  domain cells. make_subplots lays the grid out once per grid size; pages
+  copy the cached cells instead of building a subplot figure each time.
+  """
+  grid = make_subplots(
+    rows=rows_n, cols=cols,
+    specs=[[{'type': 'domain'}] * cols for _ in range(rows_n)],
+    subplot_titles=['title'] * (rows_n * cols),
+    vertical_spacing=0.02,
+    horizontal_spacing=0.01,
+  )
+  domains = tuple(
+    (tuple(cell.x), tuple(cell.y))
+    for cell in (grid.get_subplot(r, c) for r in range(1, rows_n + 1) for c in range(1, cols + 1))
+  )
+  titles = tuple(a.to_plotly_json() for a in grid.layout.annotations)
+  return domains, titles
+
+
+def create_multi_owner_semicircles_internal(df_projects, owner_type_colors, page=0,
+                                            page_size=SEMICIRCLE_PAGE_SIZE):
   """
     One semicircle per project, each slice = one owner sized by ownership %,
     coloured by owner_type (a shade of its owner_category's base colour).
     Repeats of the same type within a project are lightened so they stay
     distinguishable, and labels are made internally unique so go.Pie won't
     merge same-type sectors. apply_display_template is NOT applied to this figure.
-    """
-  def _lighten(hex_color, amount):
-    if not hex_color or not hex_color.startswith('#'):
-      return hex_color
-    r, g, b = int(hex_color[1:3], 16), int(hex_color[3:5], 16), int(hex_color[5:7], 16)
-    r = int(r + (255 - r) * amount)
-    g = int(g + (255 - g) * amount)
-    b = int(b + (255 - b) * amount)
-    return f'#{r:02x}{g:02x}{b:02x}'
-
-  pair_set = set()
-  for _, row in df.iterrows():
-    for o in (row.get('owners') or []):
-      ot = o.get('owner_type')
-      oc = o.get('owner_category') or 'Other'
-      if ot is not None:
-        pair_set.add((ot, oc))
-  owner_type_colors = get_owner_type_colors_categorical(list(pair_set))
-
-  projects = []
-  for _, row in df.iterrows():
-    owners = row.get('owners') or []
-    valid  = [o for o in owners if (o.get('owner_percent') or 0) > 0]
-    if len(valid) < 2:
-      continue
-    values = [float(o['owner_percent']) for o in valid]
-    if sum(values) <= 90:
-      continue
-    projects.append({
-      'types':      [o.get('owner_type') or 'Unknown'  for o in valid],
-      'categories': [o.get('owner_category') or 'Other' for o in valid],
-      'values':     values,
-    })
 
-  n = len(projects)
-  if n == 0:
+    df_projects is the multi_owner_projects table (record_id order) for the
+    selected records; owner_type_colors is the snapshot palette's. Only
+    page `page` of page_size projects is drawn; layout.meta holds page,
+    pages and total (projects across all pages).
+    """
+  total = len(df_projects)
+  if total == 0:
     fig = go.Figure()
     fig.update_layout(title=dict(text='No multi-owner projects for selected filters'))
     return fig
 
-  cols   = 4
+  pages    = math.ceil(total / page_size)
+  page     = min(max(int(page or 0), 0), pages - 1)
+  start    = page * page_size
+  projects = df_projects.iloc[start:start + page_size]
+  n        = len(projects)
+
+  cols   = SEMICIRCLE_COLS
   rows_n = math.ceil(n / cols)
-  fig = make_subplots(
-    rows=rows_n, cols=cols,
-    specs=[[{'type': 'domain'}] * cols for _ in range(rows_n)],
-    subplot_titles=[f'Project {i + 1}' for i in range(n)],
-    vertical_spacing=0.02,
-    horizontal_spacing=0.01,
-  )
+  domains, titles = _semicircle_grid(rows_n)
+
+  fig = go.Figure()
+  fig.update_layout(annotations=[
+    dict(title, text=f'Project {start + i + 1}') for i, title in enumerate(titles[:n])
+  ])
 
   cats_in_use = {}   # category → ordered owner_types present (for the legend)
-  for i, p in enumerate(projects):
-    r, c  = i // cols + 1, i % cols + 1
-    total = sum(p['values'])
+  for i, p in enumerate(projects.itertuples(index=False)):
+    values = list(p.values)
+    total_value = sum(values)
 
     # Unique labels (zero-width spaces) so go.Pie won't merge same-type sectors,
     # and lighten each repeat of a type so duplicates stay distinguishable.
     seen, uniq_labels, slice_colors = {}, [], []
-    for t in p['types']:
+    for t in p.types:
       k = seen.get(t, 0)
       seen[t] = k + 1
       uniq_labels.append(t + '\u200b' * k)                 # visually identical, internally unique
       base = owner_type_colors.get(t, '#808080')
-      slice_colors.append(base if k == 0 else _lighten(base, 0.28 * k))
+      slice_colors.append(base if k == 0 else lighten(base, 0.28 * k))
 
     labels      = uniq_labels + ['']
-    vals        = p['values'] + [total]
-    text_labels = [f'{v / total * 100:.0f}%' for v in p['values']] + ['']
-    customdata  = p['categories'] + ['']
+    vals        = values + [total_value]
+    text_labels = [f'{v / total_value * 100:.0f}%' for v in values] + ['']
+    customdata  = list(p.categories) + ['']
     colors      = slice_colors + ['rgba(0,0,0,0)']
 
-    for t, cat in zip(p['types'], p['categories']):
+    for t, cat in zip(p.types, p.categories):
       cats_in_use.setdefault(cat, [])
       if t not in cats_in_use[cat]:
         cats_in_use[cat].append(t)
 
+    x_domain, y_domain = domains[i]
     fig.add_trace(go.Pie(
       labels=labels, values=vals,
       marker=dict(colors=colors, line=dict(color='white', width=1)),
@@ -702,7 +752,8 @@ def create_multi_owner_semicircles_internal(df):
       customdata=customdata,
       text=text_labels, textinfo='text', textposition='inside',
       hovertemplate='<b>%{label}</b><br>%{customdata}<br>%{value}%<extra></extra>',
-    ), row=r, col=c)
+      domain=dict(x=list(x_domain), y=list(y_domain)),
+    ))
 
     # ── Swatch legend below the chart (mirrors scale_pies) ──
   swatch_w  = 0.04;  swatch_h  = 0.022
@@ -756,37 +807,22 @@ def create_multi_owner_semicircles_internal(df):
     xaxis=dict(visible=False),
     yaxis=dict(visible=False),
     font=dict(family=FONT_FAMILY, size=FONT_SIZE, color=FONT_COLOR),
+    meta=dict(page=page, pages=pages, total=total),
   )
   return fig
 
-def create_ownership_objectives_heatmap_internal(df):
-  """Heatmap: owner category × key objective co-occurrence."""
-  pairs = []
-  for _, row in df.iterrows():
-    owners = row.get('owners') or []
-    objectives = row.get('key_objectives') or []
-    if not owners or not objectives:
-      continue
-    cats = {o.get('owner_category') or 'Other' for o in owners}
-    for cat in cats:
-      for obj in objectives:
-        pairs.append({
-          'record_id': row.get('record_id'),
-          'owner_category': cat,
-          'objective': obj,
-        })
-
-  if not pairs:
+def create_ownership_objectives_heatmap_internal(incidence, mask):
+  """
+  Heatmap: owner category × key objective co-occurrence over the selected
+  records (mask), from the snapshot's OwnershipIncidence.
+  """
+  count_data = co_occurrence_long(incidence.owners, incidence.objectives, mask,
+                                  names=('owner_category', 'objective'))
+  if count_data.empty:
     fig = go.Figure()
     fig.update_layout(title=dict(text='No ownership-objectives data available'))
     return fig
 
-  pairs_df = pd.DataFrame(pairs)
-  count_data = (
-    pairs_df.groupby(['owner_category', 'objective'])['record_id']
-      .nunique().reset_index(name='count')
-  )
-
   owner_order = (count_data.groupby('owner_category')['count'].sum()
     .sort_values(ascending=False).index.tolist())
   obj_order = (count_data.groupby('objective')['count'].sum()
@@ -852,7 +888,7 @@ def create_ownership_boxplot_internal(df_owners):
     return fig
 
   type_order = (
-    df_plot.groupby('owner_category')['owner_percent']
+    df_plot.groupby('owner_category', observed=True)['owner_percent']
       .median().sort_values(ascending=False).index.tolist()
   )
   color_map = {cat: _cat_colour(cat) for cat in type_order}
@@ -957,32 +993,34 @@ def create_indigenous_ownership_stacked_internal(df_owners):
   )
   return fig
 
-def create_collaboration_heatmap_internal(df):
-  all_cats = set()
-  project_cat_sets = []
-  for _, row in df.iterrows():
-    owners = row.get('owners') or []
-    if len(owners) < 2:
-      continue
-    cats = sorted({o.get('owner_category') or 'Other' for o in owners})
-    project_cat_sets.append(cats)
-    all_cats.update(cats)
-
-  if not project_cat_sets:
+def create_collaboration_heatmap_internal(incidence, mask):
+  """
+  Heatmap: how often owner categories co-occur on multi-owner projects —
+  the Gram matrix of the owner-category incidence over the selected
+  multi-owner records. The diagonal counts projects whose owners all share
+  one category.
+  """
+  selected = incidence.owner_entries >= 2
+  if mask is not None:
+    selected &= mask
+  n_projects = int(selected.sum())
+  if not n_projects:
     fig = go.Figure()
     fig.update_layout(title=dict(text='No multi-owner projects for selected filters'))
     return fig
 
+  owners   = incidence.owners
+  single   = selected & (label_counts(owners) == 1)
+  all_cats = [c for c, n in zip(owners.labels, label_totals(owners, selected)) if n]
+
   ordered  = [c for c in CATEGORY_ORDER_OWNERS if c in all_cats]
   ordered += [c for c in sorted(all_cats) if c not in ordered]
 
-  matrix = pd.DataFrame(0, index=ordered, columns=ordered)
-  for cats in project_cat_sets:
-    for a, b in combinations(cats, 2):
-      matrix.loc[a, b] += 1
-      matrix.loc[b, a] += 1
-    if len(cats) == 1:
-      matrix.loc[cats[0], cats[0]] += 1
+  pairs = gram(owners, selected)
+  values = pairs.to_numpy(copy=True)
+  np.fill_diagonal(values, label_totals(owners, single))
+  matrix = (pd.DataFrame(values, index=pairs.index, columns=pairs.columns)
+              .reindex(index=ordered, columns=ordered))
 
   max_val = matrix.values.max() or 1
   annotations = []
@@ -1005,7 +1043,7 @@ def create_collaboration_heatmap_internal(df):
     hovertemplate='%{y} + %{x}<br>Projects: %{z}<extra></extra>',
   ))
   fig.update_layout(
-    title=dict(text=f'Owner type category collaboration (n ={len(project_cat_sets)})'),
+    title=dict(text=f'Owner type category collaboration (n ={n_projects})'),
     annotations=annotations,
     margin=dict(l=0, r=0, t=50, b=0),
     font=dict(family=FONT_FAMILY, size=FONT_SIZE, color=FONT_COLOR),
@@ -0,0 +1,118 @@
+"""
+Palettes.py — Server module
+===========================
+Palette registry: the colour lookups every chart shares, derived once
+instead of on each chart call.
+
+Per dataset snapshot (get_palette, cached with Global_Server_Functions.derived):
+  owner_type_colors  {owner_type: hex} assigned over every (owner_type,
+                     owner_category) pair in the dataset, so an owner type
+                     keeps its colour in every chart and under every filter
+
+Per process (static inputs, memoized):
+  LINK_RGBA / LINK_GREY    semi-transparent link colour per financing category
+  transparent(hex, alpha)  '#rrggbb' → 'rgba(...)'
+  contrast_color(hex)      'white' / 'black' text colour for a background
+  brightness_shades(hex, n), tint_shades(hex, n, strength), lighten(hex, amount)
+                           shade ramps (tuples) for stacked bars and histograms
+
+Usage in a chart function:
+    colors = get_palette(snapshot).owner_type_colors
+    text   = contrast_color(colors.get(owner_type, '#808080'))
+"""
+
+import functools
+from collections import namedtuple
+
+from .config import COLOUR_MAPPING, get_owner_type_colors_categorical
+from .Global_Server_Functions import derived
+from .Derived_Tables import get_table
+
+
+Palette = namedtuple('Palette', ['owner_type_colors'])
+
+
+def get_palette(snapshot):
+  """Return the Palette for snapshot, building it on first use."""
+  return derived(snapshot, 'palette', lambda: _build_palette(snapshot))
+
+
+def _build_palette(snapshot):
+  owners = get_table(snapshot, 'owners_flat')
+  pairs  = []
+  if not owners.empty:
+    pairs = list(
+      owners.loc[owners['owner_type'].notna(), ['owner_type', 'owner_category']]
+        .drop_duplicates()
+        .itertuples(index=False, name=None)
+    )
+  return Palette(owner_type_colors=get_owner_type_colors_categorical(pairs))
+
+
+# ==================== STATIC LOOKUPS ====================
+
+@functools.lru_cache(maxsize=1024)
+def transparent(color, alpha=0.3):
+  """'#rrggbb' → 'rgba(r,g,b,alpha)'; anything else → translucent grey."""
+  if isinstance(color, str) and color.startswith('#') and len(color) == 7:
+    try:
+      r, g, b = int(color[1:3], 16), int(color[3:5], 16), int(color[5:7], 16)
+      return f'rgba({r},{g},{b},{alpha})'
+    except ValueError:
+      pass
+  return f'rgba(128,128,128,{alpha})'
+
+
+# Semi-transparent link colour per financing category (Sankey links)
+LINK_GREY = transparent('#808080')
+LINK_RGBA = {cat: transparent(color) for cat, color in COLOUR_MAPPING.items()}
+
+
+@functools.lru_cache(maxsize=1024)
+def contrast_color(hex_color):
+  """
+  Return 'white' or 'black' based on which gives better contrast
+  against the given hex background colour (ITU-R BT.601 luminance).
+  """
+  if not hex_color or not hex_color.startswith('#'):
+    return 'white'
+  hex_color = hex_color.lstrip('#')
+  r, g, b = int(hex_color[0:2], 16), int(hex_color[2:4], 16), int(hex_color[4:6], 16)
+  return 'black' if (0.299 * r + 0.587 * g + 0.114 * b) / 255 > 0.5 else 'white'
+
+
+def _rgb(hex_color):
+  return int(hex_color[1:3], 16), int(hex_color[3:5], 16), int(hex_color[5:7], 16)
+
+
+@functools.lru_cache(maxsize=1024)
+def brightness_shades(hex_color, n):
+  """n shades from 0.75× to 1.35× the brightness of hex_color (grey if invalid)."""
+  if not hex_color or not hex_color.startswith('#'):
+    hex_color = '#808080'
+  r, g, b = _rgb(hex_color)
+  return tuple(f'#{min(255,int(r*(0.75+0.6*i/max(n-1,1)))):02x}'
+               f'{min(255,int(g*(0.75+0.6*i/max(n-1,1)))):02x}'
+               f'{min(255,int(b*(0.75+0.6*i/max(n-1,1)))):02x}' for i in range(n))
+
+
+@functools.lru_cache(maxsize=1024)
+def lighten(hex_color, amount):
+  """hex_color blended towards white by amount (0–1); non-hex values unchanged."""
+  if not hex_color or not hex_color.startswith('#'):
+    return hex_color
+  r, g, b = _rgb(hex_color)
+  return f'#{int(r + (255 - r) * amount):02x}{int(g + (255 - g) * amount):02x}{int(b + (255 - b) * amount):02x}'
+
+
+@functools.lru_cache(maxsize=1024)
+def tint_shades(hex_color, n, strength):
+  """
+  n shades from hex_color (first) to hex_color lightened by strength (last);
+  grey if hex_color is invalid.
+  """
+  if not hex_color or not hex_color.startswith('#'):
+    hex_color = '#808080'
+  if n == 1:
+    return (hex_color,)
+  return tuple(lighten(hex_color, strength * i / (n - 1)) for i in range(n))
@@ -8,7 +8,8 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from collections.abc import Iterable
-from .Global_Server_Functions import add_formatted_list_columns, format_number_column, get_data
+from .Global_Server_Functions import add_formatted_list_columns, format_number_column
+from .Filter_Engine import FilterSpec, query_rows
 from .config import COLOUR_MAPPING, gradient_palette, dunsparce_colors
 
 # ============= COLOR PALETTE CONFIGURATION =============
@@ -54,8 +55,9 @@ DEFAULT_PALETTE = ['#7f7f7f', '#a0a0a0', '#c0c0c0', '#d9d9d9', '#efefef']
 OWNERSHIP_COLORS = gradient_palette[::-1]
 
 # ============= DATA LOADING =============
-# Load data ONCE at module level - cached in memory
-DATA = get_data(project_privacy=True)
+# Rows are fetched per request in get_all_map_and_cards via query_rows
+# (privacy-filtered snapshot, or SQL pushdown), so a dataset reload is
+# picked up without a restart.
 
 # ============= REMOVED - DON'T BUILD TRACES AT MODULE LEVEL =============
 # BEFORE (SLOW):
@@ -199,32 +201,6 @@ def build_capital_mix_traces(capital_mix, category_palettes):
   return traces
 
 
-def apply_filters(df, provinces=None, proj_types=None, stages=None, 
-                  indigenous_ownership=None, project_scale=None):
-  """
-  Apply filters to dataframe. Returns filtered copy.
-  Uses list filtering for now - will be updated to set filtering later.
-  """
-  df = df.copy()
-
-  if provinces:
-    df = df[df["province"].isin(provinces)]
-
-  if proj_types:
-    df = df[df["project_type"].apply(lambda lst: any(t in lst for t in proj_types))]
-
-  if stages:
-    df = df[df["stage"].isin(stages)]
-
-  if indigenous_ownership:
-    df = df[df["indigenous_ownership"].isin(indigenous_ownership)]
-
-  if project_scale:
-    df = df[df["project_scale"].isin(project_scale)]
-
-  return df
-
-
 def get_map_data_internal(df):
   """Internal function to create map trace from filtered data."""
   map_data = go.Scattermap(
@@ -275,20 +251,18 @@ def get_all_map_and_cards(provinces=None, proj_types=None, stages=None,
   # Select columns needed for map
   map_cols = ["record_id", "project_name", "community", "latitude", "longitude", 
               "province", "stage", "project_type", "indigenous_ownership", "project_scale","sub_projects"]
-  df_map = DATA.loc[:, map_cols].copy()
 
   # Select columns needed for cards - NOTE: NO TRACES IN INITIAL COLUMNS
   card_cols = ["record_id", "project_name", "data_source", "stage", "project_type", 
                "province", "total_cost", "project_scale", "all_financing_mechanisms", 
                "owners", "indigenous_ownership", "capital_mix", "sub_projects",
                "community", "province_abbr"]  # Raw data only
-  df_cards = DATA.loc[:, card_cols].copy()
 
-  # Apply filters to BOTH dataframes
-  df_map_filtered = apply_filters(df_map, provinces, proj_types, stages, 
-                                  indigenous_ownership, project_scale)
-  df_cards_filtered = apply_filters(df_cards, provinces, proj_types, stages, 
-                                    indigenous_ownership, project_scale)
+  # Resolve filters once (in-memory index, or pushed down to SQL), then select columns
+  spec = FilterSpec.from_kwargs(provinces, proj_types, stages, indigenous_ownership, project_scale)
+  rows = query_rows(spec, columns=list(dict.fromkeys(map_cols + card_cols)), project_privacy=True)
+  df_map_filtered   = rows.loc[:, map_cols]
+  df_cards_filtered = rows.loc[:, card_cols]
 
   # Generate map data (ALL points)
   map_data = get_map_data_internal(df_map_filtered)
@@ -297,7 +271,7 @@ def get_all_map_and_cards(provinces=None, proj_types=None, stages=None,
   sub_lats, sub_lons, sub_names, sub_customdata = [], [], [], []
 
   for row_idx, row in df_map_filtered.iterrows():
-    subs = DATA.loc[row_idx, "sub_projects"]
+    subs = row["sub_projects"]
     if not isinstance(subs, list) or not subs:
       continue
 
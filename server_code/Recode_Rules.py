@@ -0,0 +1,131 @@
+"""
+Recode_Rules.py — Server module
+===============================
+Declarative recode rules for the survey's free-text answers, applied when
+the derived tables are built (once per dataset snapshot, see
+Derived_Tables) so request-time code never re-normalises strings.
+
+  CATEGORY_ALIASES  — ordered (substrings, display name) rules mapping raw
+                      financing category answers to the display names used
+                      by every chart; first match wins, case-insensitive
+  SOURCE_ALIASES    — ambiguous source answers collapsed into 'Other/Unknown'
+                      (suffixed with the item's raw category, e.g.
+                      'Other/Unknown-Debt')
+  RECORD_OVERRIDES  — data fixes: record-specific corrections pending a
+                      survey recode (see DATA FIXES below)
+
+The rules are compiled, not interpreted per row: standardize_category_name
+is memoized, recode_categories() and recode_sources() resolve each distinct
+value of a column once and remap the column through the resulting lookup,
+and apply_record_overrides() turns each override into one boolean mask.
+
+Usage in a derived-table builder:
+    df_long['source']   = recode_sources(df_long['source'], df_long['category'])
+    df_long['category'] = recode_categories(df_long['category'])
+    df_long = apply_record_overrides(df_long)
+"""
+
+import functools
+
+import numpy as np
+import pandas as pd
+
+
+# ==================== RULES ====================
+
+CATEGORY_ALIASES = [
+  (('debt',),                    'Debt financing'),
+  (('grant',),                   'Grants & non-repayable contributions'),
+  (('crowdfund', 'crowd fund'),  'Crowdfunding'),
+  (('internal',),                'Internal capital'),
+  (('equity',),                  'External equity investments'),
+  (('community',),               'Community financing'),
+]
+
+SOURCE_ALIASES = {
+  'Other':                  'Other/Unknown',
+  'Other (please specify)': 'Other/Unknown',
+  'Not sure':               'Other/Unknown',
+  'Aggregate total':        'Other/Unknown',
+  'Aggregate Total':        'Other/Unknown',
+  "Don't know":             'Other/Unknown',
+}
+
+# Sources relabelled to this value are suffixed with '-<raw category>'
+UNKNOWN_SOURCE = 'Other/Unknown'
+
+
+# ==================== DATA FIXES ====================
+# Corrections to the answers of specific records, pending a recode of the
+# survey data. Unlike the rules above they change published figures, so
+# each one states what it corrects. Every capital view applies them after
+# recode_categories (capital_mix_processed, treemap_count_long and
+# treemap_amount_long), so 'where' matches the standardised category names
+# and the Sankey, stacked bar, treemap views and indicators agree.
+
+RECORD_OVERRIDES = [
+  # Projects 77 & 106 reported their Canada Infrastructure Bank debt under
+  # other lenders: all their debt financing is attributed to public
+  # infrastructure banks. TEMPORARY — remove once the survey data is recoded.
+  {
+    'records': [77, 106],
+    'where':   {'category': 'Debt financing'},
+    'set':     {'source': 'Public infrastructure bank/government-sponsored lender'},
+  },
+]
+
+
+# ==================== COMPILED LOOKUPS ====================
+
+@functools.lru_cache(maxsize=1024)
+def standardize_category_name(category):
+  """
+  Normalise a raw category string to its display name (CATEGORY_ALIASES).
+  Values matching no rule are returned unchanged.
+  """
+  if not category:
+    return category
+  c = str(category).lower()
+  for substrings, name in CATEGORY_ALIASES:
+    if any(s in c for s in substrings):
+      return name
+  return category
+
+
+def _remap(values, fn):
+  """fn applied once per distinct value of Series values; missing values kept."""
+  codes, uniques = pd.factorize(values)
+  lookup = np.array([fn(u) for u in uniques] + [None], dtype=object)
+  out = lookup[codes]                       # code -1 (missing) picks the None slot
+  missing = codes < 0
+  out[missing] = values.to_numpy()[missing]
+  return pd.Series(out, index=values.index, name=values.name)
+
+
+def recode_categories(categories):
+  """Series of raw category answers → standardised display names."""
+  return _remap(categories, standardize_category_name)
+
+
+def recode_sources(sources, categories):
+  """
+  Series of raw source answers with SOURCE_ALIASES applied; sources that
+  become UNKNOWN_SOURCE get the row's raw category appended.
+  """
+  out = _remap(sources, lambda s: SOURCE_ALIASES.get(s, s))
+  unknown = (out == UNKNOWN_SOURCE).to_numpy()
+  if unknown.any():
+    out[unknown] = out[unknown] + '-' + categories[unknown]
+  return out
+
+
+def apply_record_overrides(df, overrides=RECORD_OVERRIDES):
+  """Apply RECORD_OVERRIDES to a long table with a record_id column (in place)."""
+  for rule in overrides:
+    match = df['record_id'].isin(rule['records']).to_numpy()
+    for col, value in rule.get('where', {}).items():
+      match &= (df[col] == value).to_numpy()
+    if match.any():
+      for col, value in rule['set'].items():
+        df.loc[match, col] = value
+  return df
@@ -17,7 +17,7 @@ import pandas as pd
 import plotly.graph_objects as go
 import textwrap
 
-from .Global_Server_Functions import get_data
+from .Global_Server_Functions import get_snapshot
 from .Export_Utils import apply_display_template, export_figure_from_bytes
 from .config import dunsparce_colors, FONT_FAMILY
 
@@ -31,7 +31,7 @@ def get_all_resources_data():
   Data is loaded once and shared across all chart builders.
   Add future resource charts to this return dict.
   """
-  df = get_data()
+  df = get_snapshot()
 
   mechanism_fig = apply_display_template(create_mechanism_compare_internal(df))
   # Re-center the title AFTER the template, otherwise the template overrides it.
@@ -0,0 +1,398 @@
+"""
+Result_Cache.py — Server module
+===============================
+Bounded LRU cache for the page callables' responses.
+
+Entries are keyed by (callable name, input fingerprint, dataset version,
+chart key): each chart of a page response is cached on its own, under a
+fingerprint of the inputs it declares (ChartInputs) — the rows its filter
+dimensions select plus any filter values it uses directly. Filter states
+that give a chart the same rows therefore share its entry (equivalent
+selections, or a chip that excludes nothing), a request for some of a
+page's charts reuses the ones already computed, and a new dataset version
+never serves stale charts (entries of a swapped-out version are dropped).
+The same fingerprints tell a page which charts a filter change leaves
+untouched: given the client's previous filter state, those are returned as
+CHART_UNCHANGED instead of a figure.
+
+Only charts that were actually built are cached. The fallback figure of a
+chart whose builder raised is returned but not cached (Chart_Builder reports
+those keys through fallback_charts()), so a one-off failure is retried on
+the next request. Charts that exceeded their build budget come back from
+Chart_Builder as placeholders; those are not cached either. A placeholder's
+retry entry is completed with the callable and filters, the figure is
+cached once the abandoned build finishes, and the retry_chart callable
+returns it (waiting up to CHART_RETRY_WAIT_S for the build, or requesting
+the chart again). Builds are identified to Chart_Builder by their cache
+keys (build_identities()), so a repeated request for a chart whose
+abandoned build is still running gets a placeholder for that build instead
+of starting another.
+
+The cache is bounded by a memory budget measured in serialized (Plotly
+JSON) bytes; least-recently-used entries are evicted once the budget is
+exceeded. Hit / miss / eviction counters are exposed by
+get_result_cache_stats().
+
+Usage on a page callable (the cache sits inside the callable registration):
+    @anvil.server.callable
+    @cached_result('get_all_capital_charts', CAPITAL_CHART_INPUTS)
+    def get_all_capital_charts(provinces=None, ..., charts=None):
+"""
+
+import functools
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import anvil.server
+import numpy as np
+import plotly.utils
+
+from .config import CHART_RETRY, CHART_UNCHANGED
+from .Global_Server_Functions import dataset_version, get_snapshot, on_dataset_swap
+from .Filter_Engine import FilterSpec, get_filter_index
+from .Chart_Builder import (
+  build_identities, chart_placeholder, fallback_charts, is_placeholder, wait_for_build,
+  when_built,
+)
+
+
+# Default memory budget for cached responses (serialized bytes)
+RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# How long one retry_chart call waits for an abandoned build (seconds)
+CHART_RETRY_WAIT_S = 10.0
+
+
+class ResultCache:
+  """Thread-safe LRU mapping with a byte budget and hit/miss/eviction counts."""
+
+  def __init__(self, max_bytes=RESULT_CACHE_MAX_BYTES):
+    self.max_bytes = max_bytes
+    self._entries  = OrderedDict()   # key -> (value, size)
+    self._bytes    = 0
+    self._lock     = threading.Lock()
+    self.hits = self.misses = self.evictions = 0
+
+  def __contains__(self, key):
+    """Membership test that does not touch the LRU order or the counters."""
+    with self._lock:
+      return key in self._entries
+
+  def get(self, key):
+    """Return (True, value) on a hit, (False, None) on a miss."""
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        self.misses += 1
+        return False, None
+      self._entries.move_to_end(key)
+      self.hits += 1
+      return True, entry[0]
+
+  def put(self, key, value, size):
+    """Store value (size in bytes), evicting LRU entries to stay in budget."""
+    if size > self.max_bytes:
+      return   # would evict everything and still not fit
+    with self._lock:
+      old = self._entries.pop(key, None)
+      if old is not None:
+        self._bytes -= old[1]
+      self._entries[key] = (value, size)
+      self._bytes += size
+      self._evict()
+
+  def resize(self, max_bytes):
+    with self._lock:
+      self.max_bytes = max_bytes
+      self._evict()
+
+  def discard(self, predicate):
+    """Drop every entry whose key satisfies predicate(key)."""
+    with self._lock:
+      for key in [k for k in self._entries if predicate(k)]:
+        self._bytes -= self._entries.pop(key)[1]
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+      self._bytes = 0
+
+  def stats(self):
+    with self._lock:
+      lookups = self.hits + self.misses
+      return {
+        'entries':   len(self._entries),
+        'bytes':     self._bytes,
+        'max_bytes': self.max_bytes,
+        'hits':      self.hits,
+        'misses':    self.misses,
+        'evictions': self.evictions,
+        'hit_rate':  self.hits / lookups if lookups else 0.0,
+      }
+
+  def _evict(self):
+    while self._bytes > self.max_bytes and self._entries:
+      _, (_, size) = self._entries.popitem(last=False)
+      self._bytes -= size
+      self.evictions += 1
+
+
+RESULT_CACHE = ResultCache()
+
+# ChartInputs of each cached callable's charts, and the cached callables
+# themselves (for retry_chart), by callable name
+_CHART_INPUTS = {}
+_CALLABLES    = {}
+
+# Page requests currently being computed on a cache miss (the cache warmer
+# backs off while this is non-zero); the warmer's own calls are not counted.
+_IN_FLIGHT      = 0
+_IN_FLIGHT_LOCK = threading.Lock()
+_LOCAL          = threading.local()
+
+
+def serialized_size(value):
+  """Size in bytes of value as Plotly JSON — the unit of the cache budget."""
+  return len(json.dumps(value, cls=plotly.utils.PlotlyJSONEncoder))
+
+
+class ChartInputs(namedtuple('ChartInputs', ['tables', 'dimensions', 'parameters'])):
+  """
+  What one chart of a page callable is built from:
+    tables     — snapshot tables it reads ('snapshot' for the raw rows,
+                 otherwise Derived_Tables names)
+    dimensions — filter dimensions whose record mask selects those rows
+                 (default: all five)
+    parameters — filter dimensions whose values it also uses directly
+  Tables only change with the dataset version, which is part of every key.
+  """
+  __slots__ = ()
+
+  def __new__(cls, tables, dimensions=FilterSpec._fields, parameters=()):
+    return super().__new__(cls, tuple(tables), tuple(dimensions), tuple(parameters))
+
+
+def input_fingerprints(index, spec, chart_inputs):
+  """
+  {chart key: fingerprint of its inputs under spec} for the charts in
+  chart_inputs ({key: ChartInputs}): a digest of the record mask over the
+  chart's dimensions plus the values of its parameters. Two filter states
+  with equal fingerprints give the chart identical inputs — and figure.
+  """
+  digests = {}
+  fingerprints = {}
+  for key, inputs in chart_inputs.items():
+    if inputs.dimensions not in digests:
+      mask = index.mask(spec.only(*inputs.dimensions))
+      mask = np.ones(index.n_rows, dtype=bool) if mask is None else mask
+      digests[inputs.dimensions] = hashlib.blake2b(
+        np.packbits(mask).tobytes(), digest_size=16).hexdigest()
+    fingerprints[key] = (digests[inputs.dimensions],
+                         tuple(getattr(spec, p) for p in inputs.parameters))
+  return fingerprints
+
+
+def result_cache_keys(name, spec, charts, snapshot=None):
+  """
+  {chart key: cache key} for the given charts of cached callable `name`
+  under FilterSpec `spec` on snapshot (default: the current one).
+  """
+  snapshot = snapshot if snapshot is not None else get_snapshot()
+  inputs   = _CHART_INPUTS[name]
+  version  = dataset_version(snapshot)
+  prints   = input_fingerprints(get_filter_index(snapshot), spec,
+                                {key: inputs[key] for key in charts})
+  return {key: (name, prints[key], version, key) for key in charts}
+
+
+def requested_charts(charts, chart_keys):
+  """
+  The chart keys a page callable should build: all of chart_keys when charts
+  is None, otherwise the requested keys (deduplicated, in request order).
+  Raises ValueError for keys the page does not provide.
+  """
+  if charts is None:
+    return list(chart_keys)
+  if isinstance(charts, str):
+    charts = [charts]
+  unknown = [key for key in charts if key not in chart_keys]
+  if unknown:
+    raise ValueError(f"Unknown chart key(s): {', '.join(map(str, unknown))}")
+  return list(dict.fromkeys(charts))
+
+
+def cached_result(name, chart_inputs):
+  """
+  Decorator for a page callable taking the five standard filter kwargs and
+  charts (list of chart keys; None = all). chart_inputs maps each chart key,
+  in response order, to the ChartInputs it is built from.
+
+  Each chart is cached under the fingerprint of its own inputs, so filter
+  states that give a chart the same rows share its entry; the callable is
+  invoked with the canonical filters and only the charts not in the cache.
+
+  A chart whose builder raised is returned as its fallback figure, not
+  cached. A chart that exceeded its build budget is returned as its
+  placeholder (not cached), with name and the canonical filters added to
+  its retry entry; its figure is cached when the abandoned build finishes.
+
+  previous — what the client currently shows: {'filters': filter kwargs,
+  'version': dataset version, 'charts': chart keys drawn}, or {} on a first
+  load. When given, drawn charts whose inputs are the same under both filter
+  states are returned as CHART_UNCHANGED (the client keeps its figure), and
+  the response also carries the current 'dataset_version' for the next
+  call's previous.
+
+  Cached charts are shared: callers must not modify them.
+  """
+  chart_inputs = dict(chart_inputs)
+  _CHART_INPUTS[name] = chart_inputs
+
+  def decorator(fn):
+    @functools.wraps(fn)
+    def wrapper(provinces=None, proj_types=None, stages=None,
+                indigenous_ownership=None, project_scale=None, charts=None,
+                previous=None):
+      keys = requested_charts(charts, chart_inputs)
+      spec = FilterSpec.from_kwargs(provinces, proj_types, stages,
+                                    indigenous_ownership, project_scale)
+      snapshot   = get_snapshot()
+      version    = dataset_version(snapshot)
+      cache_keys = result_cache_keys(name, spec, keys, snapshot)
+      unchanged  = _unchanged_charts(name, previous, cache_keys, snapshot)
+
+      result, missing = {}, []
+      for key in keys:
+        if key in unchanged:
+          result[key] = CHART_UNCHANGED
+          continue
+        hit, value = RESULT_CACHE.get(cache_keys[key])
+        if hit:
+          result[key] = value
+        else:
+          missing.append(key)
+
+      if missing:
+        live = not getattr(_LOCAL, 'warming', False)
+        if live:
+          _track_in_flight(+1)
+        try:
+          with fallback_charts() as failed, build_identities(cache_keys):
+            computed = fn(**spec.as_kwargs(), charts=missing)
+        finally:
+          if live:
+            _track_in_flight(-1)
+        for key in missing:
+          value = computed[key]
+          if is_placeholder(value):
+            value = _retry_placeholder(value, name, spec, cache_keys[key])
+          elif key not in failed:
+            RESULT_CACHE.put(cache_keys[key], value, serialized_size(value))
+          result[key] = value
+
+      response = {key: result[key] for key in keys}
+      if previous is not None:
+        response['dataset_version'] = version
+      return response
+    wrapper.chart_keys = tuple(chart_inputs)
+    _CALLABLES[name] = wrapper
+    return wrapper
+  return decorator
+
+
+def _retry_placeholder(placeholder, name, spec, cache_key):
+  """
+  placeholder with name and filters in its retry entry; the figure of its
+  abandoned build is cached under cache_key once built.
+  """
+  retry = dict(placeholder[CHART_RETRY], callable=name, filters=spec.as_kwargs())
+  if retry['build']:
+    def _store(figure):
+      if cache_key[2] == dataset_version(get_snapshot()):
+        RESULT_CACHE.put(cache_key, figure, serialized_size(figure))
+    when_built(retry['build'], _store)
+  return dict(placeholder, **{CHART_RETRY: retry})
+
+
+@anvil.server.callable
+def retry_chart(retry):
+  """
+  The figure for a chart a page callable returned as a placeholder, given
+  the placeholder's retry entry: the abandoned build's figure when it
+  finishes within CHART_RETRY_WAIT_S. When that build is unknown here or
+  failed, the chart is requested again from its callable (a cache hit once
+  the abandoned build has finished), waiting out the rest of the time for
+  the new build if it is over budget again. Returns the placeholder again
+  while the chart is still building.
+  """
+  deadline = time.perf_counter() + CHART_RETRY_WAIT_S
+  finished, figure = wait_for_build(retry.get('build'), CHART_RETRY_WAIT_S)
+  if finished and figure is None:
+    key    = retry['chart']
+    figure = _CALLABLES[retry['callable']](**retry['filters'], charts=[key])[key]
+    if not is_placeholder(figure):
+      return figure
+    retry = figure[CHART_RETRY]
+    finished, figure = wait_for_build(retry['build'], max(0.0, deadline - time.perf_counter()))
+  if figure is not None:
+    return figure
+  return dict(chart_placeholder(retry['chart'], retry['build']), **{CHART_RETRY: retry})
+
+
+def _unchanged_charts(name, previous, cache_keys, snapshot):
+  """Drawn chart keys whose inputs under previous['filters'] match cache_keys."""
+  if not previous or 'filters' not in previous:
+    return set()
+  if previous.get('version') != dataset_version(snapshot):
+    return set()   # the client's figures were built from another dataset version
+  drawn  = [key for key in cache_keys if key in previous.get('charts', cache_keys)]
+  spec   = FilterSpec.from_kwargs(**previous['filters'])
+  before = result_cache_keys(name, spec, drawn, snapshot)
+  return {key for key in drawn if before[key] == cache_keys[key]}
+
+
+def is_cached(name, spec, chart_keys):
+  """True when every chart in chart_keys is cached for name / spec."""
+  return all(key in RESULT_CACHE
+             for key in result_cache_keys(name, spec, chart_keys).values())
+
+
+@on_dataset_swap
+def _drop_stale_results(old_version, new_version):
+  """Free the responses computed for a dataset version that was swapped out."""
+  RESULT_CACHE.discard(lambda key: key[2] == old_version)
+
+
+def _track_in_flight(delta):
+  global _IN_FLIGHT
+  with _IN_FLIGHT_LOCK:
+    _IN_FLIGHT += delta
+
+
+def live_requests_in_flight():
+  """Number of live page requests currently computing a response."""
+  return _IN_FLIGHT
+
+
+class warming:
+  """Context manager marking this thread's calls as cache warm-up, not live traffic."""
+
+  def __enter__(self):
+    _LOCAL.warming = True
+    return self
+
+  def __exit__(self, *exc):
+    _LOCAL.warming = False
+
+
+def configure_result_cache(max_bytes):
+  """Change the memory budget (bytes); evicts immediately if now over budget."""
+  RESULT_CACHE.resize(max_bytes)
+
+
+def get_result_cache_stats():
+  """Hit / miss / eviction counters and current memory use."""
+  return RESULT_CACHE.stats()
@@ -0,0 +1,228 @@
+"""
+SQL_Source.py — Server module
+=============================
+SQL-backed source for the survey dataset, used by Global_Server_Functions
+in place of Data Files when the SQL_CONNECTION environment variable is set
+(e.g. postgresql://..., or sqlite:////path/to/app_data.db for local testing).
+
+One table (SQL_TABLE) with the same columns as the published frame. Nested
+and list columns (capital_mix, owners, project_type, ...) are stored as JSON
+text (UTF-8, non-ASCII characters unescaped) and decoded on read; write_sql_dataset() produces such a table from a
+frame, so a local SQLite file with the production schema is one call away:
+    write_sql_dataset(df, 'sqlite:////tmp/app_data.db')
+
+SqlSource provides:
+  - pooled connections — one engine (connection pool) per URL per process
+  - signature()        — cheap row count / max record_id / max UPDATED_COLUMN
+                         query used as the dataset version check
+  - load(previous)     — full read, or incremental: only rows with a newer
+                         record_id or UPDATED_COLUMN are fetched and merged
+                         into the previously loaded frame
+  - read(filters, ...) — filter pushdown: the standard filters become a
+                         WHERE clause so only matching rows (and the
+                         requested columns) leave the database. List
+                         columns are matched with a LIKE pre-filter; callers
+                         re-check exactly (Filter_Engine.query_rows).
+
+SQLAlchemy is optional: without it (or without SQL_CONNECTION) the loader
+keeps reading Data Files.
+"""
+
+import json
+import os
+import threading
+
+import pandas as pd
+
+try:
+  import sqlalchemy as sa
+except ImportError:   # SQLAlchemy is optional — callers fall back to Data Files
+  sa = None
+
+
+SQL_CONNECTION_ENV = 'SQL_CONNECTION'
+SQL_TABLE          = 'app_data'
+UPDATED_COLUMN     = 'updated_at'   # optional last-modified column for incremental loads
+
+# Connection pool settings (SQLite manages its own pool)
+POOL_OPTIONS = {'pool_size': 5, 'max_overflow': 5, 'pool_recycle': 1800}
+
+_ENGINES = {}
+_SOURCES = {}
+_LOCK    = threading.Lock()
+
+
+def sql_configured():
+  """True when SQLAlchemy is importable and SQL_CONNECTION is set."""
+  return sa is not None and bool(os.getenv(SQL_CONNECTION_ENV))
+
+
+def get_engine(url=None):
+  """Shared engine (connection pool) for url (default: $SQL_CONNECTION)."""
+  if sa is None:
+    raise ImportError('SQLAlchemy is required for the SQL data source')
+  url = url or os.getenv(SQL_CONNECTION_ENV)
+  with _LOCK:
+    if url not in _ENGINES:
+      options = {} if url.startswith('sqlite') else POOL_OPTIONS
+      _ENGINES[url] = sa.create_engine(url, pool_pre_ping=True, **options)
+    return _ENGINES[url]
+
+
+def get_sql_source(url=None, table=SQL_TABLE):
+  """Shared SqlSource for url / table, or None when SQL is not configured."""
+  if url is None and not sql_configured():
+    return None
+  engine = get_engine(url)
+  with _LOCK:
+    key = (str(engine.url), table)
+    if key not in _SOURCES:
+      _SOURCES[key] = SqlSource(engine, table)
+    return _SOURCES[key]
+
+
+class SqlSource:
+  """Reads the survey table through a pooled engine. Build via get_sql_source()."""
+
+  def __init__(self, engine, table=SQL_TABLE):
+    self.engine  = engine
+    self.table   = sa.Table(table, sa.MetaData(), autoload_with=engine)
+    self.updated = self.table.c[UPDATED_COLUMN] if UPDATED_COLUMN in self.table.c else None
+
+  def signature(self):
+    """'table:rows:max record_id[:max updated]' — changes whenever data is added or edited."""
+    cols = [sa.func.count(), sa.func.max(self.table.c.record_id)]
+    if self.updated is not None:
+      cols.append(sa.func.max(self.updated))
+    with self.engine.connect() as conn:
+      row = conn.execute(sa.select(*cols)).one()
+    return ':'.join([self.table.name] + [str(v) for v in row])
+
+  # ==================== LOADING ====================
+
+  def load(self, previous=None):
+    """
+    The whole table as a frame ordered by record_id. When previous (a frame
+    from an earlier load) is given, only new or updated rows are fetched and
+    merged into it; if the merge cannot reproduce the table (rows deleted),
+    the table is read in full.
+    """
+    if previous is None or len(previous) == 0:
+      return self.read()
+
+    changed = self._read_where(self._changed_since(previous))
+    if len(changed) == 0:
+      merged = previous.copy(deep=False)
+    else:
+      kept   = previous[~previous['record_id'].isin(changed['record_id'])]
+      kept   = kept.astype({c: object for c in kept.columns
+                            if isinstance(kept[c].dtype, pd.CategoricalDtype)})
+      merged = pd.concat([kept, changed], ignore_index=True)
+      merged = merged.sort_values('record_id', kind='stable', ignore_index=True)
+
+    with self.engine.connect() as conn:
+      n_rows = conn.execute(sa.select(sa.func.count()).select_from(self.table)).scalar()
+    return merged if len(merged) == n_rows else self.read()
+
+  def _changed_since(self, previous):
+    newer = self.table.c.record_id > _scalar(previous['record_id'].max())
+    if self.updated is None or UPDATED_COLUMN not in previous.columns:
+      return newer
+    last = previous[UPDATED_COLUMN].max()
+    return newer if pd.isna(last) else sa.or_(newer, self.updated > _scalar(last))
+
+  # ==================== FILTER PUSHDOWN ====================
+
+  def read(self, filters=None, columns=None, exclude=None):
+    """
+    Rows matching filters, ordered by record_id.
+      filters — {column: (values, is_list)}; values OR-ed, columns AND-ed.
+                Scalar columns match exactly (trimmed); list columns are a
+                superset pre-filter (LIKE on the JSON text).
+      columns — columns to fetch (record_id is always included)
+      exclude — {column: value} rows to drop (NULLs are kept), e.g. the
+                project-privacy filter {'anonymous_status': 'anon'}
+    """
+    clauses = []
+    for col, (values, is_list) in (filters or {}).items():
+      if col not in self.table.c:
+        return self._read_where(sa.false(), columns)
+      column = self.table.c[col]
+      if is_list:
+        clauses.append(sa.or_(*[
+          column.like(f'%{_escape_like(needle)}%', escape='\\')
+          for v in values for needle in _json_needles(v)
+        ]))
+      else:
+        clauses.append(sa.func.trim(column).in_(list(values)))
+    for col, value in (exclude or {}).items():
+      if col in self.table.c:
+        clauses.append(sa.or_(self.table.c[col].is_(None), self.table.c[col] != value))
+    return self._read_where(sa.and_(*clauses) if clauses else None, columns)
+
+  def _read_where(self, where=None, columns=None):
+    if columns is None:
+      cols = list(self.table.c)
+    else:
+      names = ['record_id'] + [c for c in columns if c != 'record_id']
+      cols  = [self.table.c[c] for c in names if c in self.table.c]
+    query = sa.select(*cols).order_by(self.table.c.record_id)
+    if where is not None:
+      query = query.where(where)
+    with self.engine.connect() as conn:
+      df = pd.read_sql_query(query, conn)
+    return _decode_json_columns(df)
+
+
+def write_sql_dataset(df, url, table=SQL_TABLE):
+  """
+  Write df to table at url (replacing it), JSON-encoding list / dict columns.
+  Used to publish a release to SQL and to build local SQLite test databases.
+  """
+  out = df.copy()
+  for col in out.columns:
+    if out[col].dtype == object and out[col].map(lambda v: isinstance(v, (list, dict))).any():
+      out[col] = out[col].map(lambda v: json.dumps(v, ensure_ascii=False, default=str)
+                              if isinstance(v, (list, dict)) else v)
+    elif isinstance(out[col].dtype, pd.CategoricalDtype):
+      out[col] = out[col].astype(object)
+  out.to_sql(table, get_engine(url), if_exists='replace', index=False)
+  return url
+
+
+def _decode_json_columns(df):
+  """Decode text columns holding JSON lists / objects back to Python values."""
+  for col in df.columns:
+    if df[col].dtype != object:
+      continue
+    values = df[col].dropna()
+    if values.empty or not values.map(_looks_like_json).all():
+      continue
+    try:
+      df[col] = df[col].map(lambda v: json.loads(v) if isinstance(v, str) else v)
+    except ValueError:
+      pass   # bracketed plain text, not JSON
+  return df
+
+
+def _looks_like_json(value):
+  return isinstance(value, str) and value[:1] in ('[', '{')
+
+
+def _json_needles(value):
+  """
+  value as it appears inside the JSON text of a list cell: as written by
+  write_sql_dataset, and with non-ASCII characters \\u-escaped (tables
+  written with json.dumps defaults).
+  """
+  return list(dict.fromkeys(json.dumps(value, ensure_ascii=escaped)[1:-1]
+                            for escaped in (False, True)))
+
+
+def _escape_like(value):
+  return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _scalar(value):
+  """numpy scalar -> Python scalar for use as a bound parameter."""
+  return value.item() if hasattr(value, 'item') else value
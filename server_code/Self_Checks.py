@@ -0,0 +1,384 @@
+"""
+Self_Checks.py — Server module
+==============================
+Checks of the server's chart-building paths, run on demand from the server
+console or an uplink session (like Chart_Builder.benchmark_chart_builds);
+nothing here runs at import or on page requests. Each check raises
+AssertionError on failure and returns a short summary otherwise.
+
+  check_budget_placeholder()     — a chart past its time budget comes back
+                                   as a placeholder, not an exception, and
+                                   its retried figure matches one built in time
+  check_capital_mix_equivalence() — the vectorised process_capital_mix_data
+                                   gives the same frame as the row-wise
+                                   implementation it replaced, on generated
+                                   records covering its edge cases
+  benchmark_capital_mix()        — both implementations timed as the number
+                                   of records grows
+  check_sql_pushdown()           — query_rows through SQL (filters pushed down
+                                   to SQLite) returns the same records as
+                                   the in-memory index, for non-ASCII and
+                                   LIKE-metacharacter filter values
+
+Usage:
+    from .Self_Checks import check_budget_placeholder
+    check_budget_placeholder()
+"""
+
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from . import Cap_Explorer
+from .config import CHART_RETRY, SCALE_ORDER
+from .Global_Server_Functions import get_data
+from .Filter_Engine import FilterIndex, FilterSpec, query_sql_rows
+from .SQL_Source import get_sql_source, write_sql_dataset
+from .Recode_Rules import apply_record_overrides, standardize_category_name
+from .Chart_Builder import clear_chart_budget, configure_chart_budget, is_placeholder
+from .Result_Cache import RESULT_CACHE, retry_chart
+
+
+def check_budget_placeholder(delay=1.0, budget=0.3):
+  """
+  Slow the Capital Sankey to delay seconds under a budget of budget seconds
+  and check that get_all_capital_charts still answers, with a placeholder
+  for the Sankey and figures for the other charts, that a repeated request
+  points at the Sankey build already running instead of starting another,
+  and that retry_chart returns the Sankey styled like one built within its
+  budget.
+  """
+  reference = Cap_Explorer.get_all_capital_charts.__wrapped__(charts=['sankey'])['sankey']
+
+  create_sankey = Cap_Explorer.create_sankey_internal
+  def slow_sankey(*args, **kwargs):
+    time.sleep(delay)
+    return create_sankey(*args, **kwargs)
+
+  Cap_Explorer.create_sankey_internal = slow_sankey
+  configure_chart_budget(budget, page='Capital', chart='sankey')
+  # The Sankey must be built, not served from the result cache
+  RESULT_CACHE.discard(lambda key: key[0] == 'get_all_capital_charts' and key[3] == 'sankey')
+  try:
+    start   = time.perf_counter()
+    charts  = Cap_Explorer.get_all_capital_charts(charts=['sankey', 'time_chart'])
+    elapsed = time.perf_counter() - start
+    assert is_placeholder(charts['sankey']), 'over-budget Sankey was not a placeholder'
+    assert not is_placeholder(charts['time_chart']), 'chart within budget was abandoned'
+    assert elapsed < delay, f'response waited {elapsed:.2f}s for the abandoned Sankey'
+
+    repeat = Cap_Explorer.get_all_capital_charts(charts=['sankey'])['sankey']
+    assert repeat[CHART_RETRY]['build'] == charts['sankey'][CHART_RETRY]['build'], \
+      'repeated request started a second Sankey build'
+
+    retried = retry_chart(charts['sankey'][CHART_RETRY])
+    assert not is_placeholder(retried), 'retry_chart did not return the Sankey'
+    assert retried.layout.margin.t == reference.layout.margin.t, \
+      'retried Sankey is styled differently from one built in time'
+  finally:
+    Cap_Explorer.create_sankey_internal = create_sankey
+    clear_chart_budget('Capital', 'sankey')
+  return {'response_s': round(elapsed, 3), 'sankey_margin_t': retried.layout.margin.t}
+
+
+# ==================== CAPITAL MIX ====================
+
+def _process_capital_mix_rowwise(df):
+  """Reference: the row-wise process_capital_mix_data the vectorised one replaced, verbatim."""
+  # Step 1 — Explode capital_mix
+  rows = []
+  for _, row in df.iterrows():
+    for item in (row.get('capital_mix') or []):
+      rows.append({
+        'record_id':                row.get('record_id'),
+        'total_cost':               row.get('total_cost'),
+        'name':                     item.get('name'),
+        'source':                   item.get('source'),
+        'category':                 item.get('category'),
+        'item_type':                item.get('item_type'),
+        'amount':                   item.get('amount'),
+        'project_type':             row.get('project_type'),
+        'stage':                    row.get('stage'),
+        'province':                 row.get('province'),
+        'project_scale':            row.get('project_scale'),
+        'grants_time':              row.get('grants_time'),
+        'debt_time':                row.get('debt_time'),
+        'equity_time':              row.get('equity_time'),
+        'community_time':           row.get('community_finance_time'),
+        'crowdfunding_time':        row.get('crowdfunding_time'),
+        'indigenous_ownership':     row.get('indigenous_ownership'),
+        'all_financing_mechanisms': row.get('all_financing_mechanisms'),
+      })
+
+  df_long = pd.DataFrame(rows)
+  if df_long.empty:
+    return pd.DataFrame(columns=[
+      'record_id', 'total_cost', 'name', 'source', 'category', 'item_type',
+      'amount', 'project_type', 'stage', 'province', 'project_scale',
+      'indigenous_ownership', 'all_financing_mechanisms', 'time_to_funding'
+    ])
+
+  # Step 2 — Explode debt list
+  debt_rows = []
+  for _, row in df.iterrows():
+    for item in (row.get('debt') or []):
+      debt_rows.append({
+        'record_id':        row.get('record_id'),
+        'total_cost':       row.get('total_cost'),
+        'name':             item.get('debt_name'),
+        'source':           item.get('debt_source'),
+        'debt_interest':    item.get('debt_interest'),
+        'repayment_period': item.get('debt_repayment'),
+      })
+
+  # Step 3 — Merge debt details
+  df_long = pd.merge(
+    df_long, pd.DataFrame(debt_rows),
+    on=['record_id', 'total_cost', 'name', 'source'], how='left'
+  )
+
+  # Step 4 — Zero out mismatched time columns
+  time_cols = ['grants_time', 'debt_time', 'equity_time', 'community_time', 'crowdfunding_time']
+  time_cats = ['Grants',      'Debt',      'Equity',      'Community finance', 'Crowdfunding']
+  for col, cat in zip(time_cols, time_cats):
+    df_long.loc[(df_long['category'] != cat) & df_long[col].notnull(), col] = pd.NaT
+
+  # Step 5 — Convert time strings to numeric years
+  TIME_MAP = {
+    'Less than 1 year': 0.5,
+    '2-3 years':        2.5,
+    '4-5 years':        4.5,
+    '8-10 years':       9.0,
+    'More than 10 years': 11.0
+  }
+  def time_to_numeric(s):
+    return np.nan if (pd.isna(s) or s == 'Missing value') else TIME_MAP.get(s, np.nan)
+
+  df_long['time_to_funding'] = df_long.apply(
+    lambda row: next((time_to_numeric(row[c]) for c in time_cols if pd.notna(row[c])), np.nan),
+    axis=1
+  )
+  df_long = df_long.drop(columns=time_cols)
+
+  # Step 6 — Normalise ambiguous source labels
+  df_long['source'] = df_long['source'].replace({
+    'Other':                 'Other/Unknown',
+    'Other (please specify)':'Other/Unknown',
+    'Not sure':              'Other/Unknown',
+    'Aggregate total':       'Other/Unknown',
+    'Aggregate Total':       'Other/Unknown',
+    "Don't know":            'Other/Unknown',
+  })
+  mask = df_long['source'] == 'Other/Unknown'
+  df_long.loc[mask, 'source'] = df_long.loc[mask, 'source'] + '-' + df_long.loc[mask, 'category']
+
+  # ── TEMPORARY FIX: Reclassify CIB debt for projects 77 & 106 ──
+  # TODO: Remove once survey data is recoded
+  df_long.loc[
+    df_long['record_id'].isin([77, 106]) & (df_long['category'] == 'Debt financing'),
+    'source'
+    ] = 'Public infrastructure bank/government-sponsored lender'
+
+  df_long['category'] = df_long['category'].apply(standardize_category_name)
+  return df_long
+
+
+_CATEGORIES = ['Grants', 'Debt', 'Equity', 'Community finance', 'Crowdfunding',
+               'Internal capital', 'Debt financing', 'Other funding', None]
+_SOURCES    = ['Federal government', 'Provincial government', 'Credit union',
+               'Other', 'Not sure', "Don't know", 'Aggregate total', None]
+_TIMES      = list(Cap_Explorer.TIME_MAP) + ['Missing value', 'Some other answer', None]
+_TIME_COLS  = sorted(set(Cap_Explorer.TIME_COL_BY_CATEGORY.values()))
+
+
+def _capital_mix_records(n, seed=0):
+  """
+  n generated survey records for process_capital_mix_data: no / empty /
+  several capital_mix items (some with keys missing), debt entries that do
+  and do not match an item, every time answer (including unknown and
+  missing ones), missing costs and amounts, and record ids 77 and 106.
+  """
+  rng  = random.Random(seed)
+  rows = []
+  for i in range(n):
+    items, debt = [], []
+    for k in range(rng.choice([0, 0, 1, 2, 3, 5])):
+      item = {'name': f'Item {k}', 'source': rng.choice(_SOURCES),
+              'category': rng.choice(_CATEGORIES), 'item_type': rng.choice(['cash', 'loan']),
+              'amount': rng.choice([None, round(rng.uniform(1e3, 1e6), 2)])}
+      if rng.random() < 0.1:
+        del item[rng.choice(['source', 'item_type', 'amount'])]
+      items.append(item)
+      if item['category'] in ('Debt', 'Debt financing') and rng.random() < 0.7:
+        debt.append({'debt_name': item['name'], 'debt_source': item.get('source'),
+                     'debt_interest': rng.choice([None, 2.5, 4.0]),
+                     'debt_repayment': rng.choice([None, '5 years', '20 years'])})
+        if rng.random() < 0.1:
+          del debt[-1][rng.choice(['debt_interest', 'debt_repayment'])]
+    if rng.random() < 0.2:
+      debt.append({'debt_name': 'Unmatched', 'debt_source': 'Credit union',
+                   'debt_interest': 3.0, 'debt_repayment': '10 years'})
+    rows.append({
+      'record_id':   77 if i == 0 else 106 if i == 1 else 1000 + i,
+      'total_cost':  rng.choice([None, round(rng.uniform(1e4, 1e8), 2)]),
+      'capital_mix': rng.choice([items, items, None]) if items else rng.choice([[], None]),
+      'debt':        debt or rng.choice([[], None]),
+      'project_type': rng.choice(['Solar', 'Wind', 'Hydro', None]),
+      'stage':        rng.choice(['Planning', 'Operating', None]),
+      'province':     rng.choice(['Ontario', 'Alberta', 'Yukon']),
+      'project_scale': rng.choice(SCALE_ORDER + [None]),
+      'indigenous_ownership': rng.choice(['Yes', 'No', None]),
+      'all_financing_mechanisms': rng.sample(['Grants', 'Debt', 'Equity'], rng.randint(0, 3)),
+      **{col: rng.choice(_TIMES) for col in _TIME_COLS},
+    })
+  return pd.DataFrame(rows)
+
+
+def _reference_capital_mix(df):
+  """
+  Expected process_capital_mix_data output: the row-wise reference plus the
+  data fixes (Recode_Rules.RECORD_OVERRIDES), which it applies to the raw
+  category and so misses.
+  """
+  return apply_record_overrides(_process_capital_mix_rowwise(df))
+
+
+def _assert_same_capital_mix(df, reference_df=None, label=''):
+  new = Cap_Explorer.process_capital_mix_data(df).reset_index(drop=True)
+  old = _reference_capital_mix(df if reference_df is None else reference_df)
+  pd.testing.assert_frame_equal(new, old.reset_index(drop=True), obj=f'capital mix ({label})')
+  return len(new)
+
+
+def check_capital_mix_equivalence(n_records=2000, seed=0):
+  """
+  Compare process_capital_mix_data with _reference_capital_mix (same
+  columns, dtypes and values) on generated records in these variants:
+  as generated; without two of the time columns; without the debt column;
+  with project_scale as a Categorical (as in the snapshot); with scalar
+  capital_mix / debt cells, which the row-wise code cannot read and which
+  must count as no items; with no capital items at all; and with no records.
+  """
+  df      = _capital_mix_records(n_records, seed)
+  results = {'generated': _assert_same_capital_mix(df, label='generated')}
+
+  trimmed = df.drop(columns=['crowdfunding_time', 'community_finance_time'])
+  results['missing time columns'] = _assert_same_capital_mix(trimmed, label='missing time columns')
+
+  # The row-wise code fails when no record has debt entries, so without the
+  # debt column the expectation is its output with the debt details blank
+  # (each generated debt entry matches at most one item)
+  new = Cap_Explorer.process_capital_mix_data(df.drop(columns=['debt']))
+  old = _reference_capital_mix(df).assign(debt_interest=np.nan, repayment_period=np.nan)
+  pd.testing.assert_frame_equal(new, old, check_dtype=False, obj='capital mix (no debt column)')
+  results['no debt column'] = len(new)
+
+  categorical = df.assign(project_scale=pd.Categorical(df['project_scale'], categories=SCALE_ORDER))
+  results['categorical'] = _assert_same_capital_mix(categorical, label='categorical')
+
+  rng     = random.Random(seed)
+  scalar  = df.copy()
+  cleaned = df.copy()
+  for col in ('capital_mix', 'debt'):
+    hit = [rng.random() < 0.2 for _ in range(len(df))]
+    scalar[col]  = [rng.choice([np.nan, 'n/a', 3]) if h else v for h, v in zip(hit, df[col])]
+    cleaned[col] = [[] if h else v for h, v in zip(hit, df[col])]
+  results['scalar cells'] = _assert_same_capital_mix(scalar, cleaned, label='scalar cells')
+
+  no_items = df.assign(capital_mix=[[] for _ in range(len(df))])
+  new = Cap_Explorer.process_capital_mix_data(no_items)
+  assert new.empty and 'time_to_funding' in new.columns, 'records without items gave rows'
+  new = Cap_Explorer.process_capital_mix_data(df.iloc[:0])
+  assert new.empty and 'time_to_funding' in new.columns, 'no records gave rows'
+  return results
+
+
+def benchmark_capital_mix(sizes=(300, 3000, 30000, 100000), repeats=3,
+                          reference_limit=30000, seed=0):
+  """
+  Best-of-repeats seconds of process_capital_mix_data and the row-wise
+  reference per number of generated records: {n: {'vectorised', 'rowwise'}}.
+  The reference is skipped (None) above reference_limit records to keep the
+  run short; the vectorised path is timed at every size.
+  """
+  def best(fn, df):
+    timings = []
+    for _ in range(repeats):
+      start = time.perf_counter()
+      fn(df)
+      timings.append(time.perf_counter() - start)
+    return round(min(timings), 4)
+
+  results = {}
+  for n in sizes:
+    df = _capital_mix_records(n, seed)
+    results[n] = {
+      'vectorised': best(Cap_Explorer.process_capital_mix_data, df),
+      'rowwise':    best(_process_capital_mix_rowwise, df) if n <= reference_limit else None,
+    }
+    rowwise = results[n]['rowwise']
+    print(f'{n:>7,} records: vectorised {results[n]["vectorised"]:.3f}s, '
+          + (f'row-wise {rowwise:.3f}s' if rowwise is not None else 'row-wise skipped'))
+  return results
+
+
+# ==================== SQL PUSHDOWN ====================
+
+# Project types renamed for check_sql_pushdown: non-ASCII text, one name
+# inside another, LIKE wildcards and characters JSON escapes
+_SQL_PROJECT_TYPES = {
+  'Solar':          'Énergie solaire',
+  'Microgrid':      'Énergie solaire (hors réseau)',
+  'Wind':           'Wind_power 100% "community"',
+  'Energy storage': 'Storage\\battery',
+}
+
+
+def check_sql_pushdown(path=None):
+  """
+  Write the dataset to a SQLite file (path, default a temporary file) with
+  some project types renamed (_SQL_PROJECT_TYPES) and check that
+  Filter_Engine.query_sql_rows returns the same records as a FilterIndex
+  over the same frame: for each project type, for the indigenous ownership
+  answers (which contain '%'), and with the project-privacy filter.
+  """
+  df = get_data()
+  df['project_type'] = [
+    [_SQL_PROJECT_TYPES.get(t, t) for t in types] if isinstance(types, list) else types
+    for types in df['project_type']
+  ]
+  index = FilterIndex(df)
+
+  specs = [FilterSpec.from_kwargs(proj_types=[t]) for t in _SQL_PROJECT_TYPES.values()]
+  specs.append(FilterSpec.from_kwargs(proj_types=list(_SQL_PROJECT_TYPES.values())[2:]))
+  specs.extend(FilterSpec.from_kwargs(indigenous_ownership=[v])
+               for v in df['indigenous_ownership'].dropna().unique())
+
+  temporary = path is None
+  if temporary:
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+  sql = get_sql_source(write_sql_dataset(df, f'sqlite:///{path}'))
+  try:
+    results = {}
+    for spec in specs:
+      counts = []
+      for private in (False, True):
+        expected = index.rows(index.mask(spec))
+        if private:
+          expected = expected[expected['anonymous_status'] != 'anon']
+        got = query_sql_rows(sql, spec, ['record_id', 'project_type'], project_privacy=private)
+        assert got['record_id'].tolist() == expected['record_id'].tolist(), \
+          f'SQL pushdown and in-memory rows differ for {spec} (private={private})'
+        counts.append(len(got))
+      values = next(v for v in spec if v is not None)
+      results[' | '.join(values)] = tuple(counts)   # (rows, rows without anonymous)
+  finally:
+    sql.engine.dispose()
+    if temporary:
+      os.remove(path)
+  return results